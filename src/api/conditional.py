@@ -0,0 +1,143 @@
+"""Módulo de requisições condicionais, por intervalo de bytes e comprimidas (ETag, Range e gzip)"""
+
+import gzip
+import json
+import re
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+
+from fastapi import HTTPException, Response
+
+RANGE_PATTERN = re.compile(r"^bytes=(\d*)-(\d*)$")
+# Respostas menores que isso não compensam a compressão.
+GZIP_MIN_SIZE = 1024
+GZIP_LEVEL = 6
+
+
+def strong_etag(value: str) -> str:
+    """ETag forte a partir de um hash do conteúdo."""
+    return f'"{value}"'
+
+
+def http_date(value: datetime) -> str:
+    """Data no formato dos cabeçalhos HTTP; datas sem fuso são UTC (como no MongoDB)."""
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return format_datetime(value.astimezone(timezone.utc), usegmt=True)
+
+
+def _parse_http_date(value: str) -> datetime | None:
+    try:
+        parsed = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    """Comparação fraca do If-None-Match (ignora o prefixo `W/`)."""
+    if header.strip() == "*":
+        return True
+    opaque = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == opaque for tag in header.split(","))
+
+
+def not_modified(headers, etag: str, last_modified: datetime | None = None) -> bool:
+    """
+    Se a cópia em cache do cliente ainda vale (resposta 304).
+
+    O If-None-Match tem precedência; o If-Modified-Since só é considerado
+    quando ele não é enviado.
+    """
+    if_none_match = headers.get("if-none-match")
+    if if_none_match is not None:
+        return _etag_matches(if_none_match, etag)
+    if_modified_since = headers.get("if-modified-since")
+    if if_modified_since and last_modified is not None:
+        since = _parse_http_date(if_modified_since)
+        if last_modified.tzinfo is None:
+            last_modified = last_modified.replace(tzinfo=timezone.utc)
+        return since is not None and last_modified.replace(microsecond=0) <= since
+    return False
+
+
+def byte_range(
+    headers, length: int, etag: str, last_modified: datetime | None = None
+) -> tuple[int, int] | None:
+    """
+    Intervalo de bytes pedido no cabeçalho Range, inclusivo nas duas pontas.
+
+    Só um intervalo por requisição é atendido; pedidos com vários
+    intervalos, malformados ou com um If-Range que não corresponde à versão
+    atual recebem o arquivo inteiro (None), como permite a RFC 9110.
+
+    Raises:
+        HTTPException: 416 se o intervalo começar depois do fim do arquivo.
+    """
+    header = headers.get("range")
+    if not header:
+        return None
+    if_range = headers.get("if-range")
+    if if_range is not None:
+        if if_range.startswith(('"', "W/")):
+            # If-Range só aceita comparação forte.
+            if if_range.startswith("W/") or if_range != etag:
+                return None
+        elif last_modified is None or http_date(last_modified) != if_range:
+            return None
+
+    match = RANGE_PATTERN.match(header.strip())
+    if match is None or match.group(1) == match.group(2) == "":
+        return None
+    first, last = match.groups()
+    if first == "":
+        # Sufixo: os últimos N bytes.
+        suffix = int(last)
+        if suffix == 0:
+            raise range_not_satisfiable(length)
+        return max(length - suffix, 0), length - 1
+    start = int(first)
+    end = min(int(last), length - 1) if last else length - 1
+    if start >= length:
+        raise range_not_satisfiable(length)
+    if end < start:
+        return None
+    return start, end
+
+
+def range_not_satisfiable(length: int) -> HTTPException:
+    return HTTPException(
+        status_code=416,
+        detail="Intervalo solicitado fora do arquivo",
+        headers={"Content-Range": f"bytes */{length}"},
+    )
+
+
+def accepts_gzip(headers) -> bool:
+    """Se o cliente aceita respostas gzip (`Accept-Encoding`, sem `q=0`)."""
+    for coding in headers.get("accept-encoding", "").split(","):
+        name, _, params = coding.partition(";")
+        if name.strip().lower() not in ("gzip", "*"):
+            continue
+        quality = params.strip().removeprefix("q=") or "1"
+        try:
+            return float(quality) > 0
+        except ValueError:
+            return False
+    return False
+
+
+def json_response(headers, payload, response_headers: dict) -> Response:
+    """
+    Resposta JSON comprimida com gzip quando o cliente aceita e o corpo é
+    grande o bastante.
+
+    A compressão fica na rota, e não em um middleware, para não alcançar
+    os downloads por intervalo de bytes.
+    """
+    body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+    response_headers = {**response_headers, "Vary": "Accept-Encoding"}
+    if len(body) >= GZIP_MIN_SIZE and accepts_gzip(headers):
+        body = gzip.compress(body, compresslevel=GZIP_LEVEL)
+        response_headers["Content-Encoding"] = "gzip"
+    return Response(body, media_type="application/json", headers=response_headers)
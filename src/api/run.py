@@ -1,18 +1,36 @@
 """Module that starts and runs the API."""
 
 import os
+from contextlib import asynccontextmanager
 
 from fastapi import FastAPI
 from uvicorn import run
 
 from src.api.v1 import router
 from src.api.health import health_router
+from src.ingest.extraction import ExtractionService
+from src.ingest.jobs import IngestWorker
+from src.mongo.client import MongoDBClient
+from src.search.backend import get_search_backend
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Start and stop the resources shared by the routes."""
+    await MongoDBClient().connect_async()
+    await get_search_backend().connect()
+    await IngestWorker().start()
+    yield
+    await IngestWorker().stop()
+    ExtractionService().shutdown()
+    await get_search_backend().close()
+    await MongoDBClient().close_async()
 
 
 def create_app():
     """Create the FastAPI app."""
 
-    app = FastAPI()
+    app = FastAPI(lifespan=lifespan)
     app.include_router(router)
     app.include_router(health_router)
     return app
@@ -1,16 +1,52 @@
 """Módulo para upload, download e busca de documentos PDF"""
 
+import asyncio
+import json
 import os
 from datetime import datetime
+from typing import Literal
 
 from bson.objectid import ObjectId
-from fastapi import File, Form, HTTPException, UploadFile, Query
+from fastapi import File, Form, HTTPException, Path, Request, Response, UploadFile, Query
 from fastapi.responses import StreamingResponse
 from fastapi.routing import APIRouter
-from pymupdf4llm import to_markdown
+from gridfs import AsyncGridOut, NoFile
+from gridfs.errors import CorruptGridFile
 
-from src.elastic.client import ElasticsearchConnection
+from src.api.conditional import (
+    accepts_gzip,
+    byte_range,
+    http_date,
+    json_response,
+    not_modified,
+    strong_etag,
+)
+from src.elastic.client import CHUNK_INDEX, DOC_INDEX
+from src.elastic.ranking import reciprocal_rank_fusion
+from src.elastic.search_cache import SearchCache
+from src.ingest.chunking import PAGE_SEPARATOR
+from src.ingest.embedding import Embedder
+from src.ingest.extraction import ExtractionError
+from src.ingest.jobs import IngestWorker
+from src.ingest.pipeline import bulk_ingest, check_upload
+from src.ingest.preview import (
+    PREVIEW_MAX_WIDTH,
+    PREVIEW_WIDTH,
+    preview_cache,
+    render_missing_preview,
+)
+from src.ingest.spool import SpooledUpload, UploadTooLarge, spool_archive, spool_upload
 from src.mongo.client import MongoDBClient
+from src.schemas.document import MultiSearchSchema
+from src.search.backend import (
+    FACET_INTERVALS,
+    LIST_SORTS,
+    CursorExpired,
+    InvalidCursor,
+    SearchError,
+    SearchRequest,
+    get_search_backend,
+)
 
 document_router = APIRouter()
 
@@ -19,173 +55,807 @@ ES_HOST = "http://localhost:9200"
 
 mongo_client = MongoDBClient()
 
-es = ElasticsearchConnection().es
+# Os clientes assíncronos (`adb`, `afs` e os da busca) são conectados no lifespan da API.
+search_backend = get_search_backend()
 
+ingest_worker = IngestWorker()
 
-@document_router.post("/upload")
+search_cache = SearchCache()
+
+# Campos do índice de documentos que podem ser pedidos em `fields`.
+SEARCH_FIELDS = (
+    "filename",
+    "category",
+    "access_level",
+    "uploaded_by",
+    "data_upload",
+    "extraction_tier",
+    "page_count",
+)
+DEFAULT_SEARCH_FIELDS = ("filename", "category", "uploaded_by")
+LIST_MAX_SIZE = 1000
+# Tamanho das partes enviadas ao cliente nos downloads e blocos do GridFS
+# lidos por vez no MongoDB (memória por download ≈ blocos x 255 KB).
+DOWNLOAD_CHUNK_SIZE = int(os.getenv("DOWNLOAD_CHUNK_SIZE", str(64 * 1024)))
+DOWNLOAD_PREFETCH_CHUNKS = int(os.getenv("DOWNLOAD_PREFETCH_CHUNKS", "4"))
+MARKDOWN_MAX_PAGE_SIZE = 50
+
+
+@document_router.post("/upload", status_code=202)
 async def upload_pdf(
     file: UploadFile = File(...),
     category: str = Form(...),
     access_level: int = Form(...),
     user_id: str = Form(...),
 ):
-    fs = mongo_client.fs
-
+    """Recebe um PDF e agenda sua ingestão, retornando o ID do job"""
     if not file.filename:
         raise HTTPException(status_code=400, detail="Nenhum arquivo enviado")
 
     if not file.filename.endswith(".pdf"):
         raise HTTPException(status_code=400, detail="Apenas PDFs são permitidos")
 
-    temp_path = f"temp/{file.filename}"
-    os.makedirs("temp", exist_ok=True)
-    with open(temp_path, "wb") as temp_file:
-        temp_file.write(await file.read())
-
     try:
-        result = to_markdown(temp_path)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Erro ao processar PDF: {str(e)}")
+        spooled = await spool_upload(file)
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    if not spooled.length:
+        spooled.cleanup()
+        raise HTTPException(status_code=400, detail="Arquivo vazio")
 
+    # Só a verificação barata fica na requisição: PDFs inválidos ou grandes
+    # demais são rejeitados antes de criar o job, e a camada é escolhida nele.
     try:
-        with open(temp_path, "rb") as file_stream:
-            file_id = fs.put(
-                file_stream,
-                filename=file.filename,
-                metadata={
-                    "category": category,
-                    "access_level": access_level,
-                    "uploaded_by": user_id,
-                    "data_upload": datetime.now(),
-                },
-            )
-    finally:
-        os.remove(temp_path)
+        page_count = await check_upload(spooled.path)
+    except UploadTooLarge as e:
+        spooled.cleanup()
+        raise HTTPException(status_code=413, detail=str(e))
+    except ExtractionError as e:
+        spooled.cleanup()
+        raise HTTPException(status_code=400, detail=str(e))
 
     try:
-        es.index(
-            index="healthcom_docs",
-            id=str(file_id),
-            body={
-                "filename": file.filename,
-                "content": result,
+        job_id = await ingest_worker.submit(
+            file.filename,
+            spooled,
+            metadata={
                 "category": category,
                 "access_level": access_level,
                 "uploaded_by": user_id,
-                "data_upload": datetime.now().isoformat(),
+                "data_upload": datetime.now(),
             },
+            page_count=page_count,
         )
     except Exception as e:
-        fs.delete(file_id)
-        raise HTTPException(
-            status_code=500, detail=f"Erro ao indexar no Elasticsearch: {str(e)}"
-        )
+        spooled.cleanup()
+        raise HTTPException(status_code=500, detail=f"Erro ao agendar ingestão: {str(e)}")
 
-    return {"message": "PDF salvo e indexado com sucesso", "file_id": str(file_id)}
+    return {"message": "PDF recebido, processamento agendado", "job_id": job_id}
 
 
-@document_router.get("/download/{file_id}")
-async def download_pdf(file_id: str, user_access_level: int):
+@document_router.post("/bulk")
+async def bulk_upload(
+    files: list[UploadFile] | None = File(None),
+    archive: UploadFile | None = File(None),
+    category: str = Form(...),
+    access_level: int = Form(...),
+    user_id: str = Form(...),
+):
+    """Ingere vários PDFs (multipart ou pacote zip/tar) e retorna o resultado por arquivo"""
+    if not files and not archive:
+        raise HTTPException(status_code=400, detail="Nenhum arquivo enviado")
+
+    items = []
+    report = []
     try:
-        fs = mongo_client.fs
+        for file in files or []:
+            if not file.filename or not file.filename.endswith(".pdf"):
+                report.append(
+                    {"filename": file.filename, "status": "skipped", "file_id": None,
+                     "error": "Apenas PDFs são permitidos"}
+                )
+                continue
+            try:
+                items.append((file.filename, await spool_upload(file)))
+            except UploadTooLarge as e:
+                report.append(
+                    {"filename": file.filename, "status": "skipped", "file_id": None,
+                     "error": str(e)}
+                )
+
+        if archive:
+            try:
+                items.extend(await asyncio.to_thread(spool_archive, archive.file))
+            except UploadTooLarge as e:
+                raise HTTPException(status_code=413, detail=str(e))
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
 
-        file = fs.find_one({"_id": ObjectId(file_id)})
-        if not file or not file.metadata:
-            raise HTTPException(
-                status_code=404, detail="Arquivo não encontrado ou inválido"
+        for filename, spooled in [item for item in items if not item[1].length]:
+            spooled.cleanup()
+            report.append(
+                {"filename": filename, "status": "skipped", "file_id": None,
+                 "error": "Arquivo vazio"}
             )
-        if file.metadata["access_level"] > user_access_level:
-            raise HTTPException(status_code=403, detail="Acesso negado")
+        items = [item for item in items if item[1].length]
 
-        return StreamingResponse(
-            file,
-            media_type="application/pdf",
-            headers={"Content-Disposition": f"attachment; filename={file.filename}"},
-        )
+        metadata = {
+            "category": category,
+            "access_level": access_level,
+            "uploaded_by": user_id,
+            "data_upload": datetime.now(),
+        }
+        try:
+            report = await bulk_ingest(items, metadata) + report
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Erro na ingestão em massa: {str(e)}")
+        finally:
+            search_cache.invalidate()
+    finally:
+        for _, spooled in items:
+            spooled.cleanup()
+
+    return {
+        "indexed": sum(entry["status"] == "indexed" for entry in report),
+        "deduplicated": sum(entry["status"] == "deduplicated" for entry in report),
+        "failed": sum(entry["status"] == "failed" for entry in report),
+        "skipped": sum(entry["status"] == "skipped" for entry in report),
+        "results": report,
+    }
+
+
+@document_router.get("/jobs/{job_id}")
+async def get_ingest_job(job_id: str):
+    """Retorna a etapa, o progresso e os tempos de um job de ingestão"""
+    if not ObjectId.is_valid(job_id):
+        raise HTTPException(status_code=404, detail="Job não encontrado")
+
+    job = await ingest_worker.jobs.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job não encontrado")
+
+    return {
+        "job_id": str(job["_id"]),
+        "filename": job["filename"],
+        "status": job["status"],
+        "stage": job["stage"],
+        "progress": job["progress"],
+        "pages_done": job.get("pages_done", 0),
+        "pages_total": job.get("pages_total"),
+        "extraction_tier": (job.get("profile") or {}).get("tier"),
+        "timings": job["timings"],
+        "file_id": str(job["file_id"]) if job["file_id"] else None,
+        "deduplicated": job.get("deduplicated", False),
+        "error": job["error"],
+        "created_at": job["created_at"],
+        "updated_at": job["updated_at"],
+    }
+
+
+@document_router.get("/download/{file_id}")
+async def download_pdf(file_id: str, user_access_level: int, request: Request):
+    """
+    Baixa o PDF original.
+
+    A resposta leva o SHA-256 do conteúdo como ETag forte, o Last-Modified
+    e o Accept-Ranges. Uma cópia em cache ainda válida (If-None-Match ou
+    If-Modified-Since) recebe 304 sem ler o arquivo, e um Range de um
+    intervalo recebe 206 lido a partir do bloco do GridFS que o contém.
+    """
+    if not ObjectId.is_valid(file_id):
+        raise HTTPException(status_code=404, detail="Arquivo não encontrado ou inválido")
+    try:
+        file = await mongo_client.afs.open_download_stream(ObjectId(file_id))
+    except NoFile:
+        file = None
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro ao baixar PDF: {str(e)}")
+    if not file or not file.metadata:
+        raise HTTPException(status_code=404, detail="Arquivo não encontrado ou inválido")
+    if file.metadata["access_level"] > user_access_level:
+        raise HTTPException(status_code=403, detail="Acesso negado")
+
+    # Arquivos do GridFS não mudam; os enviados antes do hash usam o ID.
+    etag = strong_etag(file.metadata.get("sha256") or f"{file._id}-{file.length}")
+    headers = {
+        "ETag": etag,
+        "Last-Modified": http_date(file.upload_date),
+        "Accept-Ranges": "bytes",
+        # Documentos com controle de acesso: só o cache do navegador, revalidado.
+        "Cache-Control": "private, no-cache",
+    }
+    if not_modified(request.headers, etag, file.upload_date):
+        return Response(status_code=304, headers=headers)
+
+    headers["Content-Disposition"] = f"attachment; filename={file.filename}"
+    requested = byte_range(request.headers, file.length, etag, file.upload_date)
+    if requested is None:
+        headers["Content-Length"] = str(file.length)
+        return StreamingResponse(
+            _iter_range(file, 0, file.length - 1), media_type="application/pdf", headers=headers
+        )
+
+    start, end = requested
+    headers["Content-Length"] = str(end - start + 1)
+    headers["Content-Range"] = f"bytes {start}-{end}/{file.length}"
+    return StreamingResponse(
+        _iter_range(file, start, end),
+        status_code=206,
+        media_type="application/pdf",
+        headers=headers,
+    )
+
+
+async def _iter_range(file: AsyncGridOut, start: int, end: int):
+    """
+    Lê os bytes `start` a `end` (inclusive) direto dos blocos do GridFS.
+
+    O cursor busca `DOWNLOAD_PREFETCH_CHUNKS` blocos por vez, e o lote
+    seguinte só é pedido quando o cliente já recebeu o anterior (cada envio
+    da StreamingResponse aguarda o socket), então um download lento não
+    acumula o arquivo em memória. Os blocos vão ao cliente em partes de
+    `DOWNLOAD_CHUNK_SIZE`.
+    """
+    chunk_size = file.chunk_size
+    first, last = start // chunk_size, end // chunk_size
+    cursor = mongo_client.adb["fs.chunks"].find(
+        {"files_id": file._id, "n": {"$gte": first, "$lte": last}},
+        sort=[("n", 1)],
+        batch_size=DOWNLOAD_PREFETCH_CHUNKS,
+    )
+    try:
+        expected = first
+        async for chunk in cursor:
+            if chunk["n"] != expected:
+                raise CorruptGridFile(f"Bloco {expected} ausente no arquivo {file._id}")
+            expected += 1
+            offset = chunk["n"] * chunk_size
+            data = memoryview(chunk["data"])[max(start - offset, 0):end - offset + 1]
+            for part in range(0, len(data), DOWNLOAD_CHUNK_SIZE):
+                yield bytes(data[part:part + DOWNLOAD_CHUNK_SIZE])
+    finally:
+        await cursor.close()
 
 
 @document_router.get("/search")
 async def search_documents(
     query: str = Query(...),
     category: str | None = Query(None),
-    access_level: int = Query(0)
+    access_level: int = Query(0),
+    size: int = Query(10, ge=1, le=100),
+    search_after: str | None = Query(None),
+    fields: str | None = Query(None),
+    highlight: bool = Query(True),
+    include_content: bool = Query(False),
 ):
-    es_query = {
-        "query": {
-            "bool": {
-                "must": [{"match": {"content": query}}],
-                "filter": [{"range": {"access_level": {"lte": access_level}}}],
-            }
+    """
+    Busca documentos, retornando só os campos pedidos e trechos destacados.
+
+    A paginação é feita pelo cursor `next_search_after` da resposta anterior;
+    o markdown completo só é incluído com `include_content=true`.
+    """
+    selected = _parse_fields(fields)
+    request = SearchRequest(
+        DOC_INDEX, size, category, access_level, text=query, fields=selected,
+        search_after=_parse_cursor(search_after) if search_after else None,
+    )
+
+    # Respostas com o markdown completo são grandes demais para o cache.
+    cache_key = None
+    if not include_content:
+        cache_key = search_cache.key(
+            "documents", query, category=category, access_level=access_level, size=size,
+            search_after=search_after, fields=selected, highlight=highlight,
+        )
+        cached = search_cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+    try:
+        result = await search_backend.search_one(request)
+        hits = result["hits"]
+        snippets = {}
+        if highlight and hits:
+            snippets = await search_backend.snippets(query, [hit["_id"] for hit in hits])
+        response = []
+        for hit in hits:
+            item = {"id": hit["_id"], "score": hit["_score"]}
+            item.update({field: hit["_source"].get(field) for field in selected})
+            if highlight:
+                item["highlight"] = snippets.get(hit["_id"], [])
+            if include_content:
+                stored = await mongo_client.markdown.aget(ObjectId(hit["_id"]))
+                item["content"] = stored[1] if stored else ""
+            response.append(item)
+        response = {
+            "result": response,
+            "total": result["total"],
+            "next_search_after": (
+                json.dumps(hits[-1]["sort"]) if len(hits) == size else None
+            ),
         }
-    }
-    if category:
-        es_query["query"]["bool"]["filter"].append({"term": {"category": category}})
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erro na busca: {str(e)}")
+
+    if cache_key:
+        search_cache.set(cache_key, response)
+    return response
 
+
+@document_router.get("/search/cache")
+async def search_cache_stats():
+    """Retorna os contadores de hit/miss e o tamanho do cache de buscas"""
+    return search_cache.stats()
+
+
+def _parse_fields(fields: str | None) -> list[str]:
+    """Valida a lista de campos pedida, separada por vírgulas."""
+    if not fields:
+        return list(DEFAULT_SEARCH_FIELDS)
+    selected = [field.strip() for field in fields.split(",") if field.strip()]
+    invalid = [field for field in selected if field not in SEARCH_FIELDS]
+    if invalid:
+        raise HTTPException(
+            status_code=400, detail=f"Campos inválidos: {', '.join(invalid)}"
+        )
+    return selected
+
+
+def _parse_cursor(cursor: str) -> list:
+    """Decodifica o cursor `search_after` devolvido pela página anterior."""
     try:
-        result = es.search(index="healthcom_docs", body=es_query)
-        hits = result["hits"]["hits"]
-        response = [
-            {
-                "id": hit["_id"],
-                "filename": hit["_source"].get("filename", "Sem nome"),
-                "content": hit["_source"]["content"],
-                "category": hit["_source"].get("category", "N/A"),
-                "uploaded_by": hit["_source"].get("uploaded_by", "N/A")
-            }
-            for hit in hits
-        ]
-        return {"result": response}
+        values = json.loads(cursor)
+    except ValueError:
+        values = None
+    if not isinstance(values, list):
+        raise HTTPException(status_code=400, detail="Cursor search_after inválido")
+    return values
+
+
+@document_router.get("/search/passages")
+async def search_passages(
+    query: str = Query(...),
+    category: str | None = Query(None),
+    access_level: int = Query(0),
+    size: int = Query(5, ge=1, le=50),
+    mode: Literal["bm25", "hybrid"] = Query("bm25"),
+):
+    """
+    Retorna os trechos de documentos mais relevantes para a busca.
+
+    Com `mode=hybrid`, a busca textual (BM25) e a busca por similaridade dos
+    embeddings (kNN) vão juntas em um único lote e os resultados são
+    combinados pela reciprocal rank fusion.
+    """
+    cache_key = search_cache.key(
+        "passages", query, category=category, access_level=access_level, size=size, mode=mode
+    )
+    cached = search_cache.get(cache_key)
+    if cached is not None:
+        return cached
+
+    try:
+        if mode == "hybrid":
+            response = await _hybrid_passages(query, category, access_level, size)
+        else:
+            result = await search_backend.search_one(
+                SearchRequest(CHUNK_INDEX, size, category, access_level, text=query)
+            )
+            response = [_passage_item(hit) for hit in result["hits"]]
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro na busca: {str(e)}")
 
+    search_cache.set(cache_key, {"result": response})
+    return {"result": response}
 
-@document_router.get("/list")
-async def list_documents(access_level: int = Query(0)):
-    """Lista todos os documentos que o usuário tem acesso"""
+
+@document_router.get("/suggest")
+async def suggest_documents(
+    prefix: str = Query(..., min_length=1, max_length=100),
+    category: str | None = Query(None),
+    access_level: int = Query(0),
+    size: int = Query(8, ge=1, le=20),
+):
+    """
+    Sugere documentos enquanto o usuário digita, pelo nome do arquivo ou
+    pelos títulos principais.
+
+    Chamada a cada tecla (com debounce na interface), então não passa pelo
+    cache de buscas: a consulta só lê os prefixos já indexados.
+    """
     try:
-        es_query = {
-            "query": {
-                "range": {
-                    "access_level": {"lte": access_level}
-                }
-            },
-            "size": 1000
-        }
-        result = es.search(index="healthcom_docs", body=es_query)
-        hits = result["hits"]["hits"]
-        documents = [
-            {
-                "id": hit["_id"],
-                "filename": hit["_source"].get("filename", ""),
-                "content": hit["_source"].get("content", ""),
-                "category": hit["_source"].get("category", ""),
-                "access_level": hit["_source"].get("access_level", 0),
-                "uploaded_by": hit["_source"].get("uploaded_by", ""),
-                "data_upload": hit["_source"].get("data_upload", ""),
-            }
-            for hit in hits
+        suggestions = await search_backend.suggest(prefix, category, access_level, size)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erro nas sugestões: {str(e)}")
+    return {
+        "suggestions": [
+            {**suggestion, "text": suggestion["heading"] or suggestion["filename"]}
+            for suggestion in suggestions
+        ]
+    }
+
+
+@document_router.post("/msearch")
+async def multi_search(search: MultiSearchSchema):
+    """
+    Executa várias consultas com os mesmos filtros em um único lote de buscas
+    (`_msearch` no Elasticsearch).
+
+    Retorna os resultados de cada consulta, na ordem recebida, e, com
+    `fuse=true`, o ranking combinado pela reciprocal rank fusion.
+    """
+    namespace = f"msearch:{search.target}"
+    filters = {
+        "category": search.category,
+        "access_level": search.access_level,
+        "size": search.size,
+    }
+    results: list[dict | None] = []
+    for query in search.queries:
+        cached = search_cache.get(search_cache.key(namespace, query, **filters))
+        results.append(None if cached is None else {"query": query, "result": cached["result"]})
+
+    pending = [i for i, result in enumerate(results) if result is None]
+    if pending:
+        index = CHUNK_INDEX if search.target == "passages" else DOC_INDEX
+        fields = list(DEFAULT_SEARCH_FIELDS) if search.target == "documents" else None
+        requests = [
+            SearchRequest(
+                index, search.size, search.category, search.access_level,
+                text=search.queries[i], fields=fields,
+            )
+            for i in pending
         ]
-        return {"documents": documents}
+        try:
+            responses = await search_backend.search(requests)
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Erro na busca: {str(e)}")
+
+        for i, item in zip(pending, responses):
+            query = search.queries[i]
+            if isinstance(item, SearchError):
+                # Falhas são por consulta e não entram no cache.
+                results[i] = {"query": query, "error": str(item)}
+                continue
+            if search.target == "passages":
+                items = [_passage_item(hit) for hit in item["hits"]]
+            else:
+                items = [
+                    {"id": hit["_id"], "score": hit["_score"], **hit["_source"]}
+                    for hit in item["hits"]
+                ]
+            results[i] = {"query": query, "result": items}
+            search_cache.set(search_cache.key(namespace, query, **filters), {"result": items})
+
+    response = {"results": results}
+    if search.fuse:
+        response["fused"] = _fuse(results, search.target, search.size)
+    return response
+
+
+def _passage_item(hit: dict) -> dict:
+    """Formata um trecho retornado pelo índice de trechos."""
+    return {
+        "id": hit["_source"]["parent_id"],
+        "filename": hit["_source"].get("filename", "Sem nome"),
+        "chunk_no": hit["_source"]["chunk_no"],
+        "heading": hit["_source"].get("heading"),
+        "start_offset": hit["_source"]["start_offset"],
+        "end_offset": hit["_source"]["end_offset"],
+        "content": hit["_source"]["content"],
+        "score": hit["_score"],
+        "category": hit["_source"].get("category", "N/A"),
+        "uploaded_by": hit["_source"].get("uploaded_by", "N/A")
+    }
+
+
+async def _hybrid_passages(
+    query: str, category: str | None, access_level: int, size: int
+) -> list[dict]:
+    """
+    Busca textual e por embeddings no índice de trechos, combinadas pela
+    reciprocal rank fusion.
+
+    Consultas sem nenhum termo conhecido pelo modelo (vetor nulo) ficam só
+    com a busca textual.
+    """
+    requests = [SearchRequest(CHUNK_INDEX, size, category, access_level, text=query)]
+    vector = Embedder().encode([query])[0]
+    if vector.any():
+        requests.append(
+            SearchRequest(CHUNK_INDEX, size, category, access_level, vector=vector.tolist())
+        )
+    results = []
+    for item in await search_backend.search(requests):
+        if isinstance(item, SearchError):
+            raise item
+        results.append({"result": [_passage_item(hit) for hit in item["hits"]]})
+    return _fuse(results, "passages", size)
+
+
+def _fuse(results: list[dict], target: str, size: int) -> list[dict]:
+    """
+    Combina os resultados das consultas pela reciprocal rank fusion.
+
+    Trechos são identificados pelo documento e pelo número do trecho, então
+    o mesmo trecho encontrado por reformulações diferentes aparece uma vez.
+    """
+    def item_key(item: dict) -> str:
+        if target == "passages":
+            return f"{item['id']}_{item['chunk_no']}"
+        return item["id"]
+
+    items = {}
+    rankings = []
+    for result in results:
+        ranking = []
+        for item in result.get("result", []):
+            key = item_key(item)
+            items.setdefault(key, item)
+            ranking.append(key)
+        rankings.append(ranking)
+
+    return [
+        {**items[key], "rrf_score": round(score, 6)}
+        for key, score in reciprocal_rank_fusion(rankings)[:size]
+    ]
+
+
+@document_router.get("/list")
+async def list_documents(
+    access_level: int = Query(0),
+    category: str | None = Query(None),
+    size: int = Query(100, ge=1, le=LIST_MAX_SIZE),
+    sort: str = Query("data_upload"),
+    order: str = Query("desc", pattern="^(asc|desc)$"),
+    cursor: str | None = Query(None),
+):
+    """
+    Lista os metadados dos documentos que o usuário tem acesso, uma página por vez.
+
+    As páginas seguintes são pedidas com o `next_cursor` da resposta
+    anterior, que fica nulo na última página.
+    """
+    if sort not in LIST_SORTS:
+        raise HTTPException(status_code=400, detail=f"Ordenação inválida: {sort}")
+
+    try:
+        hits, total, next_cursor = await search_backend.list_documents(
+            category, access_level, sort, order, size, cursor
+        )
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except CursorExpired as e:
+        raise HTTPException(status_code=410, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro ao listar documentos: {str(e)}")
 
+    return {
+        "documents": [_list_item(hit) for hit in hits],
+        "total": total,
+        "next_cursor": next_cursor,
+    }
+
+
+@document_router.get("/list/export")
+async def export_documents(
+    access_level: int = Query(0),
+    category: str | None = Query(None),
+    sort: str = Query("data_upload"),
+    order: str = Query("desc", pattern="^(asc|desc)$"),
+):
+    """Exporta os metadados de todos os documentos acessíveis em NDJSON"""
+    if sort not in LIST_SORTS:
+        raise HTTPException(status_code=400, detail=f"Ordenação inválida: {sort}")
+
+    async def lines():
+        cursor = None
+        try:
+            while True:
+                hits, _, cursor = await search_backend.list_documents(
+                    category, access_level, sort, order, LIST_MAX_SIZE, cursor
+                )
+                for hit in hits:
+                    yield json.dumps(_list_item(hit), ensure_ascii=False) + "\n"
+                if cursor is None:
+                    return
+        finally:
+            # Exportação interrompida pelo cliente antes da última página.
+            if cursor is not None:
+                await search_backend.close_cursor(cursor)
+
+    return StreamingResponse(
+        lines(),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": "attachment; filename=documentos.ndjson"},
+    )
+
+
+@document_router.get("/facets")
+async def document_facets(
+    access_level: int = Query(0),
+    category: str | None = Query(None),
+    interval: str = Query("month"),
+    size: int = Query(20, ge=1, le=100),
+):
+    """
+    Retorna as contagens de documentos por categoria, autor e data de upload.
+
+    Só as agregações são calculadas (nenhum documento é transferido), para
+    montar os filtros da interface sem baixar o acervo.
+    """
+    if interval not in FACET_INTERVALS:
+        raise HTTPException(status_code=400, detail=f"Intervalo inválido: {interval}")
+
+    cache_key = search_cache.key(
+        "facets", "", category=category, access_level=access_level, interval=interval, size=size
+    )
+    cached = search_cache.get(cache_key)
+    if cached is not None:
+        return cached
+
+    try:
+        response = await search_backend.facets(category, access_level, interval, size)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erro ao calcular facetas: {str(e)}")
+
+    search_cache.set(cache_key, response)
+    return response
+
+
+def _list_item(hit: dict) -> dict:
+    return {
+        "id": hit["_id"],
+        "filename": hit["_source"].get("filename", ""),
+        "category": hit["_source"].get("category", ""),
+        "access_level": hit["_source"].get("access_level", 0),
+        "uploaded_by": hit["_source"].get("uploaded_by", ""),
+        "data_upload": hit["_source"].get("data_upload", ""),
+        "page_count": hit["_source"].get("page_count"),
+    }
+
 
 @document_router.get("/{doc_id}/markdown")
-async def get_document_markdown(doc_id: str):
-    """Retorna o conteúdo markdown de um documento"""
+async def get_document_markdown(
+    doc_id: str,
+    request: Request,
+    page: int | None = Query(None, ge=1),
+    page_size: int = Query(1, ge=1, le=MARKDOWN_MAX_PAGE_SIZE),
+):
+    """
+    Retorna o conteúdo markdown de um documento.
+
+    Com `page`, retorna só `page_size` páginas a partir dela (as páginas do
+    markdown são separadas por form feed), para o visualizador carregar o
+    documento aos poucos. A resposta vai comprimida com gzip e com ETag da
+    versão gravada do markdown; revalidações respondem 304 sem ler o
+    conteúdo.
+    """
+    if not ObjectId.is_valid(doc_id):
+        raise HTTPException(status_code=404, detail="Documento não encontrado")
+
     try:
-        result = es.get(index="healthcom_docs", id=doc_id)
-        if not result:
-            raise HTTPException(status_code=404, detail="Documento não encontrado")
-        
-        return {
-            "content": result["_source"].get("content", ""),
-            "filename": result["_source"].get("filename", "")
-        }
+        version = await mongo_client.markdown.aversion(ObjectId(doc_id))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro ao buscar markdown: {str(e)}")
+    stored = None
+    if version is None:
+        # Documentos indexados antes do armazenamento comprimido ainda têm o
+        # markdown no _source; ele é copiado para o MongoDB na primeira leitura.
+        try:
+            source = await search_backend.get_source(DOC_INDEX, doc_id)
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Erro ao buscar markdown: {str(e)}")
+        if not source or "content" not in source:
+            raise HTTPException(status_code=404, detail="Documento não encontrado")
+        stored = source.get("filename", ""), source["content"]
+        await asyncio.to_thread(mongo_client.markdown.put, ObjectId(doc_id), *stored)
+        version = await mongo_client.markdown.aversion(ObjectId(doc_id))
+
+    # Cada fatia e cada codificação é uma representação, com ETag própria.
+    selection = "full" if page is None else f"p{page}x{page_size}"
+    encoding = "gzip" if accepts_gzip(request.headers) else "identity"
+    headers = {
+        "ETag": strong_etag(f"{version}-{selection}-{encoding}"),
+        "Cache-Control": "private, no-cache",
+    }
+    if not_modified(request.headers, headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+
+    if stored is None:
+        try:
+            stored = await mongo_client.markdown.aget(ObjectId(doc_id))
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Erro ao buscar markdown: {str(e)}")
+        if stored is None:
+            raise HTTPException(status_code=404, detail="Documento não encontrado")
+
+    filename, content = stored
+    if page is None:
+        return json_response(request.headers, {"content": content, "filename": filename}, headers)
+
+    pages = content.split(PAGE_SEPARATOR)
+    if page > len(pages):
+        raise HTTPException(status_code=404, detail="Página não encontrada")
+    last = min(page + page_size, len(pages) + 1)
+    payload = {
+        "filename": filename,
+        "page_count": len(pages),
+        "pages": [
+            {"page": number, "content": pages[number - 1]} for number in range(page, last)
+        ],
+        "next_page": last if last <= len(pages) else None,
+    }
+    return json_response(request.headers, payload, headers)
+
+
+@document_router.get("/{doc_id}/preview/{page}")
+async def get_page_preview(
+    doc_id: str,
+    user_access_level: int,
+    request: Request,
+    page: int = Path(ge=1),
+    width: int = Query(PREVIEW_WIDTH, ge=64, le=PREVIEW_MAX_WIDTH),
+):
+    """
+    Retorna a prévia de uma página do PDF em JPEG de baixa resolução.
+
+    As prévias ficam no cache em disco endereçado pelo SHA-256 do PDF; as
+    do primeiro lote de páginas são geradas na ingestão e as demais na
+    primeira requisição, quando o PDF é copiado do GridFS para o spool e o
+    lote da página é renderizado no pool de extração.
+    """
+    if not ObjectId.is_valid(doc_id):
+        raise HTTPException(status_code=404, detail="Documento não encontrado")
+    try:
+        file = await mongo_client.adb["fs.files"].find_one(
+            {"_id": ObjectId(doc_id)}, {"metadata": 1}
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erro ao gerar prévia: {str(e)}")
+    if not file or not file.get("metadata"):
+        raise HTTPException(status_code=404, detail="Documento não encontrado")
+    if file["metadata"]["access_level"] > user_access_level:
+        raise HTTPException(status_code=403, detail="Acesso negado")
+
+    # Arquivos do GridFS não mudam; os enviados antes do hash usam o ID.
+    sha256 = file["metadata"].get("sha256") or doc_id
+    etag = strong_etag(preview_cache.key(sha256, page, width))
+    headers = {"ETag": etag, "Cache-Control": "private, max-age=86400"}
+    if not_modified(request.headers, etag):
+        return Response(status_code=304, headers=headers)
+
+    # Páginas além do fim nunca entram no cache; são recusadas antes da
+    # cópia do PDF, pelo número de páginas guardado nos metadados.
+    page_count = file["metadata"].get("page_count")
+    if page_count is not None and page > page_count:
+        raise HTTPException(status_code=404, detail="Página não encontrada")
+
+    data = await asyncio.to_thread(preview_cache.get, sha256, page, width)
+    if data is None:
+        async def download() -> SpooledUpload:
+            grid_out = await mongo_client.afs.open_download_stream(ObjectId(doc_id))
+            return await spool_upload(grid_out)
+
+        try:
+            if page_count is None:
+                # Arquivos gravados antes do número de páginas nos metadados.
+                source = await search_backend.get_source(DOC_INDEX, doc_id)
+                page_count = (source or {}).get("page_count")
+                if page_count is None:
+                    page_count, data = await render_missing_preview(
+                        sha256, page, width, download
+                    )
+                await mongo_client.adb["fs.files"].update_one(
+                    {"_id": ObjectId(doc_id)}, {"$set": {"metadata.page_count": page_count}}
+                )
+            if data is None and page <= page_count:
+                _, data = await render_missing_preview(sha256, page, width, download)
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Erro ao gerar prévia: {str(e)}")
+        if data is None:
+            raise HTTPException(status_code=404, detail="Página não encontrada")
+    return Response(data, media_type="image/jpeg", headers=headers)
 
 
 if __name__ == "__main__":
@@ -30,16 +30,16 @@ async def add_user(user: NewUserSchema):
     Raises:
         HTTPException: Se o usuário já existir ou se ocorrer um erro ao adicionar o usuário.
     """
-    db = mongo_client.db
+    db = mongo_client.adb
     user_collection = db["users"]
 
-    if user_collection.find_one({"user_name": user.user_name}):
+    if await user_collection.find_one({"user_name": user.user_name}):
         raise HTTPException(status_code=400, detail="Usuário já existe")
 
     try:
         user_dict = user.as_dict()
         user_dict["created_at"] = datetime.now()
-        result = user_collection.insert_one(user_dict)
+        result = await user_collection.insert_one(user_dict)
         return {"id": str(result.inserted_id)}
     except Exception as e:
         raise HTTPException(
@@ -57,11 +57,11 @@ async def get_user(user_id: str) -> UserSchema:
     Raises:
         HTTPException: Se o usuário não for encontrado ou se ocorrer um erro ao buscar o usuário.
     """
-    db = mongo_client.db
+    db = mongo_client.adb
     user_collection = db["users"]
 
     try:
-        user = user_collection.find_one({"_id": ObjectId(user_id)})
+        user = await user_collection.find_one({"_id": ObjectId(user_id)})
         if not user:
             raise HTTPException(
                 status_code=404, detail="Usuário não encontrado")
@@ -83,13 +83,13 @@ async def update_user(user_id: str, user_update: UserUpdateSchema):
     Raises:
         HTTPException: Se o usuário não for encontrado ou se ocorrer um erro ao atualizar o usuário.
     """
-    db = mongo_client.db
+    db = mongo_client.adb
     user_collection = db["users"]
 
     try:
         user_update_dict = user_update.model_dump(exclude_unset=True)
         user_update_dict["updated_at"] = datetime.now()
-        result = user_collection.update_one(
+        result = await user_collection.update_one(
             {"_id": ObjectId(user_id)},
             {"$set": user_update_dict},
         )
@@ -114,11 +114,11 @@ async def delete_user(user_id: str):
         HTTPException: Se o usuário não for encontrado ou se
             ocorrer um erro ao deletar o usuário.
     """
-    db = mongo_client.db
+    db = mongo_client.adb
     user_collection = db["users"]
 
     try:
-        result = user_collection.delete_one({"_id": ObjectId(user_id)})
+        result = await user_collection.delete_one({"_id": ObjectId(user_id)})
         if result.deleted_count == 0:
             raise HTTPException(
                 status_code=404, detail="Usuário não encontrado")
@@ -140,14 +140,14 @@ async def get_users(limit: int = 10, offset: int = 0) -> dict:
     Raises:
         HTTPException: Se ocorrer um erro ao buscar os usuários.
     """
-    db = mongo_client.db
+    db = mongo_client.adb
     user_collection = db["users"]
 
     try:
-        users = list(user_collection.find().skip(offset).limit(limit))
+        users = await user_collection.find().skip(offset).limit(limit).to_list()
         for user in users:
             user["_id"] = str(user["_id"])
-        total_users = user_collection.count_documents({})
+        total_users = await user_collection.count_documents({})
         return {
             "total": total_users,
             "users": users
@@ -169,11 +169,11 @@ async def login(user_login: UserLoginSchema):
         HTTPException: Se o usuário não for encontrado
             ou se ocorrer um erro ao realizar o login.
     """
-    db = mongo_client.db
+    db = mongo_client.adb
     user_collection = db["users"]
 
     try:
-        user = user_collection.find_one(
+        user = await user_collection.find_one(
             {"user_name": user_login.user_name,
                 "password": user_login.password.get_secret_value()}
         )
@@ -18,15 +18,25 @@ search_results = {
 }
 
 
-def make_search(access_level: str, category: str, query: str) -> str:
+def make_search(
+    access_level: str, category: str, query: str, variations: list[str] | None = None
+) -> str:
     """Função para criar a busca na API interna."""
     global search_results
     
-    response = requests.get(
-        f"{BASE_API_URL}/api/v1/document/search",
-        params={"query": query, "category": category,
-                "access_level": access_level}
-    )
+    if variations:
+        # Reformulações vão juntas em um único /msearch, com o ranking combinado.
+        response = requests.post(
+            f"{BASE_API_URL}/api/v1/document/msearch",
+            json={"queries": [query, *variations], "category": category,
+                  "access_level": access_level}
+        )
+    else:
+        response = requests.get(
+            f"{BASE_API_URL}/api/v1/document/search/passages",
+            params={"query": query, "category": category,
+                    "access_level": access_level, "mode": "hybrid"}
+        )
     
     # Resetar resultados
     search_results = {
@@ -35,24 +45,26 @@ def make_search(access_level: str, category: str, query: str) -> str:
     }
     
     if response.status_code == 200:
-        results = response.json().get("result", [])
+        passages = response.json().get("fused" if variations else "result", [])
         
-        if not results:
+        if not passages:
             return "Nenhum documento encontrado para esta busca."
         
-        result_text = f"Encontrados {len(results)} documento(s) relevante(s):\n\n"
+        result_text = f"Encontrados {len(passages)} trecho(s) relevante(s):\n\n"
         
-        for idx, doc in enumerate(results, 1):
-            doc_name = doc.get("filename", "Sem nome")
-            content = doc.get("content", "")[:300]  # Primeiros 300 caracteres
+        for idx, passage in enumerate(passages, 1):
+            doc_name = passage.get("filename", "Sem nome")
             
-            # Armazenar documento
-            search_results["documents"].append(doc)
-            search_results["names"].append(doc_name)
+            # Armazenar cada documento uma única vez
+            if passage["id"] not in [doc["id"] for doc in search_results["documents"]]:
+                search_results["documents"].append(passage)
+                search_results["names"].append(doc_name)
             
-            result_text += f"Documento {idx}: {doc_name}\n"
-            result_text += f"Categoria: {doc.get('category', 'N/A')}\n"
-            result_text += f"Resumo: {content}...\n\n"
+            result_text += f"Trecho {idx} (Documento: {doc_name})\n"
+            result_text += f"Categoria: {passage.get('category', 'N/A')}\n"
+            if passage.get("heading"):
+                result_text += f"Seção: {passage['heading']}\n"
+            result_text += f"Conteúdo: {passage.get('content', '')}\n\n"
         
         return result_text
     else:
@@ -67,6 +79,12 @@ class SearchToolInput(BaseModel):
         O termo de busca é alguma palavra chave ou trecho que pode estar nos documentos alvo.
         """
     )
+    variations: list[str] = Field(
+        default_factory=list, description="""
+        Reformulações opcionais do termo de busca (sinônimos, siglas, outra redação).
+        Todas são buscadas de uma vez e os trechos mais relevantes no conjunto são retornados.
+        """
+    )
 
 
 class SearchTool(BaseTool):
@@ -76,7 +94,7 @@ class SearchTool(BaseTool):
     description: str = "Ferramenta para buscar informações nos documentos."
     args_schema: Type[BaseModel] = SearchToolInput
 
-    def _run(self, query: str) -> str:  # type: ignore
+    def _run(self, query: str, variations: list[str] | None = None) -> str:  # type: ignore
         """Método para executar a busca na API interna."""
         pass
 
@@ -2,7 +2,13 @@
 
 import os
 import logging
-from elasticsearch import Elasticsearch
+import re
+import threading
+
+from elasticsearch import AsyncElasticsearch, BadRequestError, Elasticsearch, NotFoundError
+
+from src.ingest.embedding import EMBEDDING_DIMS
+from src.mongo.client import MongoDBClient
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -12,11 +18,247 @@ ES_PORT = int(os.getenv("ES_PORT", '9200'))
 ELASTIC_USER = os.getenv("ELASTIC_USER", "elastic")
 ELASTIC_PASSWORD = os.getenv("ELASTIC_PASSWORD", "changeme")
 
+CLIENT_OPTIONS = {
+    "hosts": [f"http://{ES_HOST}:{ES_PORT}"],
+    "basic_auth": (ELASTIC_USER, ELASTIC_PASSWORD),
+    "verify_certs": False,
+    "max_retries": 30,
+    "retry_on_timeout": True,
+    "request_timeout": 30,
+    "ssl_show_warn": False,
+}
+
+DOC_INDEX = "healthcom_docs"
+CHUNK_INDEX = "healthcom_chunks"
+
+# Subcampo com os prefixos das palavras usado pelas sugestões.
+SUGGEST_FIELD = {
+    "type": "text",
+    "analyzer": "suggest_index_analyzer",
+    "search_analyzer": "suggest_search_analyzer"
+}
+
+ES_NUMBER_OF_SHARDS = int(os.getenv("ES_NUMBER_OF_SHARDS", "1"))
+ES_NUMBER_OF_REPLICAS = int(os.getenv("ES_NUMBER_OF_REPLICAS", "0"))
+# Shards por valor de roteamento; acima de 1, espalha as categorias grandes.
+ES_ROUTING_PARTITION_SIZE = int(os.getenv("ES_ROUTING_PARTITION_SIZE", "1"))
+
+# Condições para criar uma nova geração do índice de escrita (rollover).
+ES_ROLLOVER_MAX_AGE = os.getenv("ES_ROLLOVER_MAX_AGE", "30d")
+ES_ROLLOVER_MAX_PRIMARY_SHARD_SIZE = os.getenv("ES_ROLLOVER_MAX_PRIMARY_SHARD_SIZE", "30gb")
+
+# Documentos com mais de uma categoria (ver `merge_duplicate`) ficam todos
+# neste valor de roteamento, consultado junto com a categoria filtrada.
+MULTI_CATEGORY_ROUTING = "_multi"
+
+GENERATION_PATTERN = re.compile(r"^(.*)-(\d+)$")
+
+
+def versioned_index(alias: str, version: int) -> str:
+    """Nome da primeira geração da versão `version` do índice acessado pelo alias."""
+    return f"{alias}_v{version}-000001"
+
+
+def next_generation(index: str) -> str:
+    """Nome da geração seguinte de um índice (`healthcom_docs_v2-000003`)."""
+    match = GENERATION_PATTERN.match(index)
+    if match is None:
+        return f"{index}-000002"
+    return f"{match.group(1)}-{int(match.group(2)) + 1:06d}"
+
+
+def category_routing(category: str | list[str]) -> str:
+    """Valor de roteamento de um documento pela(s) sua(s) categoria(s)."""
+    categories = category if isinstance(category, list) else [category]
+    return categories[0] if len(categories) == 1 else MULTI_CATEGORY_ROUTING
+
+
+def search_routing(category: str | None) -> str | None:
+    """Roteamento de uma busca filtrada pela categoria (None busca em todos os shards)."""
+    return f"{category},{MULTI_CATEGORY_ROUTING}" if category else None
+
+
+def _index_settings() -> dict:
+    settings = {
+        "number_of_shards": ES_NUMBER_OF_SHARDS,
+        "number_of_replicas": ES_NUMBER_OF_REPLICAS,
+        "analysis": {
+            "analyzer": {
+                "content_analyzer": {
+                    "type": "standard",
+                    "stopwords": "_portuguese_"
+                },
+                # Prefixos de cada palavra na indexação, para as sugestões
+                # enquanto o usuário digita (ver `SUGGEST_FIELD`).
+                "suggest_index_analyzer": {
+                    "tokenizer": "standard",
+                    "filter": ["lowercase", "asciifolding", "suggest_edge_ngram"]
+                },
+                "suggest_search_analyzer": {
+                    "tokenizer": "standard",
+                    "filter": ["lowercase", "asciifolding"]
+                }
+            },
+            "filter": {
+                "suggest_edge_ngram": {
+                    "type": "edge_ngram",
+                    "min_gram": 1,
+                    "max_gram": 20
+                }
+            }
+        }
+    }
+    if ES_ROUTING_PARTITION_SIZE > 1:
+        settings["routing_partition_size"] = ES_ROUTING_PARTITION_SIZE
+    return settings
+
+
+def _without_suggest(properties: dict) -> dict:
+    """Cópia do mapeamento sem os subcampos de sugestão (ver `SUGGEST_FIELD`)."""
+    stripped = {}
+    for name, field in properties.items():
+        if "fields" in field:
+            subfields = {
+                key: value for key, value in field["fields"].items() if value != SUGGEST_FIELD
+            }
+            field = {key: value for key, value in field.items() if key != "fields"}
+            if subfields:
+                field["fields"] = subfields
+        stripped[name] = field
+    return stripped
+
+
+def doc_index_body() -> dict:
+    """Configurações e mapeamento do índice de documentos."""
+    return {
+        "settings": _index_settings(),
+        "mappings": {
+            # Roteados pela categoria (ver `category_routing`).
+            "_routing": {
+                "required": True
+            },
+            # O markdown completo fica no MongoDB (ver MarkdownStore);
+            # aqui o conteúdo é só indexado, sem cópia no _source.
+            "_source": {
+                "excludes": ["content"]
+            },
+            "properties": {
+                "file_id": {
+                    "type": "keyword"
+                },
+                "filename": {
+                    "type": "text",
+                    "analyzer": "content_analyzer",
+                    "fields": {
+                        "keyword": {
+                            "type": "keyword",
+                            "ignore_above": 256
+                        },
+                        "suggest": SUGGEST_FIELD
+                    }
+                },
+                "content": {
+                    "type": "text",
+                    "analyzer": "content_analyzer",
+                    "index": True
+                },
+                "headings": {
+                    "type": "text",
+                    "analyzer": "content_analyzer",
+                    "fields": {
+                        "suggest": SUGGEST_FIELD
+                    }
+                },
+                "category": {
+                    "type": "keyword"
+                },
+                "access_level": {
+                    "type": "integer"
+                },
+                "uploaded_by": {
+                    "type": "keyword"
+                },
+                "data_upload": {
+                    "type": "date"
+                },
+                "extraction_tier": {
+                    "type": "keyword"
+                },
+                "extraction_time": {
+                    "type": "float"
+                },
+                "page_count": {
+                    "type": "integer"
+                }
+            }
+        }
+    }
+
+
+def chunk_index_body() -> dict:
+    """Configurações e mapeamento do índice de trechos."""
+    return {
+        "settings": _index_settings(),
+        "mappings": {
+            "_routing": {
+                "required": True
+            },
+            "properties": {
+                "parent_id": {
+                    "type": "keyword"
+                },
+                "chunk_no": {
+                    "type": "integer"
+                },
+                "page": {
+                    "type": "integer"
+                },
+                "start_offset": {
+                    "type": "integer",
+                    "index": False
+                },
+                "end_offset": {
+                    "type": "integer",
+                    "index": False
+                },
+                "heading": {
+                    "type": "text",
+                    "analyzer": "content_analyzer"
+                },
+                "filename": {
+                    "type": "text",
+                    "analyzer": "content_analyzer"
+                },
+                "content": {
+                    "type": "text",
+                    "analyzer": "content_analyzer"
+                },
+                "category": {
+                    "type": "keyword"
+                },
+                "access_level": {
+                    "type": "integer"
+                },
+                "uploaded_by": {
+                    "type": "keyword"
+                },
+                "embedding": {
+                    "type": "dense_vector",
+                    "dims": EMBEDDING_DIMS,
+                    "index": True,
+                    "similarity": "cosine"
+                }
+            }
+        }
+    }
+
 
 class ElasticsearchConnection:
     """Classe responsável por realizar a conexão com o Elasticsearch."""
     _instance = None
     _initialized = False
+    _bulk_lock = threading.Lock()
+    _bulk_loads = 0
 
     def __init__(self) -> None:
         """
@@ -24,16 +266,11 @@ class ElasticsearchConnection:
         """
         if self._initialized:
             return
-        self.es = Elasticsearch(
-            hosts=[f"http://{ES_HOST}:{ES_PORT}"],
-            basic_auth=(ELASTIC_USER, ELASTIC_PASSWORD),
-            verify_certs=False,
-            max_retries=30,
-            retry_on_timeout=True,
-            request_timeout=30,
-            ssl_show_warn=False,
-        )
+        self.es = Elasticsearch(**CLIENT_OPTIONS)
+        self.aes: AsyncElasticsearch | None = None
         self._create_doc_index()
+        self._create_chunk_index()
+        self.routed = all(self._is_routed(alias) for alias in (DOC_INDEX, CHUNK_INDEX))
         self._initialized = True
 
     def __new__(cls) -> "ElasticsearchConnection":
@@ -44,50 +281,211 @@ class ElasticsearchConnection:
             cls._instance = super(ElasticsearchConnection, cls).__new__(cls)
         return cls._instance
 
+    async def connect_async(self) -> None:
+        """
+        Cria o cliente assíncrono usado pelas rotas da API.
+
+        Deve ser chamado dentro do event loop que atende as requisições (no
+        lifespan da aplicação); a criação dos índices continua no cliente
+        síncrono.
+        """
+        if self.aes is None:
+            self.aes = AsyncElasticsearch(**CLIENT_OPTIONS)
+
+    async def close_async(self) -> None:
+        """Fecha o cliente assíncrono."""
+        if self.aes is not None:
+            await self.aes.close()
+            self.aes = None
+
     def _create_doc_index(self) -> None:
-        index_name = "healthcom_docs"
-        if self.es.indices.exists(index=index_name):
-            return
+        self._create_index(DOC_INDEX, doc_index_body())
+
+    def _create_chunk_index(self) -> None:
+        self._create_index(CHUNK_INDEX, chunk_index_body())
+
+    def _create_index(self, alias: str, body: dict) -> None:
+        """
+        Cria a primeira versão de um índice, acessada pelo alias.
 
+        Índices criados antes do versionamento têm o próprio nome do alias e
+        são mantidos; o comando de reindexação os substitui por um alias.
+        Campos novos do mapeamento são acrescentados aos índices existentes,
+        e o índice de um alias antigo vira o índice de escrita, para que o
+        rollover mantenha as gerações anteriores no alias.
+        """
+        if self.es.indices.exists(index=alias):
+            # Os subcampos de sugestão dependem de analisadores que índices
+            # antigos não definem; os demais campos vão em uma chamada à
+            # parte, para não falharem junto com eles.
+            properties = body["mappings"]["properties"]
+            stripped = _without_suggest(properties)
+            self._put_mapping(alias, stripped)
+            if stripped != properties:
+                if self._has_analyzer(alias, SUGGEST_FIELD["analyzer"]):
+                    self._put_mapping(alias, properties)
+                else:
+                    logger.warning(
+                        "Índice %s sem os analisadores de sugestão; execute a "
+                        "reindexação para habilitar as sugestões", alias,
+                    )
+            if self.es.indices.exists_alias(name=alias) and self._write_index(alias) is None:
+                indices = list(self.es.indices.get_alias(name=alias))
+                if len(indices) == 1:
+                    self.es.indices.put_alias(index=indices[0], name=alias, is_write_index=True)
+            return
         self.es.indices.create(
-            index=index_name,
-            body={
-                "settings": {
-                    "number_of_shards": 1,
-                    "number_of_replicas": 0,
-                    "analysis": {
-                        "analyzer": {
-                            "content_analyzer": {
-                                "type": "standard",
-                                "stopwords": "_portuguese_"
-                            }
-                        }
-                    }
+            index=versioned_index(alias, 1),
+            body={**body, "aliases": {alias: {"is_write_index": True}}},
+        )
+
+    def _put_mapping(self, alias: str, properties: dict) -> None:
+        try:
+            self.es.indices.put_mapping(index=alias, properties=properties)
+        except BadRequestError as e:
+            logger.warning(
+                "Mapeamento de %s difere do atual, execute a reindexação: %s", alias, e
+            )
+
+    def _has_analyzer(self, alias: str, analyzer: str) -> bool:
+        """Se todos os índices do alias definem o analisador."""
+        settings = self.es.indices.get_settings(index=alias)
+        return all(
+            analyzer in value["settings"]["index"].get("analysis", {}).get("analyzer", {})
+            for value in settings.values()
+        )
+
+    def _is_routed(self, alias: str) -> bool:
+        """Se todos os índices do alias exigem o roteamento por categoria."""
+        mappings = self.es.indices.get_mapping(index=alias)
+        return all(
+            value["mappings"].get("_routing", {}).get("required", False)
+            for value in mappings.values()
+        )
+
+    def _write_index(self, alias: str) -> str | None:
+        """Índice que recebe as escritas feitas pelo alias."""
+        for index, value in self.es.indices.get_alias(name=alias).items():
+            if value["aliases"][alias].get("is_write_index"):
+                return index
+        return None
+
+    def rollover(self) -> None:
+        """
+        Cria uma nova geração dos índices cujo índice de escrita atingiu a
+        idade ou o tamanho de shard configurados.
+
+        A nova geração passa a receber as escritas e as anteriores continuam
+        no alias, então as buscas cobrem todas. Índices com o próprio nome do
+        alias (anteriores ao versionamento) só mudam com a reindexação.
+        """
+        for alias, body in ((DOC_INDEX, doc_index_body()), (CHUNK_INDEX, chunk_index_body())):
+            if not self.es.indices.exists_alias(name=alias):
+                continue
+            write_index = self._write_index(alias)
+            if write_index is None:
+                continue
+            result = self.es.indices.rollover(
+                alias=alias,
+                new_index=next_generation(write_index),
+                conditions={
+                    "max_age": ES_ROLLOVER_MAX_AGE,
+                    "max_primary_shard_size": ES_ROLLOVER_MAX_PRIMARY_SHARD_SIZE,
                 },
-                "mappings": {
-                    "properties": {
-                        "filename": {
-                            "type": "text",
-                            "analyzer": "content_analyzer"
-                        },
-                        "content": {
-                            "type": "text",
-                            "analyzer": "content_analyzer",
-                            "index": True
-                        },
-                        "category": {
-                            "type": "keyword"
-                        },
-                        "access_level": {
-                            "type": "integer"
-                        },
-                        "uploaded_by": {
-                            "type": "keyword"
+                settings=body["settings"],
+                mappings=body["mappings"],
+            )
+            if result["rolled_over"]:
+                logger.info(
+                    "Rollover de %s: %s -> %s", alias, result["old_index"], result["new_index"]
+                )
+
+    def swap_aliases(self, targets: dict[str, str]) -> None:
+        """
+        Aponta cada alias para o novo índice em uma única operação atômica.
+
+        Os índices anteriores (todas as gerações) deixam o alias, mas não
+        são apagados. Um índice antigo com o próprio nome do alias é
+        removido, já que não há outra forma de liberar o nome.
+
+        Args:
+            targets (dict[str, str]): Novo índice de cada alias.
+        """
+        actions = []
+        for alias, index in targets.items():
+            if self.es.indices.exists_alias(name=alias):
+                for current in self.es.indices.get_alias(name=alias):
+                    actions.append({"remove": {"index": current, "alias": alias}})
+            elif self.es.indices.exists(index=alias):
+                actions.append({"remove_index": {"index": alias}})
+            actions.append({"add": {"index": index, "alias": alias, "is_write_index": True}})
+        self.es.indices.update_aliases(actions=actions)
+
+    def begin_bulk_load(self, indices: tuple[str, ...] = (DOC_INDEX, CHUNK_INDEX)) -> None:
+        """
+        Aplica configurações de carga em massa aos índices.
+
+        O refresh é desabilitado e as réplicas zeradas enquanto houver alguma
+        carga em andamento (cada chamada deve ter seu `end_bulk_load`). As
+        configurações originais ficam no MongoDB (`bulk_load_settings`), e
+        não só na memória, para que sobrevivam ao fim do processo no meio da
+        carga (ver `restore_bulk_load_settings`). As chamadas são síncronas;
+        em código assíncrono, rodam em uma thread.
+        """
+        cls = type(self)
+        with cls._bulk_lock:
+            if cls._bulk_loads == 0:
+                saved = MongoDBClient().db["bulk_load_settings"]
+                settings = self.es.indices.get_settings(index=list(indices))
+                for index, value in settings.items():
+                    current = value["settings"]["index"]
+                    # Se outra carga (ou uma interrompida) já guardou as
+                    # configurações, as atuais são as de carga e não valem.
+                    saved.update_one(
+                        {"_id": index},
+                        {
+                            "$setOnInsert": {
+                                "refresh_interval": current.get("refresh_interval"),
+                                "number_of_replicas": current.get("number_of_replicas"),
+                            }
                         },
-                        "data_upload": {
-                            "type": "date"
-                        }
-                    }
-                }
-            }
-        )
+                        upsert=True,
+                    )
+                self.es.indices.put_settings(
+                    index=list(indices),
+                    settings={"refresh_interval": "-1", "number_of_replicas": 0},
+                )
+            cls._bulk_loads += 1
+
+    def end_bulk_load(self) -> None:
+        """
+        Encerra uma carga em massa; quando a última termina, as configurações
+        originais são restauradas e os índices atualizados (refresh).
+        """
+        cls = type(self)
+        with cls._bulk_lock:
+            cls._bulk_loads -= 1
+            if cls._bulk_loads == 0:
+                self.restore_bulk_load_settings()
+
+    def restore_bulk_load_settings(self) -> None:
+        """
+        Restaura as configurações guardadas por `begin_bulk_load` e atualiza
+        os índices (refresh).
+
+        Também roda no início da API, antes de qualquer carga do processo,
+        para desfazer uma carga interrompida; sem isso os índices ficariam
+        sem refresh e sem réplicas.
+        """
+        saved = MongoDBClient().db["bulk_load_settings"]
+        restored = []
+        for record in saved.find():
+            index = record.pop("_id")
+            try:
+                self.es.indices.put_settings(index=index, settings=record)
+                restored.append(index)
+            except NotFoundError:
+                logger.warning("Índice %s não existe mais; configurações descartadas", index)
+            saved.delete_one({"_id": index})
+        if restored:
+            self.es.indices.refresh(index=restored)
@@ -0,0 +1,28 @@
+"""Módulo para combinar rankings de buscas diferentes"""
+
+import os
+
+RRF_K = int(os.getenv("RRF_K", "60"))
+
+
+def reciprocal_rank_fusion(rankings: list[list[str]], k: int = RRF_K) -> list[tuple[str, float]]:
+    """
+    Combina rankings pela reciprocal rank fusion.
+
+    Cada item recebe a soma de `1 / (k + posição)` nos rankings em que
+    aparece, então itens bem posicionados em várias buscas sobem mesmo que
+    os scores originais não sejam comparáveis entre si.
+
+    Args:
+        rankings (list[list[str]]): IDs em ordem de relevância, um ranking por busca.
+        k (int): Constante de suavização; valores maiores achatam a diferença
+            entre as primeiras posições.
+
+    Returns:
+        list[tuple[str, float]]: IDs e scores combinados, do maior para o menor.
+    """
+    scores: dict[str, float] = {}
+    for ranking in rankings:
+        for position, item_id in enumerate(ranking, 1):
+            scores[item_id] = scores.get(item_id, 0.0) + 1.0 / (k + position)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
@@ -0,0 +1,175 @@
+"""Módulo do cache de resultados de busca"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from pymongo import ReturnDocument
+
+from src.mongo.client import MongoDBClient
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+SEARCH_CACHE_TTL = int(os.getenv("SEARCH_CACHE_TTL", "60"))
+SEARCH_CACHE_MAX_ENTRIES = int(os.getenv("SEARCH_CACHE_MAX_ENTRIES", "1024"))
+# Com uma URL redis:// o cache é compartilhado entre os processos da API.
+SEARCH_CACHE_URL = os.getenv("SEARCH_CACHE_URL")
+# Sem Redis, intervalo (em segundos) entre as leituras da geração no MongoDB.
+SEARCH_CACHE_SYNC_INTERVAL = float(os.getenv("SEARCH_CACHE_SYNC_INTERVAL", "2"))
+
+GENERATION_KEY = "search:generation"
+
+
+class LocalStore:
+    """
+    Armazenamento em memória com o subconjunto da interface do Redis usado
+    pelo cache (`get` e `set` com `ex`), limitado por entradas (LRU) e por
+    TTL.
+    """
+
+    def __init__(self, max_entries: int = SEARCH_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[str, tuple[bytes, float | None]] = OrderedDict()
+
+    def get(self, key: str) -> bytes | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: bytes, ex: int | None = None) -> None:
+        expires_at = time.monotonic() + ex if ex else None
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def dbsize(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+
+class SearchCache:
+    """
+    Classe do cache de respostas de busca.
+
+    A chave combina a consulta normalizada, os filtros e a geração atual do
+    índice; uploads e reindexações incrementam a geração, então as respostas
+    anteriores deixam de ser encontradas e expiram pelo TTL ou pela LRU.
+
+    No Redis a geração fica no próprio armazenamento. Com o armazenamento
+    local ela fica no MongoDB (coleção `search_cache`), para que as
+    invalidações de outros processos, como a troca de aliases feita pela
+    reindexação na CLI, cheguem à API em até `SEARCH_CACHE_SYNC_INTERVAL`
+    segundos.
+
+    Atributos:
+        store: Armazenamento local ou Redis.
+        hits: Respostas servidas pelo cache neste processo.
+        misses: Buscas que foram ao Elasticsearch neste processo.
+    """
+    _instance = None
+    _initialized = False
+
+    def __init__(self) -> None:
+        """
+        Inicializa o cache com o Redis configurado ou com o armazenamento local.
+        """
+        if self._initialized:
+            return
+        if SEARCH_CACHE_URL and redis is not None:
+            self.store = redis.Redis.from_url(SEARCH_CACHE_URL)
+        else:
+            self.store = LocalStore()
+        self.hits = 0
+        self.misses = 0
+        self._generation = 0
+        self._synced_at: float | None = None
+        self._initialized = True
+
+    def __new__(cls) -> "SearchCache":
+        """
+        Garante que apenas um cache seja criado por processo.
+        """
+        if cls._instance is None:
+            cls._instance = super(SearchCache, cls).__new__(cls)
+        return cls._instance
+
+    def generation(self) -> int:
+        """Geração atual do índice."""
+        if not isinstance(self.store, LocalStore):
+            return int(self.store.get(GENERATION_KEY) or 0)
+        now = time.monotonic()
+        if self._synced_at is None or now - self._synced_at >= SEARCH_CACHE_SYNC_INTERVAL:
+            stored = MongoDBClient().db["search_cache"].find_one({"_id": GENERATION_KEY})
+            self._generation = stored["value"] if stored else 0
+            self._synced_at = now
+        return self._generation
+
+    def invalidate(self) -> None:
+        """Incrementa a geração, invalidando todas as respostas em cache."""
+        if not isinstance(self.store, LocalStore):
+            self.store.incr(GENERATION_KEY)
+            return
+        stored = MongoDBClient().db["search_cache"].find_one_and_update(
+            {"_id": GENERATION_KEY},
+            {"$inc": {"value": 1}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+        self._generation = stored["value"]
+        self._synced_at = time.monotonic()
+
+    def key(self, namespace: str, query: str, **filters) -> str:
+        """
+        Monta a chave de uma busca.
+
+        A consulta é normalizada (caixa e espaços) e os filtros entram em
+        ordem fixa, então variações equivalentes caem na mesma entrada.
+        """
+        normalized = " ".join(query.casefold().split())
+        payload = json.dumps(
+            [self.generation(), normalized, filters], sort_keys=True, default=str
+        )
+        return f"search:{namespace}:{hashlib.sha256(payload.encode()).hexdigest()}"
+
+    def get(self, key: str) -> dict | None:
+        """Retorna a resposta em cache, contabilizando hit ou miss."""
+        value = self.store.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return json.loads(value)
+
+    def set(self, key: str, response: dict) -> None:
+        """Grava uma resposta com o TTL configurado."""
+        self.store.set(key, json.dumps(response, default=str).encode(), ex=SEARCH_CACHE_TTL)
+
+    def stats(self) -> dict:
+        """Contadores de uso do cache."""
+        total = self.hits + self.misses
+        return {
+            "backend": "redis" if not isinstance(self.store, LocalStore) else "local",
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+            "entries": self.store.dbsize(),
+            "generation": self.generation(),
+            "ttl": SEARCH_CACHE_TTL,
+            "max_entries": SEARCH_CACHE_MAX_ENTRIES,
+        }
@@ -0,0 +1,235 @@
+"""Módulo dos caches LRU em disco (markdown extraído e prévias de páginas)"""
+
+import io
+import os
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+from importlib.metadata import version
+from typing import BinaryIO, TextIO
+
+MARKDOWN_CACHE_DIR = os.getenv("MARKDOWN_CACHE_DIR") or os.path.join(
+    tempfile.gettempdir(), "healthcom_markdown_cache"
+)
+MARKDOWN_CACHE_MAX_BYTES = int(
+    os.getenv("MARKDOWN_CACHE_MAX_BYTES", str(512 * 1024 * 1024))
+)
+
+PREVIEW_CACHE_DIR = os.getenv("PREVIEW_CACHE_DIR") or os.path.join(
+    tempfile.gettempdir(), "healthcom_preview_cache"
+)
+PREVIEW_CACHE_MAX_BYTES = int(
+    os.getenv("PREVIEW_CACHE_MAX_BYTES", str(256 * 1024 * 1024))
+)
+
+EXTRACTOR_VERSION = version("pymupdf4llm")
+RENDERER_VERSION = version("pymupdf")
+
+
+class DiskCache:
+    """
+    Cache LRU em disco de conteúdos binários, limitado em bytes.
+
+    Cada entrada é um arquivo `<chave><suffix>` no diretório; a ordem LRU
+    é reconstruída pela data de modificação, atualizada a cada leitura,
+    então processos que compartilham o diretório convivem com ele.
+
+    Atributos:
+        directory: Diretório onde as entradas são gravadas.
+        max_bytes: Tamanho máximo ocupado pelas entradas.
+    """
+    suffix = ".bin"
+
+    def __init__(self, directory: str, max_bytes: int) -> None:
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[str, int] = OrderedDict()
+        self._size = 0
+        os.makedirs(directory, exist_ok=True)
+        self._load()
+
+    def _load(self) -> None:
+        """Reconstrói o índice LRU a partir dos arquivos já existentes."""
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.is_file() and entry.name.endswith(self.suffix):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, entry.name[:-len(self.suffix)], stat.st_size))
+        for _, key, size in sorted(entries):
+            self._entries[key] = size
+            self._size += size
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}{self.suffix}")
+
+    def get_bytes(self, key: str) -> bytes | None:
+        """Conteúdo de uma entrada, ou None se ela não existir."""
+        with self._lock:
+            if key not in self._entries:
+                return None
+            self._entries.move_to_end(key)
+        try:
+            with open(self._path(key), "rb") as entry:
+                data = entry.read()
+            os.utime(self._path(key))
+            return data
+        except FileNotFoundError:
+            # Removida por outro processo que compartilha o diretório.
+            with self._lock:
+                self._size -= self._entries.pop(key, 0)
+            return None
+
+    def open_entry(self, key: str) -> BinaryIO | None:
+        """
+        Abre uma entrada para leitura em blocos, ou None se ela não existir.
+
+        O arquivo aberto continua legível mesmo que a entrada seja removida
+        pela política LRU durante a leitura.
+        """
+        with self._lock:
+            if key not in self._entries:
+                return None
+            self._entries.move_to_end(key)
+        try:
+            entry = open(self._path(key), "rb")
+            os.utime(self._path(key))
+            return entry
+        except FileNotFoundError:
+            with self._lock:
+                self._size -= self._entries.pop(key, 0)
+            return None
+
+    def put_bytes(self, key: str, data: bytes) -> None:
+        """Grava uma entrada, removendo as menos usadas além do limite."""
+        if len(data) > self.max_bytes:
+            return
+
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "wb") as entry:
+            entry.write(data)
+        self._commit(key, tmp_path, len(data))
+
+    def put_path(self, key: str, path: str) -> None:
+        """Grava uma entrada copiando um arquivo em blocos, sem carregá-lo na memória."""
+        size = os.path.getsize(path)
+        if size > self.max_bytes:
+            return
+
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "wb") as entry, open(path, "rb") as source:
+            shutil.copyfileobj(source, entry)
+        self._commit(key, tmp_path, size)
+
+    def _commit(self, key: str, tmp_path: str, size: int) -> None:
+        """Publica uma entrada gravada em `tmp_path` e aplica o limite de bytes."""
+        os.replace(tmp_path, self._path(key))
+
+        with self._lock:
+            self._size += size - self._entries.pop(key, 0)
+            self._entries[key] = size
+            while self._size > self.max_bytes:
+                evicted, size = self._entries.popitem(last=False)
+                self._size -= size
+                try:
+                    os.remove(self._path(evicted))
+                except FileNotFoundError:
+                    pass
+
+
+class MarkdownCache(DiskCache):
+    """
+    Cache LRU em disco do markdown extraído, limitado em bytes.
+
+    A chave combina o SHA-256 do PDF, a camada de extração e a versão do
+    pymupdf4llm, então uma atualização da biblioteca invalida naturalmente
+    as entradas antigas, que acabam removidas pela política LRU.
+    """
+    suffix = ".md"
+
+    def __init__(
+        self,
+        directory: str = MARKDOWN_CACHE_DIR,
+        max_bytes: int = MARKDOWN_CACHE_MAX_BYTES,
+    ) -> None:
+        super().__init__(directory, max_bytes)
+
+    @staticmethod
+    def key(sha256: str, tier: str) -> str:
+        """Monta a chave do cache para o hash de um PDF e a camada de extração."""
+        return f"{sha256}-{tier}-{EXTRACTOR_VERSION}"
+
+    def get(self, sha256: str, tier: str) -> str | None:
+        """
+        Busca o markdown de um PDF no cache.
+
+        Args:
+            sha256 (str): Hash SHA-256 do PDF.
+            tier (str): Camada de extração usada.
+
+        Returns:
+            str | None: Markdown em cache, ou None se não houver entrada.
+        """
+        data = self.get_bytes(self.key(sha256, tier))
+        return data.decode("utf-8") if data is not None else None
+
+    def put(self, sha256: str, tier: str, content: str) -> None:
+        """
+        Grava o markdown de um PDF no cache, removendo as entradas menos usadas.
+
+        Args:
+            sha256 (str): Hash SHA-256 do PDF.
+            tier (str): Camada de extração usada.
+            content (str): Markdown extraído.
+        """
+        self.put_bytes(self.key(sha256, tier), content.encode("utf-8"))
+
+    def open(self, sha256: str, tier: str) -> TextIO | None:
+        """
+        Abre o markdown de um PDF no cache para leitura em blocos.
+
+        Returns:
+            TextIO | None: Markdown aberto (sem tradução de quebras de linha,
+                para que os offsets dos trechos se mantenham), ou None se não
+                houver entrada.
+        """
+        entry = self.open_entry(self.key(sha256, tier))
+        if entry is None:
+            return None
+        return io.TextIOWrapper(entry, encoding="utf-8", newline="")
+
+    def put_file(self, sha256: str, tier: str, path: str) -> None:
+        """Grava no cache o markdown de um PDF a partir de um arquivo."""
+        self.put_path(self.key(sha256, tier), path)
+
+
+class PreviewCache(DiskCache):
+    """
+    Cache LRU em disco das prévias de páginas (JPEG), limitado em bytes.
+
+    É endereçado pelo conteúdo: a chave combina o SHA-256 do PDF, a página,
+    a largura e a versão do PyMuPDF, então uploads repetidos do mesmo
+    arquivo compartilham as prévias.
+    """
+    suffix = ".jpg"
+
+    def __init__(
+        self,
+        directory: str = PREVIEW_CACHE_DIR,
+        max_bytes: int = PREVIEW_CACHE_MAX_BYTES,
+    ) -> None:
+        super().__init__(directory, max_bytes)
+
+    @staticmethod
+    def key(sha256: str, page: int, width: int) -> str:
+        """Monta a chave do cache para uma página (a partir de 1) de um PDF."""
+        return f"{sha256}-p{page}-w{width}-{RENDERER_VERSION}"
+
+    def get(self, sha256: str, page: int, width: int) -> bytes | None:
+        """Busca a prévia de uma página no cache."""
+        return self.get_bytes(self.key(sha256, page, width))
+
+    def put(self, sha256: str, page: int, width: int, data: bytes) -> None:
+        """Grava a prévia de uma página, removendo as entradas menos usadas."""
+        self.put_bytes(self.key(sha256, page, width), data)
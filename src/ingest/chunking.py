@@ -0,0 +1,179 @@
+"""Módulo para dividir o markdown extraído em trechos (passages)"""
+
+import os
+import re
+from typing import Iterator, TextIO
+
+CHUNK_MAX_CHARS = int(os.getenv("CHUNK_MAX_CHARS", "2000"))
+CHUNK_MIN_CHARS = int(os.getenv("CHUNK_MIN_CHARS", "200"))
+
+# Separa as páginas no markdown de um documento.
+PAGE_SEPARATOR = "\f"
+
+HEADING_PATTERN = re.compile(r"^#{1,6}\s+(.*)$", re.MULTILINE)
+PARAGRAPH_PATTERN = re.compile(r"\n\s*\n")
+
+# Títulos principais (níveis 1 a 3) guardados no documento para as sugestões.
+KEY_HEADING_PATTERN = re.compile(r"^#{1,3}\s+(.*)$", re.MULTILINE)
+KEY_HEADINGS_MAX = int(os.getenv("KEY_HEADINGS_MAX", "30"))
+
+
+class Chunk:
+    """
+    Trecho contíguo do markdown de um documento.
+
+    Atributos:
+        start: Offset inicial no markdown do documento.
+        end: Offset final (exclusivo) no markdown do documento.
+        heading: Título da seção em que o trecho começa, se houver.
+        page: Página (a partir de 0) em que o trecho está.
+        text: Conteúdo do trecho.
+    """
+
+    def __init__(self, start: int, end: int, heading: str | None, page: int, text: str):
+        self.start = start
+        self.end = end
+        self.heading = heading
+        self.page = page
+        self.text = text
+
+
+def _sections(text: str) -> list[tuple[int, int, str | None]]:
+    """Divide o texto nos títulos markdown, juntando seções muito curtas à seguinte."""
+    starts = [match.start() for match in HEADING_PATTERN.finditer(text)]
+    if not starts or starts[0] != 0:
+        starts.insert(0, 0)
+    bounds = list(zip(starts, starts[1:] + [len(text)]))
+
+    sections = []
+    pending_start = None
+    for start, end in bounds:
+        if pending_start is not None:
+            start = pending_start
+            pending_start = None
+        if end - start < CHUNK_MIN_CHARS and end != len(text):
+            pending_start = start
+            continue
+        match = HEADING_PATTERN.match(text, start)
+        sections.append((start, end, match.group(1).strip() if match else None))
+    return sections
+
+
+def _split_section(text: str, start: int, end: int, max_chars: int) -> list[tuple[int, int]]:
+    """Quebra uma seção longa em limites de parágrafo, sem ultrapassar `max_chars`."""
+    breaks = [match.end() for match in PARAGRAPH_PATTERN.finditer(text, start, end)]
+    breaks.append(end)
+
+    pieces = []
+    piece_start = start
+    last_break = start
+    for boundary in breaks:
+        if boundary - piece_start <= max_chars:
+            last_break = boundary
+            continue
+        if last_break - piece_start >= CHUNK_MIN_CHARS:
+            pieces.append((piece_start, last_break))
+            piece_start = last_break
+        # Parágrafos maiores que o limite são cortados no último espaço.
+        while boundary - piece_start > max_chars:
+            cut = text.rfind(" ", piece_start + max_chars // 2, piece_start + max_chars)
+            if cut == -1:
+                cut = piece_start + max_chars
+            pieces.append((piece_start, cut))
+            piece_start = cut
+        last_break = boundary
+    if piece_start < end:
+        pieces.append((piece_start, end))
+    return pieces
+
+
+def split_page(
+    text: str,
+    page: int,
+    offset: int = 0,
+    heading: str | None = None,
+    max_chars: int = CHUNK_MAX_CHARS,
+) -> list[Chunk]:
+    """
+    Divide o markdown de uma página em trechos alinhados aos títulos.
+
+    Cada seção iniciada por um título vira um trecho; seções maiores que
+    `max_chars` são quebradas em limites de parágrafo.
+
+    Args:
+        text (str): Markdown da página.
+        page (int): Número da página.
+        offset (int): Offset da página no markdown do documento.
+        heading (str | None): Último título das páginas anteriores, herdado
+            pelo texto que vem antes do primeiro título da página.
+        max_chars (int): Tamanho máximo de cada trecho.
+
+    Returns:
+        list[Chunk]: Trechos em ordem, sem trechos vazios.
+    """
+    chunks = []
+    for start, end, section_heading in _sections(text):
+        section_heading = section_heading or heading
+        for piece_start, piece_end in _split_section(text, start, end, max_chars):
+            piece = text[piece_start:piece_end]
+            if piece.strip():
+                chunks.append(
+                    Chunk(offset + piece_start, offset + piece_end, section_heading, page, piece)
+                )
+        heading = section_heading
+    return chunks
+
+
+def key_headings(text: str, max_headings: int = KEY_HEADINGS_MAX) -> list[str]:
+    """Títulos principais do markdown, sem ênfase e sem repetições, na ordem do texto."""
+    headings = []
+    for match in KEY_HEADING_PATTERN.finditer(text):
+        heading = " ".join(re.sub(r"[*_`]+", " ", match.group(1)).split()).rstrip(" #")
+        if heading and heading not in headings:
+            headings.append(heading)
+            if len(headings) == max_headings:
+                break
+    return headings
+
+
+def split_markdown(text: str, max_chars: int = CHUNK_MAX_CHARS) -> list[Chunk]:
+    """
+    Divide o markdown de um documento em trechos, página a página.
+
+    Os offsets dos trechos se referem ao markdown completo, incluindo os
+    separadores de página.
+
+    Args:
+        text (str): Markdown do documento, com as páginas separadas por `PAGE_SEPARATOR`.
+        max_chars (int): Tamanho máximo de cada trecho.
+
+    Returns:
+        list[Chunk]: Trechos em ordem, sem trechos vazios.
+    """
+    chunks = []
+    offset = 0
+    heading = None
+    for page, page_text in enumerate(text.split(PAGE_SEPARATOR)):
+        page_chunks = split_page(page_text, page, offset, heading, max_chars)
+        if page_chunks:
+            heading = page_chunks[-1].heading
+        chunks.extend(page_chunks)
+        offset += len(page_text) + len(PAGE_SEPARATOR)
+    return chunks
+
+
+def read_pages(markdown: TextIO, block_size: int = 1024 * 1024) -> Iterator[str]:
+    """
+    Lê as páginas de um markdown aberto, em blocos de `block_size` caracteres.
+
+    Equivale a `text.split(PAGE_SEPARATOR)` sem carregar o documento
+    inteiro; a memória fica proporcional ao bloco e à maior página.
+    """
+    parts = []
+    while block := markdown.read(block_size):
+        pages = block.split(PAGE_SEPARATOR)
+        parts.append(pages[0])
+        for page in pages[1:]:
+            yield "".join(parts)
+            parts = [page]
+    yield "".join(parts)
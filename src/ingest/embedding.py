@@ -0,0 +1,281 @@
+"""Módulo de embeddings locais dos trechos (TF-IDF com hashing e SVD truncada)"""
+
+import functools
+import logging
+import os
+import re
+import threading
+import time
+import unicodedata
+import zlib
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_DIMS = int(os.getenv("EMBEDDING_DIMS", "128"))
+EMBEDDING_FEATURES = int(os.getenv("EMBEDDING_FEATURES", str(2 ** 15)))
+EMBEDDING_MODEL_PATH = os.getenv(
+    "EMBEDDING_MODEL_PATH", os.path.join("models", "embedding.npz")
+)
+# Textos por bloco nas multiplicações esparsas, limitando a memória temporária.
+EMBEDDING_BLOCK = int(os.getenv("EMBEDDING_BLOCK", "512"))
+# Intervalo mínimo, em segundos, entre as verificações do arquivo do modelo.
+EMBEDDING_RELOAD_INTERVAL = float(os.getenv("EMBEDDING_RELOAD_INTERVAL", "5"))
+
+TOKEN_PATTERN = re.compile(r"\w\w+")
+
+
+def tokenize(text: str) -> list[str]:
+    """
+    Quebra o texto em palavras e pares de palavras consecutivas.
+
+    Caixa e acentos são removidos, então "Higienização" e "higienizacao"
+    caem no mesmo termo.
+    """
+    normalized = unicodedata.normalize("NFKD", text.casefold())
+    words = TOKEN_PATTERN.findall(normalized.encode("ascii", "ignore").decode())
+    return words + [f"{first} {second}" for first, second in zip(words, words[1:])]
+
+
+@functools.lru_cache(maxsize=1 << 18)
+def _bucket(token: str, features: int) -> int:
+    """Coluna do termo; o crc32 é estável entre processos, ao contrário de `hash`."""
+    return zlib.crc32(token.encode()) % features
+
+
+class SparseBatch:
+    """
+    Lote de textos como matriz esparsa (formato de coordenadas).
+
+    As entradas ficam ordenadas por linha, e cada par (linha, coluna)
+    aparece uma vez.
+
+    Atributos:
+        rows: Linha (texto) de cada entrada.
+        cols: Coluna (termo com hashing) de cada entrada.
+        values: Valor de cada entrada.
+        n_rows: Número de textos do lote.
+    """
+
+    def __init__(self, rows: np.ndarray, cols: np.ndarray, values: np.ndarray, n_rows: int):
+        self.rows = rows
+        self.cols = cols
+        self.values = values
+        self.n_rows = n_rows
+
+
+def hash_batch(texts: list[str], features: int = EMBEDDING_FEATURES) -> SparseBatch:
+    """Conta os termos de cada texto nas colunas do hashing."""
+    rows: list[int] = []
+    cols: list[int] = []
+    for row, text in enumerate(texts):
+        buckets = [_bucket(token, features) for token in tokenize(text)]
+        cols.extend(buckets)
+        rows.extend([row] * len(buckets))
+    keys, counts = np.unique(
+        np.asarray(rows, dtype=np.int64) * features + np.asarray(cols, dtype=np.int64),
+        return_counts=True,
+    )
+    return SparseBatch(keys // features, keys % features, counts.astype(np.float32), len(texts))
+
+
+def weight(batch: SparseBatch, idf: np.ndarray) -> SparseBatch:
+    """Aplica TF sublinear e IDF e normaliza cada linha (norma L2)."""
+    values = (1.0 + np.log(batch.values)) * idf[batch.cols]
+    norms = np.sqrt(np.bincount(batch.rows, weights=values ** 2, minlength=batch.n_rows))
+    values = (values / norms[batch.rows]).astype(np.float32)
+    return SparseBatch(batch.rows, batch.cols, values, batch.n_rows)
+
+
+def _segment_sums(keys: np.ndarray, products: np.ndarray, out: np.ndarray) -> np.ndarray:
+    """Soma as linhas de `products` com a mesma chave (ordenada) em `out[chave]`."""
+    if keys.size:
+        starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+        out[keys[starts]] += np.add.reduceat(products, starts, axis=0)
+    return out
+
+
+def sparse_dot(batch: SparseBatch, dense: np.ndarray) -> np.ndarray:
+    """Produto `X @ dense` do lote esparso X por uma matriz densa."""
+    out = np.zeros((batch.n_rows, dense.shape[1]), dtype=np.float32)
+    return _segment_sums(batch.rows, dense[batch.cols] * batch.values[:, None], out)
+
+
+def sparse_t_dot(batch: SparseBatch, dense: np.ndarray, features: int) -> np.ndarray:
+    """Produto `X.T @ dense` do lote esparso X por uma matriz densa."""
+    order = np.argsort(batch.cols, kind="stable")
+    out = np.zeros((features, dense.shape[1]), dtype=np.float32)
+    products = dense[batch.rows[order]] * batch.values[order, None]
+    return _segment_sums(batch.cols[order], products, out)
+
+
+def fit(
+    texts: list[str],
+    dims: int = EMBEDDING_DIMS,
+    features: int = EMBEDDING_FEATURES,
+    oversample: int = 10,
+    power_iterations: int = 2,
+    seed: int = 0,
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Ajusta o IDF e a projeção SVD em uma amostra de textos.
+
+    A SVD truncada é calculada pelo método aleatorizado (Halko et al.), só
+    com produtos entre a matriz esparsa e matrizes densas estreitas, então a
+    matriz TF-IDF nunca é montada por inteiro.
+
+    Args:
+        texts (list[str]): Amostra do corpus.
+        dims (int): Dimensões do embedding.
+        features (int): Colunas do hashing.
+        oversample (int): Colunas extras da projeção aleatória.
+        power_iterations (int): Iterações de potência, que melhoram a precisão
+            quando os valores singulares decaem devagar.
+        seed (int): Semente da projeção aleatória.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: IDF por coluna e matriz de projeção
+        (`features` x `dims`).
+    """
+    width = dims + oversample
+    if len(texts) < width:
+        raise ValueError(f"São necessários pelo menos {width} textos para ajustar o modelo")
+
+    blocks = [
+        hash_batch(texts[start:start + EMBEDDING_BLOCK], features)
+        for start in range(0, len(texts), EMBEDDING_BLOCK)
+    ]
+    # Cada par (texto, coluna) aparece uma vez, então a contagem é a frequência de documento.
+    df = sum(np.bincount(block.cols, minlength=features) for block in blocks)
+    idf = (np.log((1 + len(texts)) / (1 + df)) + 1).astype(np.float32)
+    blocks = [weight(block, idf) for block in blocks]
+
+    def dot(dense: np.ndarray) -> np.ndarray:
+        return np.vstack([sparse_dot(block, dense) for block in blocks])
+
+    def t_dot(dense: np.ndarray) -> np.ndarray:
+        out = np.zeros((features, dense.shape[1]), dtype=np.float32)
+        offset = 0
+        for block in blocks:
+            out += sparse_t_dot(block, dense[offset:offset + block.n_rows], features)
+            offset += block.n_rows
+        return out
+
+    rng = np.random.default_rng(seed)
+    sample = dot(rng.standard_normal((features, width)).astype(np.float32))
+    for _ in range(power_iterations):
+        basis, _ = np.linalg.qr(sample)
+        projected, _ = np.linalg.qr(t_dot(basis))
+        sample = dot(projected)
+    basis, _ = np.linalg.qr(sample)
+    _, _, vt = np.linalg.svd(t_dot(basis).T, full_matrices=False)
+    return idf, np.ascontiguousarray(vt[:dims].T, dtype=np.float32)
+
+
+def save_model(idf: np.ndarray, components: np.ndarray, path: str = EMBEDDING_MODEL_PATH) -> None:
+    """Grava o modelo, substituindo o anterior de forma atômica."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as file:
+        np.savez(file, idf=idf, components=components)
+    os.replace(tmp_path, path)
+
+
+def _file_signature(path: str) -> tuple[int, int] | None:
+    """Data de modificação e tamanho do arquivo, ou None se ele não existir."""
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+class Embedder:
+    """
+    Classe que calcula os embeddings dos trechos e das consultas.
+
+    Usa o modelo gravado em `EMBEDDING_MODEL_PATH` (ver `fit` e a opção
+    `--fit-embeddings` da reindexação). Sem modelo, usa uma projeção
+    aleatória fixa do TF com hashing, que já aproxima textos com os mesmos
+    termos, mas não capta sinônimos. Quando o arquivo do modelo muda (a
+    reindexação o publica de outro processo), ele é recarregado no próximo
+    `encode`, sem reiniciar a API.
+
+    Atributos:
+        idf: IDF por coluna do hashing.
+        components: Projeção das colunas nas dimensões do embedding.
+        fitted: Se o modelo foi ajustado no corpus.
+    """
+    _instance = None
+    _initialized = False
+    _lock = threading.Lock()
+
+    def __init__(self) -> None:
+        """
+        Carrega o modelo gravado ou a projeção aleatória.
+        """
+        if self._initialized:
+            return
+        self.load()
+        self._initialized = True
+
+    def __new__(cls) -> "Embedder":
+        """
+        Garante que o modelo seja carregado uma vez por processo.
+        """
+        if cls._instance is None:
+            cls._instance = super(Embedder, cls).__new__(cls)
+        return cls._instance
+
+    def load(self, path: str = EMBEDDING_MODEL_PATH) -> None:
+        """(Re)carrega o modelo do disco."""
+        with self._lock:
+            self._path = path
+            self._signature = _file_signature(path)
+            self._checked_at = time.monotonic()
+            if self._signature is not None:
+                with np.load(path) as model:
+                    idf, components = model["idf"], model["components"]
+                if components.shape == (EMBEDDING_FEATURES, EMBEDDING_DIMS):
+                    self.idf, self.components, self.fitted = idf, components, True
+                    return
+                logger.warning(
+                    "Modelo de embeddings %s tem formato %s, esperado (%s, %s); usando projeção aleatória",
+                    path, components.shape, EMBEDDING_FEATURES, EMBEDDING_DIMS,
+                )
+            rng = np.random.default_rng(0)
+            self.idf = np.ones(EMBEDDING_FEATURES, dtype=np.float32)
+            self.components = (
+                rng.standard_normal((EMBEDDING_FEATURES, EMBEDDING_DIMS)) / np.sqrt(EMBEDDING_DIMS)
+            ).astype(np.float32)
+            self.fitted = False
+
+    def encode(self, texts: list[str]) -> np.ndarray:
+        """
+        Calcula os embeddings normalizados de um lote de textos.
+
+        Textos sem nenhum termo resultam em vetores nulos.
+
+        Returns:
+            np.ndarray: Matriz `len(texts)` x `EMBEDDING_DIMS`.
+        """
+        self._reload_if_changed()
+        with self._lock:
+            idf, components = self.idf, self.components
+        vectors = np.zeros((len(texts), EMBEDDING_DIMS), dtype=np.float32)
+        for start in range(0, len(texts), EMBEDDING_BLOCK):
+            batch = weight(hash_batch(texts[start:start + EMBEDDING_BLOCK]), idf)
+            vectors[start:start + batch.n_rows] = sparse_dot(batch, components)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return np.divide(vectors, norms, out=np.zeros_like(vectors), where=norms > 0)
+
+    def _reload_if_changed(self) -> None:
+        """Recarrega o modelo se o arquivo mudou desde a última carga."""
+        now = time.monotonic()
+        if now - self._checked_at < EMBEDDING_RELOAD_INTERVAL:
+            return
+        self._checked_at = now
+        if _file_signature(self._path) != self._signature:
+            logger.info("Modelo de embeddings %s alterado; recarregando", self._path)
+            self.load(self._path)
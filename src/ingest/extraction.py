@@ -0,0 +1,309 @@
+"""Módulo do serviço de extração de markdown em um pool de processos"""
+
+import asyncio
+import os
+from collections import deque
+from typing import AsyncIterator
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from pymupdf4llm import to_markdown
+
+from src.ingest.chunking import PAGE_SEPARATOR
+from src.ingest.spool import open_pdf
+
+EXTRACTION_WORKERS = int(os.getenv("EXTRACTION_WORKERS") or os.cpu_count() or 1)
+EXTRACTION_TIMEOUT = float(os.getenv("EXTRACTION_TIMEOUT", "300"))
+EXTRACTION_PAGE_BATCH = int(os.getenv("EXTRACTION_PAGE_BATCH", "8"))
+
+# "auto" escolhe a camada pela inspeção do PDF; "text" ou "markdown" forçam uma camada.
+EXTRACTION_TIER = os.getenv("EXTRACTION_TIER", "auto")
+TEXT_TIER_MIN_TEXT_RATIO = float(os.getenv("TEXT_TIER_MIN_TEXT_RATIO", "0.9"))
+INSPECT_SAMPLE_PAGES = int(os.getenv("INSPECT_SAMPLE_PAGES", "5"))
+MAX_PDF_PAGES = int(os.getenv("MAX_PDF_PAGES", "5000"))
+
+TEXT_TIER = "text"
+MARKDOWN_TIER = "markdown"
+
+
+class ExtractionError(Exception):
+    """Erro ao extrair o conteúdo de um PDF."""
+
+
+class ExtractionTimeout(ExtractionError):
+    """A extração excedeu o tempo limite configurado."""
+
+
+class PoolRestarted(ExtractionError):
+    """O pool foi descartado durante a execução; a chamada pode ser repetida."""
+
+
+def _page_count(path: str) -> int:
+    with open_pdf(path) as doc:
+        return doc.page_count
+
+
+def _inspect_pdf(path: str, sample_pages: int) -> dict:
+    """
+    Inspeciona uma amostra de páginas do PDF. Executada dentro de um processo do pool.
+
+    Returns:
+        dict: Número de páginas, fração da área ocupada por texto (em relação
+            a texto + imagens) e se alguma página da amostra tem tabelas.
+    """
+    with open_pdf(path) as doc:
+        total = doc.page_count
+        step = max(1, total // max(1, sample_pages))
+        text_area = 0.0
+        image_area = 0.0
+        has_tables = False
+        for page_no in list(range(0, total, step))[:sample_pages]:
+            page = doc[page_no]
+            for x0, y0, x1, y1, *_ in page.get_text("blocks"):
+                text_area += (x1 - x0) * (y1 - y0)
+            for image in page.get_image_info():
+                x0, y0, x1, y1 = image["bbox"]
+                image_area += (x1 - x0) * (y1 - y0)
+            if not has_tables:
+                try:
+                    has_tables = bool(page.find_tables().tables)
+                except Exception:
+                    has_tables = True
+        covered = text_area + image_area
+        return {
+            "page_count": total,
+            "text_ratio": round(text_area / covered, 3) if covered else 0.0,
+            "has_tables": has_tables,
+        }
+
+
+def choose_tier(profile: dict) -> str:
+    """
+    Escolhe a camada de extração para um PDF inspecionado.
+
+    PDFs só de texto, sem tabelas, vão para a extração de texto simples; os
+    demais passam pela análise de layout completa do pymupdf4llm.
+    """
+    if EXTRACTION_TIER in (TEXT_TIER, MARKDOWN_TIER):
+        return EXTRACTION_TIER
+    if not profile["has_tables"] and profile["text_ratio"] >= TEXT_TIER_MIN_TEXT_RATIO:
+        return TEXT_TIER
+    return MARKDOWN_TIER
+
+
+def _extract_pages(path: str, start: int, stop: int, tier: str = MARKDOWN_TIER) -> list[str]:
+    """Converte as páginas [start, stop) em markdown. Executada dentro de um processo do pool."""
+    with open_pdf(path) as doc:
+        if tier == TEXT_TIER:
+            texts = [doc[page_no].get_text() for page_no in range(start, stop)]
+        else:
+            pages = to_markdown(doc, pages=list(range(start, stop)), page_chunks=True)
+            texts = [page["text"] for page in pages]
+        return [text.replace(PAGE_SEPARATOR, "\n") for text in texts]
+
+
+def _terminate(executor: ProcessPoolExecutor) -> None:
+    """Encerra o executor matando processos que ainda estejam rodando."""
+    for process in list((executor._processes or {}).values()):
+        process.terminate()
+    executor.shutdown(wait=False, cancel_futures=True)
+
+
+class ExtractionService:
+    """
+    Classe responsável por executar a extração de PDFs fora do event loop.
+
+    Cada extração roda em um processo de um `ProcessPoolExecutor`, então o
+    trabalho pesado do pymupdf4llm escala entre os núcleos sem bloquear a
+    API. Um processo que trava ou morre derruba apenas o pool, que é
+    recriado na próxima extração.
+
+    No máximo `max_workers` chamadas ficam no pool ao mesmo tempo; as demais
+    esperam a vez fora dele, então o tempo limite de cada chamada só conta a
+    partir do momento em que ela ganha um processo.
+
+    Atributos:
+        max_workers: Número de processos do pool.
+        timeout: Tempo limite, em segundos, de cada extração.
+    """
+    _instance = None
+    _initialized = False
+
+    def __init__(self) -> None:
+        """
+        Inicializa o serviço. O pool só é criado na primeira extração.
+        """
+        if self._initialized:
+            return
+        self.max_workers = EXTRACTION_WORKERS
+        self.timeout = EXTRACTION_TIMEOUT
+        self._executor: ProcessPoolExecutor | None = None
+        self._generation = 0
+        self._slots: tuple[asyncio.AbstractEventLoop, asyncio.Semaphore] | None = None
+        self._initialized = True
+
+    def __new__(cls) -> "ExtractionService":
+        """
+        Garante que apenas um pool de extração seja criado por processo.
+        """
+        if cls._instance is None:
+            cls._instance = super(ExtractionService, cls).__new__(cls)
+        return cls._instance
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+        return self._executor
+
+    def _get_slots(self) -> asyncio.Semaphore:
+        """Semáforo das vagas do pool, recriado se o event loop mudar (ex.: CLI)."""
+        loop = asyncio.get_running_loop()
+        if self._slots is None or self._slots[0] is not loop:
+            self._slots = (loop, asyncio.Semaphore(self.max_workers))
+        return self._slots[1]
+
+    def _restart(self, generation: int) -> None:
+        """Descarta o pool atual, matando processos presos, se ainda for o mesmo."""
+        if self._executor is None or generation != self._generation:
+            return
+        executor = self._executor
+        self._executor = None
+        self._generation += 1
+        _terminate(executor)
+
+    async def run(self, func, *args):
+        """
+        Executa `func(*args)` no pool, respeitando o tempo limite.
+
+        Quando uma chamada excede o tempo limite, o pool é recriado; as
+        demais chamadas que estavam nele são reenviadas ao novo pool, com o
+        tempo limite reiniciado, em vez de falharem junto. Se o pool quebrar
+        durante a execução, a chamada é repetida uma vez em um processo
+        exclusivo, de forma que apenas o PDF que derruba o processo falha.
+
+        Raises:
+            ExtractionTimeout: Se a execução exceder o tempo limite.
+            ExtractionError: Se o processo de extração morrer ou a função falhar.
+        """
+        async with self._get_slots():
+            while True:
+                generation = self._generation
+                try:
+                    return await self._submit(self._get_executor(), func, *args)
+                except ExtractionTimeout:
+                    self._restart(generation)
+                    raise
+                except (BrokenProcessPool, PoolRestarted):
+                    if generation != self._generation:
+                        # O pool foi descartado pelo tempo limite de outra chamada.
+                        continue
+                    self._restart(generation)
+                    break
+
+            isolated = ProcessPoolExecutor(max_workers=1)
+            try:
+                return await self._submit(isolated, func, *args)
+            except (BrokenProcessPool, PoolRestarted):
+                raise ExtractionError("Processo de extração encerrado inesperadamente")
+            finally:
+                _terminate(isolated)
+
+    async def _submit(self, executor: ProcessPoolExecutor, func, *args):
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(executor, func, *args)
+        try:
+            return await asyncio.wait_for(future, self.timeout)
+        except TimeoutError:
+            raise ExtractionTimeout(f"Extração excedeu o limite de {self.timeout:.0f}s")
+        except BrokenProcessPool:
+            raise
+        except asyncio.CancelledError:
+            # Cancelada pelo descarte do pool, e não pelo chamador.
+            if future.cancelled() and not asyncio.current_task().cancelling():
+                raise PoolRestarted("Pool de extração recriado durante a execução")
+            raise
+        except Exception as e:
+            raise ExtractionError(str(e)) from e
+
+    async def page_count(self, path: str) -> int:
+        """Retorna o número de páginas de um PDF."""
+        return await asyncio.to_thread(_page_count, path)
+
+    async def inspect(self, path: str) -> dict:
+        """
+        Inspeciona o PDF antes da extração e escolhe sua camada.
+
+        Returns:
+            dict: Perfil do PDF (ver `_inspect_pdf`) com a camada escolhida em `tier`.
+        """
+        profile = await self.run(_inspect_pdf, path, INSPECT_SAMPLE_PAGES)
+        profile["tier"] = choose_tier(profile)
+        return profile
+
+    async def iter_pages(
+        self,
+        path: str,
+        tier: str = MARKDOWN_TIER,
+        batch_size: int = EXTRACTION_PAGE_BATCH,
+        parallelism: int | None = None,
+    ) -> AsyncIterator[tuple[int, str]]:
+        """
+        Converte um PDF em markdown página a página.
+
+        O documento é dividido em faixas de `batch_size` páginas, extraídas
+        em paralelo por até `parallelism` processos do pool. Cada processo
+        abre o mesmo spool via mmap somente leitura, então as páginas do PDF
+        são compartilhadas pelo page cache em vez de copiadas. As faixas são
+        entregues em ordem, e no máximo `parallelism` faixas ficam em memória.
+        O tempo limite vale para cada faixa.
+
+        Args:
+            path (str): Caminho do PDF.
+            tier (str): Camada de extração (`TEXT_TIER` ou `MARKDOWN_TIER`).
+            batch_size (int): Número de páginas de cada faixa.
+            parallelism (int | None): Faixas extraídas ao mesmo tempo; por
+                padrão, o número de processos do pool.
+
+        Yields:
+            tuple[int, str]: Número da página (a partir de 0) e seu markdown.
+        """
+        total = await self.page_count(path)
+        window = max(1, parallelism or self.max_workers)
+        pending: deque[tuple[int, asyncio.Task]] = deque()
+        try:
+            for start in range(0, total, batch_size):
+                stop = min(start + batch_size, total)
+                task = asyncio.ensure_future(self.run(_extract_pages, path, start, stop, tier))
+                pending.append((start, task))
+                if len(pending) < window:
+                    continue
+                first, task = pending.popleft()
+                for page_no, text in enumerate(await task, first):
+                    yield page_no, text
+            while pending:
+                first, task = pending.popleft()
+                for page_no, text in enumerate(await task, first):
+                    yield page_no, text
+        finally:
+            for _, task in pending:
+                task.cancel()
+
+    async def to_markdown(self, path: str, tier: str = MARKDOWN_TIER) -> str:
+        """
+        Converte um PDF inteiro em markdown, com as páginas separadas por
+        `PAGE_SEPARATOR`.
+
+        Args:
+            path (str): Caminho do PDF.
+            tier (str): Camada de extração.
+
+        Returns:
+            str: Conteúdo do PDF em markdown.
+        """
+        return PAGE_SEPARATOR.join([text async for _, text in self.iter_pages(path, tier)])
+
+    def shutdown(self) -> None:
+        """Encerra o pool de processos."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
@@ -0,0 +1,313 @@
+"""Módulo para os jobs assíncronos de ingestão de documentos"""
+
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime
+
+from bson.objectid import ObjectId
+from pymongo.asynchronous.collection import AsyncCollection
+
+from src.elastic.search_cache import SearchCache
+from src.ingest.extraction import EXTRACTION_WORKERS, ExtractionError, ExtractionService
+from src.ingest.pipeline import (
+    extract_and_index_chunks,
+    find_duplicate,
+    index_markdown_file,
+    merge_duplicate,
+    unindex_document,
+)
+from src.ingest.preview import preview_batch, render_previews
+from src.ingest.spool import SpooledUpload, remove_spool, store_spool
+from src.mongo.client import MongoDBClient
+
+logger = logging.getLogger(__name__)
+
+INGEST_CONCURRENCY = int(os.getenv("INGEST_CONCURRENCY") or EXTRACTION_WORKERS)
+
+STAGES = ("extract", "store", "index")
+PENDING_STATUSES = ("queued", "running")
+
+
+class JobStore:
+    """
+    Classe para persistir os jobs de ingestão no MongoDB.
+
+    Atributos:
+        collection: Coleção `ingest_jobs` no cliente assíncrono.
+    """
+
+    def __init__(self, collection: AsyncCollection):
+        self.collection = collection
+
+    async def create_indexes(self) -> None:
+        """Cria os índices usados para retomar os jobs pendentes."""
+        await self.collection.create_index("status")
+
+    async def create(
+        self, filename: str, spooled: SpooledUpload, metadata: dict, page_count: int
+    ) -> str:
+        """
+        Cria um job na fila.
+
+        Args:
+            filename (str): Nome do arquivo enviado.
+            spooled (SpooledUpload): Upload já copiado para o spool.
+            metadata (dict): Metadados do documento.
+            page_count (int): Número de páginas do PDF.
+
+        Returns:
+            str: ID do job.
+        """
+        now = datetime.now()
+        result = await self.collection.insert_one(
+            {
+                "filename": filename,
+                "spool_path": spooled.path,
+                "sha256": spooled.sha256,
+                "length": spooled.length,
+                "metadata": metadata,
+                # Preenchido pela inspeção, já dentro do job.
+                "profile": None,
+                "status": "queued",
+                "stage": "queued",
+                "progress": 0.0,
+                "timings": {},
+                # O ID é reservado na criação para que os trechos indexados
+                # durante a extração já apontem para o arquivo final.
+                "file_id": ObjectId(),
+                "deduplicated": False,
+                "pages_total": page_count,
+                "pages_done": 0,
+                "error": None,
+                "created_at": now,
+                "updated_at": now,
+            }
+        )
+        return str(result.inserted_id)
+
+    async def get(self, job_id: str) -> dict | None:
+        """Busca um job pelo ID."""
+        return await self.collection.find_one({"_id": ObjectId(job_id)})
+
+    async def update(self, job_id: str, **fields) -> None:
+        """Atualiza os campos de um job."""
+        fields["updated_at"] = datetime.now()
+        await self.collection.update_one({"_id": ObjectId(job_id)}, {"$set": fields})
+
+    async def pending(self) -> list[str]:
+        """Retorna os IDs dos jobs que ainda não terminaram, do mais antigo ao mais novo."""
+        cursor = self.collection.find(
+            {"status": {"$in": list(PENDING_STATUSES)}}, {"_id": 1}
+        ).sort("_id", 1)
+        return [str(job["_id"]) async for job in cursor]
+
+
+class IngestWorker:
+    """
+    Classe responsável por executar os jobs de ingestão em segundo plano.
+
+    Cada job passa pelas etapas extract → store → index. O estado é gravado
+    no MongoDB a cada etapa, então jobs interrompidos por um restart da API
+    são retomados quando o worker é iniciado novamente.
+    """
+    _instance = None
+    _initialized = False
+
+    def __init__(self) -> None:
+        """
+        Inicializa o worker.
+        """
+        if self._initialized:
+            return
+        self.jobs: JobStore | None = None
+        self._queue: asyncio.Queue[str] = asyncio.Queue()
+        self._tasks: list[asyncio.Task] = []
+        self._hash_locks: dict[str, tuple[asyncio.Lock, int]] = {}
+        self._initialized = True
+
+    def __new__(cls) -> "IngestWorker":
+        """
+        Garante que apenas um worker seja criado por processo.
+        """
+        if cls._instance is None:
+            cls._instance = super(IngestWorker, cls).__new__(cls)
+        return cls._instance
+
+    async def start(self) -> None:
+        """
+        Reenfileira os jobs pendentes e inicia as tarefas do worker.
+
+        Usa o cliente assíncrono do MongoDB, que precisa estar conectado.
+        """
+        self.jobs = JobStore(MongoDBClient().adb["ingest_jobs"])
+        await self.jobs.create_indexes()
+        for job_id in await self.jobs.pending():
+            self._queue.put_nowait(job_id)
+        self._tasks = [
+            asyncio.create_task(self._consume()) for _ in range(INGEST_CONCURRENCY)
+        ]
+
+    async def stop(self) -> None:
+        """Interrompe as tarefas do worker. Jobs em andamento são retomados no próximo start."""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def submit(
+        self, filename: str, spooled: SpooledUpload, metadata: dict, page_count: int
+    ) -> str:
+        """
+        Registra e enfileira um novo job de ingestão.
+
+        Returns:
+            str: ID do job.
+        """
+        job_id = await self.jobs.create(filename, spooled, metadata, page_count)
+        self._queue.put_nowait(job_id)
+        return job_id
+
+    async def _consume(self) -> None:
+        while True:
+            job_id = await self._queue.get()
+            try:
+                await self._process(job_id)
+            except Exception:
+                logger.exception("Erro inesperado no job de ingestão %s", job_id)
+            finally:
+                self._queue.task_done()
+
+    async def _process(self, job_id: str) -> None:
+        job = await self.jobs.get(job_id)
+        if not job or job["status"] not in PENDING_STATUSES:
+            return
+
+        # Uploads do mesmo conteúdo são processados um de cada vez, para que
+        # o segundo encontre o arquivo gravado pelo primeiro.
+        sha256 = job["sha256"]
+        lock, users = self._hash_locks.get(sha256, (asyncio.Lock(), 0))
+        self._hash_locks[sha256] = (lock, users + 1)
+        try:
+            async with lock:
+                await self._run(job_id, job)
+        finally:
+            lock, users = self._hash_locks[sha256]
+            if users == 1:
+                del self._hash_locks[sha256]
+            else:
+                self._hash_locks[sha256] = (lock, users - 1)
+
+    async def _run(self, job_id: str, job: dict) -> None:
+        fs = MongoDBClient().fs
+        timings = dict(job.get("timings") or {})
+        file_id = job["file_id"]
+        profile = job.get("profile")
+        await self.jobs.update(job_id, status="running")
+
+        async def start_stage(stage: str) -> float:
+            await self.jobs.update(
+                job_id, stage=stage, progress=STAGES.index(stage) / len(STAGES)
+            )
+            return time.perf_counter()
+
+        async def finish_stage(stage: str, started: float) -> None:
+            timings[stage] = round(time.perf_counter() - started, 3)
+            await self.jobs.update(job_id, timings=timings)
+
+        async def report_pages(done: int, total: int) -> None:
+            await self.jobs.update(
+                job_id,
+                pages_done=done,
+                pages_total=total,
+                progress=done / total / len(STAGES) if total else 0.0,
+            )
+
+        try:
+            # A inspeção que escolhe a camada roda no job, e não no upload;
+            # o perfil fica no job para que uma retomada não a repita.
+            if profile is None:
+                profile = await ExtractionService().inspect(job["spool_path"])
+                await self.jobs.update(
+                    job_id, profile=profile, pages_total=profile["page_count"]
+                )
+
+            existing = await asyncio.to_thread(find_duplicate, fs, job["sha256"])
+            if existing is not None and existing != file_id:
+                started = await start_stage("store")
+                await merge_duplicate(
+                    existing, job["filename"], job["spool_path"], job["sha256"],
+                    job["metadata"], profile["tier"],
+                )
+                await finish_stage("store", started)
+                await self.jobs.update(
+                    job_id, status="done", stage="done", progress=1.0,
+                    file_id=existing, deduplicated=True,
+                )
+                SearchCache().invalidate()
+                remove_spool(job["spool_path"])
+                return
+
+            # Os trechos são indexados durante a extração, página a página.
+            started = await start_stage("extract")
+            markdown_path, headings = await extract_and_index_chunks(
+                job["spool_path"], job["sha256"], str(file_id), job["filename"],
+                job["metadata"], profile["tier"], on_progress=report_pages,
+            )
+            await finish_stage("extract", started)
+
+            # O markdown fica em um arquivo até ser gravado e indexado.
+            try:
+                started = await start_stage("store")
+                # Um job retomado após um restart pode já ter gravado o arquivo.
+                if not await asyncio.to_thread(fs.exists, file_id):
+                    await asyncio.to_thread(
+                        store_spool,
+                        job["spool_path"],
+                        fs,
+                        job["filename"],
+                        {
+                            **job["metadata"],
+                            "sha256": job["sha256"],
+                            "page_count": profile["page_count"],
+                        },
+                        file_id,
+                    )
+                await finish_stage("store", started)
+
+                started = await start_stage("index")
+                await asyncio.to_thread(
+                    index_markdown_file, str(file_id), job["filename"], markdown_path,
+                    headings, job["metadata"],
+                    extraction={
+                        "tier": profile["tier"],
+                        "time": timings["extract"],
+                        "page_count": profile["page_count"],
+                    },
+                )
+                await finish_stage("index", started)
+            finally:
+                remove_spool(markdown_path)
+        except Exception as e:
+            try:
+                await asyncio.to_thread(unindex_document, str(file_id))
+                await asyncio.to_thread(fs.delete, file_id)
+            except Exception:
+                logger.exception("Erro ao desfazer a ingestão do job %s", job_id)
+            await self.jobs.update(job_id, status="failed", error=str(e), file_id=None)
+            # Trechos indexados antes da falha podem ter entrado em buscas em cache.
+            SearchCache().invalidate()
+            remove_spool(job["spool_path"])
+            return
+
+        await self.jobs.update(job_id, status="done", stage="done", progress=1.0)
+        SearchCache().invalidate()
+        # As prévias do primeiro lote de páginas são geradas enquanto o spool
+        # ainda existe; uma falha aqui não afeta o documento, as prévias são
+        # refeitas sob demanda.
+        try:
+            await render_previews(job["spool_path"], job["sha256"], preview_batch(1))
+        except (ExtractionError, OSError):
+            logger.warning("Erro ao gerar a prévia do job %s", job_id, exc_info=True)
+        remove_spool(job["spool_path"])
@@ -0,0 +1,569 @@
+"""Módulo com as etapas compartilhadas de ingestão de documentos"""
+
+import asyncio
+import os
+import time
+from datetime import datetime
+from itertools import batched
+from typing import AsyncIterator, Awaitable, Callable, TextIO
+
+from bson.objectid import ObjectId
+from gridfs import GridFS
+
+from src.elastic.client import CHUNK_INDEX, DOC_INDEX, category_routing
+from src.ingest.cache import MarkdownCache
+from src.ingest.chunking import (
+    KEY_HEADINGS_MAX,
+    PAGE_SEPARATOR,
+    Chunk,
+    key_headings,
+    read_pages,
+    split_markdown,
+    split_page,
+)
+from src.ingest.embedding import Embedder
+from src.ingest.extraction import (
+    EXTRACTION_PAGE_BATCH,
+    MARKDOWN_TIER,
+    MAX_PDF_PAGES,
+    ExtractionError,
+    ExtractionService,
+)
+from src.ingest.spool import SpooledUpload, UploadTooLarge, remove_spool, store_spool
+from src.mongo.client import MongoDBClient
+from src.search.backend import SearchBackend, get_search_backend
+
+BULK_BATCH_SIZE = int(os.getenv("BULK_BATCH_SIZE", "32"))
+
+markdown_cache = MarkdownCache()
+
+
+def document_body(
+    file_id: str,
+    filename: str,
+    content: str,
+    metadata: dict,
+    extraction: dict | None = None,
+    headings: list[str] | None = None,
+) -> dict:
+    """
+    Monta o documento do índice de documentos.
+
+    Args:
+        file_id (str): ID do documento, repetido no corpo para desempate na ordenação.
+        filename (str): Nome do arquivo.
+        content (str): Conteúdo extraído em markdown.
+        metadata (dict): Metadados do upload (categoria, acesso, autor e data).
+        extraction (dict | None): Camada (`tier`), duração em segundos (`time`)
+            e número de páginas (`page_count`) da extração.
+        headings (list[str] | None): Títulos principais já coletados; por
+            padrão, extraídos do conteúdo.
+
+    Returns:
+        dict: Corpo do documento para o índice de documentos.
+    """
+    extraction = extraction or {}
+    return {
+        "file_id": file_id,
+        "filename": filename,
+        "content": content,
+        "headings": headings if headings is not None else key_headings(content),
+        "category": metadata["category"],
+        "access_level": metadata["access_level"],
+        "uploaded_by": metadata["uploaded_by"],
+        "data_upload": metadata["data_upload"].isoformat(),
+        "extraction_tier": extraction.get("tier"),
+        "extraction_time": extraction.get("time"),
+        "page_count": extraction.get("page_count"),
+    }
+
+
+def chunk_actions(
+    file_id: str,
+    filename: str,
+    chunks: list[Chunk],
+    metadata: dict,
+    first_chunk_no: int = 0,
+    index: str = CHUNK_INDEX,
+):
+    """
+    Gera as ações de bulk que indexam os trechos de um documento.
+
+    Args:
+        file_id (str): ID do documento pai.
+        filename (str): Nome do arquivo.
+        chunks (list[Chunk]): Trechos do documento.
+        metadata (dict): Metadados do upload.
+        first_chunk_no (int): Número do primeiro trecho da lista.
+        index (str): Índice (ou alias) de destino.
+
+    Yields:
+        dict: Ação de indexação de um trecho no índice de trechos.
+    """
+    vectors = Embedder().encode([chunk.text for chunk in chunks])
+    for chunk_no, (chunk, vector) in enumerate(zip(chunks, vectors), first_chunk_no):
+        source = {
+            "parent_id": file_id,
+            "chunk_no": chunk_no,
+            "page": chunk.page,
+            "start_offset": chunk.start,
+            "end_offset": chunk.end,
+            "heading": chunk.heading,
+            "filename": filename,
+            "content": chunk.text,
+            "category": metadata["category"],
+            "access_level": metadata["access_level"],
+            "uploaded_by": metadata["uploaded_by"],
+        }
+        # Vetores nulos (trechos sem termos) não são aceitos com similaridade cosseno.
+        if vector.any():
+            source["embedding"] = vector.tolist()
+        yield {
+            "_index": index,
+            "_id": f"{file_id}_{chunk_no}",
+            "_routing": category_routing(metadata["category"]),
+            "_source": source,
+        }
+
+
+def index_document(
+    file_id: str,
+    filename: str,
+    content: str,
+    metadata: dict,
+    with_chunks: bool = True,
+    extraction: dict | None = None,
+) -> None:
+    """
+    Grava o markdown no armazenamento comprimido e indexa o documento e, se
+    `with_chunks`, também seus trechos.
+    """
+    MongoDBClient().markdown.put(ObjectId(file_id), filename, content)
+    actions = [
+        {
+            "_index": DOC_INDEX,
+            "_id": file_id,
+            "_routing": category_routing(metadata["category"]),
+            "_source": document_body(file_id, filename, content, metadata, extraction),
+        }
+    ]
+    if with_chunks:
+        actions.extend(chunk_actions(file_id, filename, split_markdown(content), metadata))
+    get_search_backend().bulk(actions)
+
+
+def index_markdown_file(
+    file_id: str,
+    filename: str,
+    markdown_path: str,
+    headings: list[str],
+    metadata: dict,
+    extraction: dict | None = None,
+) -> None:
+    """
+    Grava e indexa o documento extraído por `extract_and_index_chunks`, cujos
+    trechos já estão no índice.
+
+    O armazenamento comprimido é gravado direto do arquivo, em blocos. Só o
+    índice de documentos recebe o conteúdo inteiro, em uma única requisição,
+    então ele é lido do arquivo logo antes do envio e descartado em seguida.
+    """
+    MongoDBClient().markdown.put_file(ObjectId(file_id), filename, markdown_path)
+    with open(markdown_path, encoding="utf-8", newline="") as markdown:
+        source = document_body(
+            file_id, filename, markdown.read(), metadata, extraction, headings
+        )
+    get_search_backend().bulk([
+        {
+            "_index": DOC_INDEX,
+            "_id": file_id,
+            "_routing": category_routing(metadata["category"]),
+            "_source": source,
+        }
+    ])
+
+
+def unindex_document(file_id: str, indexed: list[dict] | None = None) -> None:
+    """
+    Remove um documento e seus trechos dos índices e o seu markdown.
+
+    Args:
+        file_id (str): ID do documento.
+        indexed (list[dict] | None): Entradas já indexadas do documento
+            (`_index`, `_id` e `_routing`), como as devolvidas pela bulk API.
+            Elas são removidas pelo ID, o que vale mesmo antes do refresh,
+            sem forçar um refresh no meio de uma carga em massa.
+    """
+    client = MongoDBClient()
+    # Registro da remoção, reaplicado por uma reindexação em andamento.
+    client.db["deleted_files"].update_one(
+        {"_id": ObjectId(file_id)}, {"$set": {"deleted_at": datetime.now()}}, upsert=True
+    )
+    client.markdown.delete(ObjectId(file_id))
+    if indexed is None:
+        get_search_backend().delete_document(file_id)
+        return
+    get_search_backend().bulk({"_op_type": "delete", **item} for item in indexed)
+
+
+async def check_upload(path: str) -> int:
+    """
+    Verifica um PDF recebido antes de aceitá-lo para ingestão.
+
+    Só abre o arquivo e conta as páginas, fora do pool de extração, então
+    pode rodar na requisição do upload. A inspeção das páginas que escolhe
+    a camada de extração fica para a ingestão.
+
+    Args:
+        path (str): Caminho do PDF no spool.
+
+    Returns:
+        int: Número de páginas do PDF.
+
+    Raises:
+        ExtractionError: Se o arquivo não for um PDF válido.
+        UploadTooLarge: Se o PDF exceder `MAX_PDF_PAGES`.
+    """
+    try:
+        page_count = await ExtractionService().page_count(path)
+    except Exception as e:
+        raise ExtractionError(f"Arquivo não é um PDF válido: {str(e)}") from e
+    if page_count > MAX_PDF_PAGES:
+        raise UploadTooLarge(f"PDF tem {page_count} páginas; o limite é {MAX_PDF_PAGES}")
+    return page_count
+
+
+async def extract_markdown(path: str, sha256: str, tier: str = MARKDOWN_TIER) -> str:
+    """
+    Extrai o markdown de um PDF, reutilizando o cache quando possível.
+
+    Args:
+        path (str): Caminho do PDF no spool.
+        sha256 (str): Hash SHA-256 do PDF.
+        tier (str): Camada de extração.
+
+    Returns:
+        str: Conteúdo do PDF em markdown.
+    """
+    content = await asyncio.to_thread(markdown_cache.get, sha256, tier)
+    if content is None:
+        content = await ExtractionService().to_markdown(path, tier)
+        await asyncio.to_thread(markdown_cache.put, sha256, tier, content)
+    return content
+
+
+async def _read_cached_pages(markdown: TextIO) -> AsyncIterator[tuple[int, str]]:
+    """Páginas do markdown em cache, no formato de `ExtractionService.iter_pages`."""
+    pages = read_pages(markdown)
+    page_no = 0
+    while (text := await asyncio.to_thread(next, pages, None)) is not None:
+        yield page_no, text
+        page_no += 1
+
+
+async def extract_and_index_chunks(
+    path: str,
+    sha256: str,
+    file_id: str,
+    filename: str,
+    metadata: dict,
+    tier: str = MARKDOWN_TIER,
+    on_progress: Callable[[int, int], Awaitable[None]] | None = None,
+) -> tuple[str, list[str]]:
+    """
+    Extrai um PDF página a página, indexando os trechos enquanto avança.
+
+    O markdown de cada página é gravado em um arquivo ao lado do spool (e
+    depois copiado para o cache) e os trechos são enviados ao índice a cada
+    lote de páginas, então a memória da extração fica proporcional ao lote,
+    não ao documento. Um markdown em cache é lido da mesma forma, página a
+    página.
+
+    Args:
+        path (str): Caminho do PDF no spool.
+        sha256 (str): Hash SHA-256 do PDF.
+        file_id (str): ID do documento pai dos trechos.
+        filename (str): Nome do arquivo.
+        metadata (dict): Metadados do upload.
+        tier (str): Camada de extração.
+        on_progress (Callable[[int, int], Awaitable[None]] | None): Corrotina
+            chamada com as páginas processadas e o total de páginas após cada lote.
+
+    Returns:
+        tuple[str, list[str]]: Caminho do arquivo com o markdown completo,
+            que passa a ser de quem chamou, e os títulos principais do documento.
+    """
+    backend = get_search_backend()
+    extraction = ExtractionService()
+    total = await extraction.page_count(path)
+    cached = await asyncio.to_thread(markdown_cache.open, sha256, tier)
+    markdown_path = f"{path}.md"
+    chunk_no = 0
+    offset = 0
+    heading = None
+    headings = []
+    actions = []
+    try:
+        if cached is not None:
+            pages = _read_cached_pages(cached)
+        else:
+            pages = extraction.iter_pages(path, tier)
+        with open(markdown_path, "w", encoding="utf-8", newline="") as markdown:
+            async for page_no, text in pages:
+                if page_no:
+                    markdown.write(PAGE_SEPARATOR)
+                markdown.write(text)
+
+                for key_heading in key_headings(text):
+                    if key_heading not in headings and len(headings) < KEY_HEADINGS_MAX:
+                        headings.append(key_heading)
+                chunks = split_page(text, page_no, offset, heading)
+                if chunks:
+                    heading = chunks[-1].heading
+                actions.extend(chunk_actions(file_id, filename, chunks, metadata, chunk_no))
+                chunk_no += len(chunks)
+                offset += len(text) + len(PAGE_SEPARATOR)
+
+                if (page_no + 1) % EXTRACTION_PAGE_BATCH == 0 or page_no + 1 == total:
+                    await asyncio.to_thread(backend.bulk, actions)
+                    actions = []
+                    if on_progress:
+                        await on_progress(page_no + 1, total)
+            if actions:
+                await asyncio.to_thread(backend.bulk, actions)
+
+        if cached is None:
+            await asyncio.to_thread(markdown_cache.put_file, sha256, tier, markdown_path)
+    except BaseException:
+        remove_spool(markdown_path)
+        raise
+    finally:
+        if cached is not None:
+            cached.close()
+    return markdown_path, headings
+
+
+def find_duplicate(fs: GridFS, sha256: str) -> ObjectId | None:
+    """Retorna o ID do arquivo já armazenado com o mesmo conteúdo, se houver."""
+    existing = fs.find_one({"metadata.sha256": sha256})
+    return existing._id if existing else None
+
+
+async def merge_duplicate(
+    file_id: ObjectId,
+    filename: str,
+    path: str,
+    sha256: str,
+    metadata: dict,
+    tier: str = MARKDOWN_TIER,
+) -> None:
+    """
+    Registra um novo upload de um conteúdo que já existe.
+
+    Nenhuma cópia é gravada no GridFS: o upload é acrescentado aos metadados
+    do arquivo existente e o documento indexado recebe a nova categoria e o
+    novo autor, ficando com o menor nível de acesso entre os uploads. Se o
+    documento não estiver mais no índice, ele é reindexado a partir do
+    markdown em cache.
+
+    As chamadas ao MongoDB e ao índice são síncronas (e a fusão no índice
+    inclui um update_by_query), então rodam em threads para não bloquear o
+    event loop.
+    """
+    db = MongoDBClient().db
+    upload = {
+        "filename": filename,
+        "category": metadata["category"],
+        "access_level": metadata["access_level"],
+        "uploaded_by": metadata["uploaded_by"],
+        "data_upload": metadata["data_upload"],
+    }
+    await asyncio.to_thread(
+        db["fs.files"].update_one,
+        {"_id": file_id},
+        {
+            "$push": {"metadata.uploads": upload},
+            "$min": {"metadata.access_level": metadata["access_level"]},
+            # Uma reindexação em andamento reprocessa os arquivos alterados.
+            "$set": {"metadata.modified_at": datetime.now()},
+        },
+    )
+
+    params = {
+        "category": metadata["category"],
+        "uploaded_by": metadata["uploaded_by"],
+        "access_level": metadata["access_level"],
+    }
+    if not await asyncio.to_thread(get_search_backend().merge_upload, str(file_id), params):
+        content = await extract_markdown(path, sha256, tier)
+        await asyncio.to_thread(
+            index_document, str(file_id), filename, content, metadata, extraction={"tier": tier}
+        )
+
+
+async def bulk_ingest(items: list[tuple[str, SpooledUpload]], metadata: dict) -> list[dict]:
+    """
+    Ingere vários PDFs com extração paralela e indexação pela bulk API.
+
+    Os arquivos são processados em lotes de `BULK_BATCH_SIZE` para limitar
+    o markdown mantido em memória. Durante toda a carga o índice fica com
+    refresh desabilitado e sem réplicas. PDFs inválidos ou acima de
+    `MAX_PDF_PAGES` são pulados; falhas da inspeção (tempo limite, pool)
+    marcam o arquivo como falho.
+
+    Args:
+        items (list[tuple[str, SpooledUpload]]): Nome e spool de cada PDF.
+        metadata (dict): Metadados aplicados a todos os documentos.
+
+    Returns:
+        list[dict]: Resultado por arquivo, na mesma ordem de `items`.
+    """
+    backend = get_search_backend()
+    report = []
+    async with backend.bulk_load():
+        for batch in batched(items, BULK_BATCH_SIZE):
+            report.extend(await _ingest_batch(batch, metadata, backend))
+    return report
+
+
+async def _ingest_batch(batch, metadata: dict, backend: SearchBackend) -> list[dict]:
+    fs = MongoDBClient().fs
+    markdown_store = MongoDBClient().markdown
+    report = []
+    pending = []
+    repeated = []
+    leaders = {}
+    profiles = {}
+    for filename, spooled in batch:
+        entry = {"filename": filename, "status": "failed", "file_id": None, "error": None}
+        report.append(entry)
+        if spooled.sha256 in leaders:
+            repeated.append((entry, filename, spooled))
+            continue
+        try:
+            await check_upload(spooled.path)
+        except (ExtractionError, UploadTooLarge) as e:
+            entry["status"] = "skipped"
+            entry["error"] = str(e)
+            continue
+        try:
+            profiles[spooled.sha256] = await ExtractionService().inspect(spooled.path)
+        except ExtractionError as e:
+            entry["error"] = f"Erro ao inspecionar PDF: {str(e)}"
+            continue
+        tier = profiles[spooled.sha256]["tier"]
+        existing = await asyncio.to_thread(find_duplicate, fs, spooled.sha256)
+        if existing is not None:
+            await _merge_into(entry, existing, filename, spooled, metadata, tier)
+            continue
+        leaders[spooled.sha256] = entry
+        pending.append((entry, filename, spooled))
+
+    async def timed_extract(spooled: SpooledUpload) -> tuple[str, float]:
+        started = time.perf_counter()
+        content = await extract_markdown(
+            spooled.path, spooled.sha256, profiles[spooled.sha256]["tier"]
+        )
+        return content, round(time.perf_counter() - started, 3)
+
+    extracted = await asyncio.gather(
+        *(timed_extract(spooled) for _, _, spooled in pending),
+        return_exceptions=True,
+    )
+
+    actions = []
+    stored = {}
+    for (entry, filename, spooled), result in zip(pending, extracted):
+        if isinstance(result, BaseException):
+            entry["error"] = f"Erro ao processar PDF: {str(result)}"
+            continue
+        content, elapsed = result
+        profile = profiles[spooled.sha256]
+        try:
+            file_id = await asyncio.to_thread(
+                store_spool, spooled.path, fs, filename,
+                {**metadata, "sha256": spooled.sha256, "page_count": profile["page_count"]},
+            )
+        except Exception as e:
+            entry["error"] = f"Erro ao salvar PDF: {str(e)}"
+            continue
+        try:
+            await asyncio.to_thread(markdown_store.put, file_id, filename, content)
+        except Exception as e:
+            entry["error"] = f"Erro ao salvar markdown: {str(e)}"
+            await asyncio.to_thread(fs.delete, file_id)
+            continue
+        entry["file_id"] = str(file_id)
+        stored[str(file_id)] = (entry, file_id)
+        actions.append(
+            {
+                "_index": DOC_INDEX,
+                "_id": str(file_id),
+                "_routing": category_routing(metadata["category"]),
+                "_source": document_body(
+                    str(file_id),
+                    filename,
+                    content,
+                    metadata,
+                    {"tier": profile["tier"], "time": elapsed, "page_count": profile["page_count"]},
+                ),
+            }
+        )
+        actions.extend(
+            chunk_actions(str(file_id), filename, split_markdown(content), metadata)
+        )
+
+    results = await asyncio.to_thread(backend.bulk, actions, raise_on_error=False)
+    failures = {}
+    indexed = {}
+    routing = category_routing(metadata["category"])
+    for ok, info in results:
+        item = info["index"]
+        # Trechos têm ID "<id do documento>_<n>"; o status vale para o documento.
+        parent_id = item["_id"].split("_")[0]
+        if not ok:
+            failures.setdefault(parent_id, item.get("error"))
+            continue
+        indexed.setdefault(parent_id, []).append(
+            {"_index": item["_index"], "_id": item["_id"], "_routing": routing}
+        )
+
+    for parent_id, (entry, file_id) in stored.items():
+        if parent_id not in failures:
+            entry["status"] = "indexed"
+            continue
+        entry["error"] = f"Erro ao indexar: {failures[parent_id]}"
+        entry["file_id"] = None
+        # O refresh está desabilitado durante a carga, então as partes já
+        # indexadas são removidas pelo ID.
+        await asyncio.to_thread(unindex_document, parent_id, indexed.get(parent_id, []))
+        await asyncio.to_thread(fs.delete, file_id)
+
+    # Arquivos repetidos dentro do mesmo lote viram uploads do primeiro.
+    for entry, filename, spooled in repeated:
+        leader = leaders[spooled.sha256]
+        if leader["status"] != "indexed":
+            entry["error"] = leader["error"]
+            continue
+        await _merge_into(
+            entry, ObjectId(leader["file_id"]), filename, spooled, metadata,
+            profiles[spooled.sha256]["tier"],
+        )
+    return report
+
+
+async def _merge_into(
+    entry: dict,
+    file_id: ObjectId,
+    filename: str,
+    spooled: SpooledUpload,
+    metadata: dict,
+    tier: str,
+) -> None:
+    try:
+        await merge_duplicate(file_id, filename, spooled.path, spooled.sha256, metadata, tier)
+    except Exception as e:
+        entry["error"] = f"Erro ao registrar documento duplicado: {str(e)}"
+        return
+    entry["status"] = "deduplicated"
+    entry["file_id"] = str(file_id)
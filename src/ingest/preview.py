@@ -0,0 +1,135 @@
+"""Módulo das prévias de páginas dos PDFs em baixa resolução"""
+
+import asyncio
+import os
+from typing import Awaitable, Callable
+
+import pymupdf
+
+from src.ingest.cache import PreviewCache
+from src.ingest.extraction import ExtractionService
+from src.ingest.spool import SpooledUpload, open_pdf
+
+PREVIEW_WIDTH = int(os.getenv("PREVIEW_WIDTH", "320"))
+PREVIEW_MAX_WIDTH = 1024
+PREVIEW_JPEG_QUALITY = int(os.getenv("PREVIEW_JPEG_QUALITY", "70"))
+# Páginas renderizadas de uma vez, na ingestão e a cada cópia do GridFS.
+PREVIEW_BATCH_PAGES = int(os.getenv("PREVIEW_BATCH_PAGES", "8"))
+# Cópias simultâneas de PDFs do GridFS para renderizar prévias fora do cache.
+PREVIEW_CONCURRENCY = int(os.getenv("PREVIEW_CONCURRENCY", "2"))
+
+preview_cache = PreviewCache()
+
+# Renderizações em andamento por (SHA-256, primeira página do lote, largura).
+_pending: dict[tuple[str, int, int], asyncio.Task] = {}
+_slots: tuple[asyncio.AbstractEventLoop, asyncio.Semaphore] | None = None
+
+
+def preview_batch(page: int) -> range:
+    """Lote de páginas (a partir de 1) renderizado junto com `page`."""
+    first = (page - 1) // PREVIEW_BATCH_PAGES * PREVIEW_BATCH_PAGES + 1
+    return range(first, first + PREVIEW_BATCH_PAGES)
+
+
+def _render_pages(path: str, first: int, stop: int, width: int) -> tuple[int, dict[int, bytes]]:
+    """
+    Renderiza em JPEG as páginas de `first` a `stop` (exclusivo, a partir de 0)
+    que existem no PDF e retorna também o número de páginas. Executada dentro
+    de um processo do pool.
+    """
+    previews = {}
+    with open_pdf(path) as doc:
+        for page_no in range(first, min(stop, doc.page_count)):
+            page = doc[page_no]
+            zoom = width / page.rect.width
+            pixmap = page.get_pixmap(matrix=pymupdf.Matrix(zoom, zoom), alpha=False)
+            previews[page_no] = pixmap.tobytes("jpeg", jpg_quality=PREVIEW_JPEG_QUALITY)
+        return doc.page_count, previews
+
+
+async def render_previews(
+    path: str, sha256: str, pages: range, width: int = PREVIEW_WIDTH
+) -> tuple[int, dict[int, bytes]]:
+    """
+    Renderiza as prévias de um intervalo de páginas no pool de extração, em
+    uma única tarefa, e as grava no cache.
+
+    Args:
+        path (str): Caminho do PDF em spool.
+        sha256 (str): Hash SHA-256 do PDF (chave do cache).
+        pages (range): Páginas, a partir de 1; as que não existem no PDF são ignoradas.
+        width (int): Largura das imagens em pixels.
+
+    Returns:
+        tuple[int, dict[int, bytes]]: Número de páginas do PDF e imagem JPEG
+            de cada página renderizada.
+
+    Raises:
+        ExtractionError: Se a renderização falhar ou exceder o tempo limite.
+    """
+    page_count, rendered = await ExtractionService().run(
+        _render_pages, path, pages.start - 1, pages.stop - 1, width
+    )
+    previews = {page_no + 1: data for page_no, data in rendered.items()}
+    for page, data in previews.items():
+        await asyncio.to_thread(preview_cache.put, sha256, page, width, data)
+    return page_count, previews
+
+
+def _get_slots() -> asyncio.Semaphore:
+    """Semáforo das cópias do GridFS, recriado se o event loop mudar."""
+    global _slots
+    loop = asyncio.get_running_loop()
+    if _slots is None or _slots[0] is not loop:
+        _slots = (loop, asyncio.Semaphore(PREVIEW_CONCURRENCY))
+    return _slots[1]
+
+
+async def _render_batch(
+    sha256: str, pages: range, width: int, download: Callable[[], Awaitable[SpooledUpload]]
+) -> tuple[int, dict[int, bytes]]:
+    async with _get_slots():
+        spooled = await download()
+        try:
+            return await render_previews(spooled.path, sha256, pages, width)
+        finally:
+            spooled.cleanup()
+
+
+async def render_missing_preview(
+    sha256: str, page: int, width: int, download: Callable[[], Awaitable[SpooledUpload]]
+) -> tuple[int, bytes | None]:
+    """
+    Gera a prévia de uma página que não está no cache.
+
+    O PDF é copiado para o spool uma vez por lote de `PREVIEW_BATCH_PAGES`
+    páginas, e o lote inteiro vai para o cache. Requisições simultâneas do
+    mesmo lote esperam a mesma renderização, e no máximo
+    `PREVIEW_CONCURRENCY` cópias rodam ao mesmo tempo. Quem chama deve
+    recusar antes as páginas além do fim do PDF, quando o número de páginas
+    for conhecido, já que uma página inexistente nunca entra no cache.
+
+    Args:
+        sha256 (str): Hash SHA-256 do PDF (chave do cache).
+        page (int): Página, a partir de 1.
+        width (int): Largura da imagem em pixels.
+        download (Callable[[], Awaitable[SpooledUpload]]): Corrotina que
+            copia o PDF para o spool.
+
+    Returns:
+        tuple[int, bytes | None]: Número de páginas do PDF e imagem JPEG da
+            página, ou None se ela não existir no PDF.
+
+    Raises:
+        ExtractionError: Se a renderização falhar ou exceder o tempo limite.
+    """
+    pages = preview_batch(page)
+    key = (sha256, pages.start, width)
+    task = _pending.get(key)
+    if task is None:
+        task = asyncio.ensure_future(_render_batch(sha256, pages, width, download))
+        _pending[key] = task
+        task.add_done_callback(lambda _: _pending.pop(key, None))
+    # Uma requisição cancelada não interrompe a renderização das demais.
+    page_count, previews = await asyncio.shield(task)
+    return page_count, previews.get(page)
@@ -0,0 +1,410 @@
+"""Reindexação completa dos documentos em novos índices versionados.
+
+Percorre os PDFs do GridFS, extrai o markdown novamente no pool de
+processos e carrega os documentos e trechos em novos índices
+(`healthcom_docs_vN-000001` e `healthcom_chunks_vN-000001`) pela bulk API.
+Ao final, os aliases `healthcom_docs` e `healthcom_chunks` passam para os
+novos índices em uma única operação, então as buscas nunca ficam sem
+índice. Os novos índices usam o número de shards e réplicas configurado e
+o roteamento por categoria, e as gerações seguintes vêm do rollover.
+
+O progresso é gravado no MongoDB (`reindex_runs`) a cada lote; se o
+comando for interrompido, a próxima execução continua do último lote.
+Depois da troca, uploads, uploads repetidos (`metadata.modified_at`) e
+remoções (`deleted_files`) feitos durante a carga são reaplicados nos
+novos índices.
+
+Só se aplica ao Elasticsearch (`SEARCH_BACKEND=elasticsearch`); o
+mecanismo embutido não tem índices versionados.
+
+Com `--fit-embeddings`, o modelo de embeddings dos trechos é ajustado
+antes em uma amostra dos trechos indexados, e a nova versão dos índices
+já sai com os vetores do novo modelo. Ele fica em um arquivo à parte
+durante a carga e só substitui `EMBEDDING_MODEL_PATH` na troca dos
+aliases, quando a API passa a usá-lo sem reiniciar.
+
+Uso:
+    PYTHONPATH=. python -m src.ingest.reindex [--batch-size 32] [--restart] [--fit-embeddings]
+"""
+
+import argparse
+import asyncio
+import itertools
+import logging
+import os
+import time
+from datetime import datetime
+
+from bson.objectid import ObjectId
+from elasticsearch import helpers
+from gridfs import GridOut
+
+from src.elastic.client import (
+    CHUNK_INDEX,
+    DOC_INDEX,
+    ElasticsearchConnection,
+    category_routing,
+    chunk_index_body,
+    doc_index_body,
+    versioned_index,
+)
+from src.elastic.search_cache import SearchCache
+from src.ingest.chunking import split_markdown
+from src.ingest.embedding import EMBEDDING_MODEL_PATH, Embedder, fit, save_model
+from src.ingest.extraction import ExtractionService
+from src.ingest.pipeline import (
+    BULK_BATCH_SIZE,
+    chunk_actions,
+    document_body,
+    extract_markdown,
+)
+from src.ingest.spool import spool_fileobj
+from src.mongo.client import MongoDBClient
+from src.search.backend import get_search_backend
+from src.search.es_backend import BULK_THREADS
+
+logger = logging.getLogger(__name__)
+
+INDEX_BODIES = {DOC_INDEX: doc_index_body, CHUNK_INDEX: chunk_index_body}
+
+EMBEDDING_FIT_SAMPLE = int(os.getenv("EMBEDDING_FIT_SAMPLE", "20000"))
+
+
+def _next_version(es) -> int:
+    """Próxima versão livre considerando os índices versionados existentes."""
+    version = 1
+    for alias in INDEX_BODIES:
+        for index in es.indices.get(index=f"{alias}_v*"):
+            # Gerações de rollover (`_v2-000003`) contam como a versão 2.
+            suffix = index.rsplit("_v", 1)[-1].split("-")[0]
+            if suffix.isdigit():
+                version = max(version, int(suffix) + 1)
+    return version
+
+
+def _create_target_indices(es, version: int) -> dict[str, str]:
+    """Cria os índices da nova versão, prontos para carga em massa."""
+    targets = {}
+    for alias, body in INDEX_BODIES.items():
+        index = versioned_index(alias, version)
+        if not es.indices.exists(index=index):
+            body = body()
+            body["settings"]["refresh_interval"] = "-1"
+            es.indices.create(index=index, body=body)
+        targets[alias] = index
+    return targets
+
+
+def _finish_target_indices(es, targets: dict[str, str]) -> None:
+    """Restaura o refresh e as réplicas dos novos índices antes da troca."""
+    for alias, index in targets.items():
+        settings = INDEX_BODIES[alias]()["settings"]
+        es.indices.put_settings(
+            index=index,
+            settings={
+                "refresh_interval": None,
+                "number_of_replicas": settings["number_of_replicas"],
+            },
+        )
+    es.indices.refresh(index=list(targets.values()))
+
+
+def _fit_embeddings(es, path: str) -> bool:
+    """
+    Ajusta o modelo de embeddings em uma amostra dos trechos indexados e o
+    grava em `path`, passando a usá-lo neste processo.
+
+    Returns:
+        bool: False se não houver trechos suficientes e o modelo for mantido.
+    """
+    hits = helpers.scan(
+        es, index=CHUNK_INDEX, query={"query": {"match_all": {}}}, _source=["content"]
+    )
+    texts = [hit["_source"]["content"] for hit in itertools.islice(hits, EMBEDDING_FIT_SAMPLE)]
+    started = time.perf_counter()
+    try:
+        idf, components = fit(texts)
+    except ValueError as e:
+        logger.warning("Modelo de embeddings mantido: %s", e)
+        return False
+    save_model(idf, components, path)
+    Embedder().load(path)
+    logger.info(
+        "Modelo de embeddings ajustado em %s trechos (%.1fs)",
+        len(texts), time.perf_counter() - started,
+    )
+    return True
+
+
+def _publish_embeddings(path: str | None) -> None:
+    """Substitui o modelo em uso pelo ajustado na reindexação."""
+    if path is None:
+        return
+    if os.path.exists(path):
+        os.replace(path, EMBEDDING_MODEL_PATH)
+    Embedder().load()
+
+
+def stored_metadata(metadata: dict) -> dict:
+    """
+    Reconstrói os metadados indexados a partir dos metadados do GridFS.
+
+    Uploads repetidos do mesmo conteúdo (ver `merge_duplicate`) viram listas
+    de categorias e autores, como no documento indexado original.
+    """
+    uploads = [metadata, *metadata.get("uploads", [])]
+
+    def collect(field: str):
+        values = list(dict.fromkeys(upload[field] for upload in uploads))
+        return values[0] if len(values) == 1 else values
+
+    return {
+        "category": collect("category"),
+        "access_level": metadata["access_level"],
+        "uploaded_by": collect("uploaded_by"),
+        "data_upload": metadata["data_upload"],
+    }
+
+
+async def _reindex_file(grid_out: GridOut, targets: dict[str, str]) -> tuple[list[dict], int]:
+    """
+    Extrai um PDF do GridFS e monta as ações de bulk para os novos índices.
+
+    Returns:
+        tuple[list[dict], int]: Ações do documento e dos trechos e número de páginas.
+    """
+    spooled = await asyncio.to_thread(spool_fileobj, grid_out)
+    try:
+        extraction = ExtractionService()
+        profile = await extraction.inspect(spooled.path)
+        started = time.perf_counter()
+        content = await extract_markdown(spooled.path, spooled.sha256, profile["tier"])
+        elapsed = round(time.perf_counter() - started, 3)
+    finally:
+        spooled.cleanup()
+
+    file_id = str(grid_out._id)
+    await asyncio.to_thread(
+        MongoDBClient().markdown.put, grid_out._id, grid_out.filename, content
+    )
+    metadata = stored_metadata(grid_out.metadata)
+    actions = [
+        {
+            "_index": targets[DOC_INDEX],
+            "_id": file_id,
+            "_routing": category_routing(metadata["category"]),
+            "_source": document_body(
+                file_id,
+                grid_out.filename,
+                content,
+                metadata,
+                {"tier": profile["tier"], "time": elapsed, "page_count": profile["page_count"]},
+            ),
+        }
+    ]
+    actions.extend(
+        chunk_actions(
+            file_id, grid_out.filename, split_markdown(content), metadata,
+            index=targets[CHUNK_INDEX],
+        )
+    )
+    return actions, profile["page_count"]
+
+
+async def _reindex_batch(files: list[GridOut], targets: dict[str, str]) -> dict:
+    """Reindexa um lote de PDFs, retornando os contadores do lote."""
+    results = await asyncio.gather(
+        *(_reindex_file(grid_out, targets) for grid_out in files), return_exceptions=True
+    )
+    counts = {"processed": 0, "failed": 0, "pages": 0, "bytes": 0, "errors": []}
+    actions = []
+    for grid_out, result in zip(files, results):
+        if isinstance(result, BaseException):
+            counts["failed"] += 1
+            counts["errors"].append({"file_id": str(grid_out._id), "error": str(result)})
+            logger.error("Erro ao reindexar %s: %s", grid_out._id, result)
+            continue
+        file_actions, pages = result
+        actions.extend(file_actions)
+        counts["processed"] += 1
+        counts["pages"] += pages
+        counts["bytes"] += grid_out.length
+
+    es = ElasticsearchConnection().es
+    for ok, info in await asyncio.to_thread(
+        lambda: list(
+            helpers.parallel_bulk(
+                es, actions, thread_count=BULK_THREADS,
+                raise_on_error=False, raise_on_exception=False,
+            )
+        )
+    ):
+        if not ok:
+            item = info["index"]
+            counts["errors"].append(
+                {"file_id": item["_id"].split("_")[0], "error": str(item.get("error"))}
+            )
+    return counts
+
+
+def _throughput(run: dict) -> str:
+    elapsed = run["elapsed"] or 1e-9
+    return (
+        f"{run['processed']} documentos ({run['failed']} com erro), "
+        f"{run['processed'] / elapsed:.2f} docs/s, {run['pages'] / elapsed:.1f} páginas/s, "
+        f"{run['bytes'] / elapsed / (1024 * 1024):.2f} MB/s"
+    )
+
+
+async def _walk(runs, run: dict, query: dict, batch_size: int, checkpoint: bool) -> dict:
+    """Reindexa os arquivos do GridFS que atendem à consulta, em ordem de ID."""
+    fs = MongoDBClient().fs
+    last_id = run["last_id"] if checkpoint else None
+    while True:
+        page_query = dict(query)
+        if last_id is not None:
+            page_query["_id"] = {"$gt": last_id}
+        files = await asyncio.to_thread(
+            lambda: list(fs.find(page_query).sort("_id", 1).limit(batch_size))
+        )
+        if not files:
+            return run
+
+        started = time.perf_counter()
+        counts = await _reindex_batch(files, run["targets"])
+        last_id = files[-1]._id
+        update = {
+            "processed": run["processed"] + counts["processed"],
+            "failed": run["failed"] + counts["failed"],
+            "pages": run["pages"] + counts["pages"],
+            "bytes": run["bytes"] + counts["bytes"],
+            "elapsed": run["elapsed"] + time.perf_counter() - started,
+            "updated_at": datetime.now(),
+        }
+        if checkpoint:
+            update["last_id"] = last_id
+        run.update(update)
+        await asyncio.to_thread(
+            runs.update_one,
+            {"_id": run["_id"]},
+            {"$set": update, "$push": {"errors": {"$each": counts["errors"]}}},
+        )
+        logger.info("Reindexação v%s: %s", run["version"], _throughput(run))
+
+
+async def _replay_deletes(since: datetime) -> None:
+    """Remove dos índices atuais os documentos apagados desde `since`."""
+    client = MongoDBClient()
+    query = {"deleted_at": {"$gte": since}}
+    deleted = await asyncio.to_thread(
+        lambda: [item["_id"] for item in client.db["deleted_files"].find(query)]
+    )
+    backend = get_search_backend()
+    for file_id in deleted:
+        await asyncio.to_thread(backend.delete_document, str(file_id))
+        # A carga pode ter regravado o markdown de um arquivo já apagado.
+        await asyncio.to_thread(client.markdown.delete, file_id)
+    if deleted:
+        logger.info("Reindexação: %s remoções reaplicadas", len(deleted))
+
+
+async def reindex(
+    batch_size: int = BULK_BATCH_SIZE, restart: bool = False, fit_embeddings: bool = False
+) -> dict:
+    """
+    Reindexa todos os PDFs do GridFS em uma nova versão dos índices.
+
+    Args:
+        batch_size (int): PDFs extraídos em paralelo e enviados em cada bulk.
+        restart (bool): Abandona uma reindexação interrompida e começa outra versão.
+        fit_embeddings (bool): Ajusta o modelo de embeddings antes de começar.
+            Ignorado ao retomar uma execução, que continua com o modelo atual.
+
+    Returns:
+        dict: Registro da execução, com contadores e throughput.
+    """
+    es = ElasticsearchConnection().es
+    runs = MongoDBClient().db["reindex_runs"]
+
+    run = runs.find_one({"status": "running"})
+    if run and restart:
+        runs.update_one({"_id": run["_id"]}, {"$set": {"status": "abandoned"}})
+        run = None
+    if run:
+        logger.info("Retomando a reindexação v%s após %s", run["version"], run["last_id"])
+        if run.get("embedding_model") and os.path.exists(run["embedding_model"]):
+            Embedder().load(run["embedding_model"])
+    else:
+        version = _next_version(es)
+        embedding_model = None
+        if fit_embeddings:
+            # O modelo em uso continua valendo para os índices atuais até a troca.
+            embedding_model = f"{EMBEDDING_MODEL_PATH}.v{version}"
+            if not _fit_embeddings(es, embedding_model):
+                embedding_model = None
+        now = datetime.now()
+        run = {
+            "_id": ObjectId(),
+            "version": version,
+            "targets": _create_target_indices(es, version),
+            "embedding_model": embedding_model,
+            "status": "running",
+            "last_id": None,
+            "processed": 0,
+            "failed": 0,
+            "pages": 0,
+            "bytes": 0,
+            "elapsed": 0.0,
+            "errors": [],
+            "started_at": now,
+            "updated_at": now,
+        }
+        runs.insert_one(run)
+        logger.info("Reindexação v%s iniciada em %s", version, run["targets"])
+
+    try:
+        await _walk(runs, run, {}, batch_size, checkpoint=True)
+        _finish_target_indices(es, run["targets"])
+        ElasticsearchConnection().swap_aliases(run["targets"])
+        _publish_embeddings(run.get("embedding_model"))
+        SearchCache().invalidate()
+        # Uploads concluídos e arquivos alterados durante a carga foram
+        # gravados nos índices antigos; eles são reprocessados, agora já pelo
+        # alias novo, e as remoções do período são refeitas.
+        since = run["started_at"]
+        recent = {
+            "$or": [
+                {"uploadDate": {"$gte": since}},
+                {"metadata.modified_at": {"$gte": since}},
+            ]
+        }
+        await _walk(runs, run, recent, batch_size, checkpoint=False)
+        await _replay_deletes(since)
+    finally:
+        ExtractionService().shutdown()
+
+    runs.update_one(
+        {"_id": run["_id"]}, {"$set": {"status": "done", "finished_at": datetime.now()}}
+    )
+    run["status"] = "done"
+    logger.info("Reindexação v%s concluída: %s", run["version"], _throughput(run))
+    return run
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--batch-size", type=int, default=BULK_BATCH_SIZE)
+    parser.add_argument(
+        "--restart",
+        action="store_true",
+        help="abandona uma reindexação interrompida e começa uma nova versão",
+    )
+    parser.add_argument(
+        "--fit-embeddings",
+        action="store_true",
+        help="ajusta o modelo de embeddings nos trechos indexados antes de reindexar",
+    )
+    args = parser.parse_args()
+    result = asyncio.run(reindex(args.batch_size, args.restart, args.fit_embeddings))
+    print(f"Aliases: {result['targets']}")
+    print(_throughput(result))
@@ -0,0 +1,231 @@
+"""Módulo para o spool em streaming de uploads de PDF"""
+
+import hashlib
+import mmap
+import os
+import tarfile
+import tempfile
+import zipfile
+from contextlib import contextmanager
+from typing import BinaryIO, Iterator
+
+import pymupdf
+from bson.objectid import ObjectId
+from fastapi import UploadFile
+from gridfs import GridFS
+
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", str(1024 * 1024)))
+UPLOAD_SPOOL_DIR = os.getenv("UPLOAD_SPOOL_DIR") or tempfile.gettempdir()
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(200 * 1024 * 1024)))
+
+
+class UploadTooLarge(ValueError):
+    """O arquivo enviado excede os limites de ingestão (tamanho ou páginas)."""
+
+
+@contextmanager
+def open_pdf(path: str) -> Iterator[pymupdf.Document]:
+    """
+    Abre um PDF no PyMuPDF a partir de um mmap do arquivo.
+
+    As páginas são lidas sob demanda do page cache do sistema, então o
+    PDF nunca é copiado inteiro para a memória do processo.
+
+    Args:
+        path (str): Caminho do arquivo PDF.
+    """
+    with open(path, "rb") as pdf, mmap.mmap(
+        pdf.fileno(), 0, access=mmap.ACCESS_READ
+    ) as mapped:
+        view = memoryview(mapped)
+        try:
+            doc = pymupdf.open(stream=view, filetype="pdf")
+        except Exception:
+            view.release()
+            raise
+        try:
+            yield doc
+        finally:
+            doc.close()
+            view.release()
+
+
+class SpooledUpload:
+    """
+    Upload copiado para um arquivo de spool local.
+
+    Atributos:
+        path: Caminho do arquivo de spool (único por upload).
+        sha256: Hash SHA-256 do conteúdo.
+        length: Tamanho do arquivo em bytes.
+    """
+
+    def __init__(self, path: str, sha256: str, length: int):
+        self.path = path
+        self.sha256 = sha256
+        self.length = length
+
+    def cleanup(self) -> None:
+        """Remove o arquivo de spool local."""
+        remove_spool(self.path)
+
+
+def remove_spool(path: str) -> None:
+    """Remove um arquivo de spool, ignorando se ele já não existir."""
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+async def spool_upload(upload: UploadFile) -> SpooledUpload:
+    """
+    Copia o upload para o diretório de spool em blocos, calculando o hash.
+
+    O pico de memória fica limitado ao tamanho do bloco, independente do
+    tamanho do PDF, e cada upload recebe um arquivo com nome único.
+
+    Args:
+        upload (UploadFile): Arquivo recebido na requisição.
+
+    Returns:
+        SpooledUpload: Referência ao arquivo de spool.
+
+    Raises:
+        UploadTooLarge: Se o arquivo exceder `MAX_UPLOAD_BYTES`; a cópia é
+            interrompida assim que o limite é ultrapassado.
+    """
+    writer = _SpoolWriter()
+    try:
+        while chunk := await upload.read(UPLOAD_CHUNK_SIZE):
+            writer.write(chunk)
+    except BaseException:
+        writer.discard()
+        raise
+    return writer.finish()
+
+
+def spool_fileobj(fileobj: BinaryIO) -> SpooledUpload:
+    """
+    Versão síncrona de `spool_upload` para arquivos já abertos.
+
+    Args:
+        fileobj (BinaryIO): Arquivo aberto em modo binário (ex.: membro de um zip).
+
+    Returns:
+        SpooledUpload: Referência ao arquivo de spool.
+    """
+    writer = _SpoolWriter()
+    try:
+        while chunk := fileobj.read(UPLOAD_CHUNK_SIZE):
+            writer.write(chunk)
+    except BaseException:
+        writer.discard()
+        raise
+    return writer.finish()
+
+
+class _SpoolWriter:
+    """Grava blocos em um arquivo de spool único, calculando o hash."""
+
+    def __init__(self) -> None:
+        os.makedirs(UPLOAD_SPOOL_DIR, exist_ok=True)
+        fd, self.path = tempfile.mkstemp(suffix=".pdf", dir=UPLOAD_SPOOL_DIR)
+        self._file = os.fdopen(fd, "wb")
+        self._digest = hashlib.sha256()
+        self._length = 0
+
+    def write(self, chunk: bytes) -> None:
+        if self._length + len(chunk) > MAX_UPLOAD_BYTES:
+            raise UploadTooLarge(
+                f"Arquivo excede o limite de {MAX_UPLOAD_BYTES // (1024 * 1024)} MB"
+            )
+        self._digest.update(chunk)
+        self._file.write(chunk)
+        self._length += len(chunk)
+
+    def finish(self) -> SpooledUpload:
+        self._file.close()
+        return SpooledUpload(self.path, self._digest.hexdigest(), self._length)
+
+    def discard(self) -> None:
+        self._file.close()
+        remove_spool(self.path)
+
+
+def store_spool(
+    path: str, fs: GridFS, filename: str, metadata: dict, file_id: ObjectId | None = None
+) -> ObjectId:
+    """
+    Grava o arquivo de spool no GridFS, bloco a bloco.
+
+    Args:
+        path (str): Caminho do arquivo de spool.
+        fs (GridFS): Instância do GridFS de destino.
+        filename (str): Nome do arquivo.
+        metadata (dict): Metadados a serem gravados junto ao arquivo.
+        file_id (ObjectId | None): ID a ser usado no GridFS; gerado se omitido.
+
+    Returns:
+        ObjectId: ID do arquivo no GridFS.
+    """
+    grid_in = fs.new_file(_id=file_id or ObjectId(), filename=filename, metadata=metadata)
+    try:
+        with open(path, "rb") as spool:
+            while chunk := spool.read(UPLOAD_CHUNK_SIZE):
+                grid_in.write(chunk)
+        grid_in.close()
+    except BaseException:
+        grid_in.abort()
+        raise
+    return grid_in._id
+
+
+def spool_archive(fileobj: BinaryIO) -> list[tuple[str, SpooledUpload]]:
+    """
+    Copia os PDFs de um arquivo zip ou tar para o spool.
+
+    Os membros são lidos em blocos, sem extrair o pacote em disco, e apenas
+    arquivos `.pdf` são considerados.
+
+    Args:
+        fileobj (BinaryIO): Arquivo zip ou tar (compactado ou não) aberto em modo binário.
+
+    Returns:
+        list[tuple[str, SpooledUpload]]: Nome e spool de cada PDF do pacote.
+
+    Raises:
+        ValueError: Se o arquivo não for um zip ou tar válido.
+        UploadTooLarge: Se algum PDF do pacote exceder `MAX_UPLOAD_BYTES`.
+    """
+    spooled = []
+    try:
+        if zipfile.is_zipfile(fileobj):
+            fileobj.seek(0)
+            with zipfile.ZipFile(fileobj) as archive:
+                for member in archive.infolist():
+                    name = os.path.basename(member.filename)
+                    if member.is_dir() or not name.lower().endswith(".pdf"):
+                        continue
+                    with archive.open(member) as source:
+                        spooled.append((name, spool_fileobj(source)))
+            return spooled
+
+        fileobj.seek(0)
+        try:
+            archive = tarfile.open(fileobj=fileobj, mode="r:*")
+        except tarfile.TarError as e:
+            raise ValueError("Arquivo não é um zip ou tar válido") from e
+        with archive:
+            for member in archive:
+                name = os.path.basename(member.name)
+                if not member.isfile() or not name.lower().endswith(".pdf"):
+                    continue
+                source = archive.extractfile(member)
+                if source is not None:
+                    spooled.append((name, spool_fileobj(source)))
+        return spooled
+    except BaseException:
+        for _, upload in spooled:
+            upload.cleanup()
+        raise
@@ -2,12 +2,18 @@
 
 import os
 
-from gridfs import GridFS
-from pymongo import MongoClient
+from gridfs import AsyncGridFSBucket, GridFS
+from pymongo import AsyncMongoClient, MongoClient
+from pymongo.asynchronous.database import AsyncDatabase
 from pymongo.database import Database
 
+from src.mongo.markdown import MarkdownStore
+
 MONGO_URI = os.getenv("MONGO_URI") or "mongodb://localhost:27017"
 DB_NAME = os.getenv("DB_NAME") or "healthcom"
+# Por quanto tempo, em segundos, as remoções ficam registradas para a
+# reindexação (ver `deleted_files`); deve cobrir a duração de uma reindexação.
+DELETED_FILES_TTL = int(os.getenv("DELETED_FILES_TTL", str(30 * 24 * 3600)))
 
 
 class MongoDBClient:
@@ -18,6 +24,9 @@ class MongoDBClient:
         _client: Instância do cliente MongoDB.
         db: Banco de dados padrão.
         fs: Instância do GridFS.
+        markdown: Armazenamento comprimido do markdown dos documentos.
+        adb: Banco de dados padrão no cliente assíncrono (após `connect_async`).
+        afs: Bucket GridFS assíncrono (após `connect_async`).
     """
     _instance = None
     _initialized = False
@@ -31,6 +40,18 @@ class MongoDBClient:
         self._client: MongoClient = MongoClient(MONGO_URI)
         self.db: Database = self._client[DB_NAME]
         self.fs: GridFS = GridFS(self.db)
+        self.markdown: MarkdownStore = MarkdownStore(self.db)
+        # Permite localizar uploads repetidos pelo hash do conteúdo.
+        self.db["fs.files"].create_index("metadata.sha256")
+        # Alterações e remoções feitas durante uma reindexação são reaplicadas
+        # nos novos índices depois da troca dos aliases.
+        self.db["fs.files"].create_index("metadata.modified_at", sparse=True)
+        self.db["deleted_files"].create_index("deleted_at", expireAfterSeconds=DELETED_FILES_TTL)
+        # Versão mais recente do markdown de cada documento.
+        self.db["markdown.files"].create_index([("document_id", 1), ("uploadDate", -1)])
+        self._async_client: AsyncMongoClient | None = None
+        self.adb: AsyncDatabase | None = None
+        self.afs: AsyncGridFSBucket | None = None
         self._initialized = True
 
     def __new__(cls) -> "MongoDBClient":
@@ -40,3 +61,26 @@ class MongoDBClient:
         if cls._instance is None:
             cls._instance = super(MongoDBClient, cls).__new__(cls)
         return cls._instance
+
+    async def connect_async(self) -> None:
+        """
+        Cria o cliente assíncrono usado pelas rotas da API.
+
+        Deve ser chamado dentro do event loop que atende as requisições
+        (no lifespan da aplicação), já que o cliente fica ligado a ele.
+        """
+        if self._async_client is not None:
+            return
+        self._async_client = AsyncMongoClient(MONGO_URI)
+        self.adb = self._async_client[DB_NAME]
+        self.afs = AsyncGridFSBucket(self.adb)
+        self.markdown.connect_async(self.adb)
+
+    async def close_async(self) -> None:
+        """Fecha o cliente assíncrono."""
+        if self._async_client is None:
+            return
+        await self._async_client.close()
+        self._async_client = None
+        self.adb = None
+        self.afs = None
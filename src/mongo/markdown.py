@@ -0,0 +1,189 @@
+"""Módulo do armazenamento comprimido do markdown dos documentos"""
+
+import os
+import zlib
+
+from bson.objectid import ObjectId
+from gridfs import AsyncGridFSBucket, GridFS, GridOut
+from gridfs.asynchronous.grid_file import AsyncGridOut
+from pymongo.asynchronous.database import AsyncDatabase
+from pymongo.database import Database
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+MARKDOWN_COMPRESSION_LEVEL = int(os.getenv("MARKDOWN_COMPRESSION_LEVEL", "6"))
+MARKDOWN_BLOCK_SIZE = 1024 * 1024
+# Versão mais recente primeiro; o ID desempata gravações no mesmo milissegundo.
+LATEST_FIRST = [("uploadDate", -1), ("_id", -1)]
+
+# zstd comprime mais rápido e melhor; zlib é o padrão sem dependências extras.
+MARKDOWN_CODEC = "zstd" if zstandard else "zlib"
+
+
+def compress(data: bytes, codec: str = MARKDOWN_CODEC) -> bytes:
+    """Comprime os bytes com o codec informado."""
+    if codec == "zstd":
+        return zstandard.ZstdCompressor(level=MARKDOWN_COMPRESSION_LEVEL).compress(data)
+    return zlib.compress(data, MARKDOWN_COMPRESSION_LEVEL)
+
+
+def compressor(codec: str = MARKDOWN_CODEC, size: int = -1):
+    """
+    Compressor incremental (`compress` e `flush`) com o codec informado.
+
+    O tamanho original vai no cabeçalho do frame zstd, para que `decompress`
+    consiga descomprimi-lo de uma vez.
+    """
+    if codec == "zstd":
+        return zstandard.ZstdCompressor(level=MARKDOWN_COMPRESSION_LEVEL).compressobj(size=size)
+    return zlib.compressobj(MARKDOWN_COMPRESSION_LEVEL)
+
+
+def decompress(data: bytes, codec: str) -> bytes:
+    """Descomprime os bytes gravados com o codec informado."""
+    if codec == "zstd":
+        if zstandard is None:
+            raise RuntimeError("Markdown comprimido com zstd, mas o pacote zstandard não está instalado")
+        return zstandard.ZstdDecompressor().decompress(data)
+    return zlib.decompress(data)
+
+
+class MarkdownStore:
+    """
+    Classe para guardar o markdown completo dos documentos fora do Elasticsearch.
+
+    O markdown é gravado comprimido em um bucket GridFS próprio (`markdown`),
+    com o ID do PDF em `document_id`, e o índice de documentos mantém apenas o conteúdo
+    indexado, sem cópia no `_source`.
+
+    Atributos:
+        fs: Bucket GridFS do markdown.
+        afs: Mesmo bucket no cliente assíncrono, usado pelas rotas da API.
+    """
+
+    def __init__(self, db: Database):
+        self.fs = GridFS(db, collection="markdown")
+        self.afs: AsyncGridFSBucket | None = None
+
+    def connect_async(self, db: AsyncDatabase) -> None:
+        """Liga o armazenamento ao banco do cliente assíncrono."""
+        self.afs = AsyncGridFSBucket(db, bucket_name="markdown")
+
+    @staticmethod
+    def _versions(file_id: ObjectId) -> dict:
+        """
+        Filtro das versões gravadas do markdown de um documento; as gravadas
+        antes do versionamento usam o próprio ID do PDF.
+        """
+        return {"$or": [{"document_id": file_id}, {"_id": file_id}]}
+
+    def _replace(self, file_id: ObjectId, version: ObjectId) -> None:
+        """Remove as versões anteriores a `version`, já gravada por inteiro."""
+        for old in self.fs.find({**self._versions(file_id), "_id": {"$ne": version}}):
+            self.fs.delete(old._id)
+
+    def put(self, file_id: ObjectId, filename: str, content: str) -> None:
+        """
+        Grava (ou substitui) o markdown de um documento.
+
+        A nova versão é gravada com outro ID antes de a anterior ser
+        removida, então as leituras nunca encontram o documento sem markdown.
+
+        Args:
+            file_id (ObjectId): ID do PDF no GridFS.
+            filename (str): Nome do arquivo.
+            content (str): Markdown extraído.
+        """
+        data = content.encode("utf-8")
+        version = self.fs.put(
+            compress(data),
+            document_id=file_id,
+            filename=filename,
+            codec=MARKDOWN_CODEC,
+            length_uncompressed=len(data),
+        )
+        self._replace(file_id, version)
+
+    def put_file(self, file_id: ObjectId, filename: str, path: str) -> None:
+        """
+        Grava (ou substitui) o markdown de um documento a partir de um arquivo,
+        comprimido em blocos, sem carregá-lo inteiro na memória. A versão
+        anterior é removida só depois, como em `put`.
+
+        Args:
+            file_id (ObjectId): ID do PDF no GridFS.
+            filename (str): Nome do arquivo.
+            path (str): Caminho do markdown (UTF-8).
+        """
+        length = os.path.getsize(path)
+        grid_in = self.fs.new_file(
+            document_id=file_id,
+            filename=filename,
+            codec=MARKDOWN_CODEC,
+            length_uncompressed=length,
+        )
+        try:
+            stream = compressor(MARKDOWN_CODEC, length)
+            with open(path, "rb") as markdown:
+                while block := markdown.read(MARKDOWN_BLOCK_SIZE):
+                    grid_in.write(stream.compress(block))
+            grid_in.write(stream.flush())
+        except BaseException:
+            grid_in.abort()
+            raise
+        grid_in.close()
+        self._replace(file_id, grid_in._id)
+
+    def _latest(self, file_id: ObjectId) -> GridOut | None:
+        return self.fs.find_one(self._versions(file_id), sort=LATEST_FIRST)
+
+    async def _alatest(self, file_id: ObjectId) -> AsyncGridOut | None:
+        cursor = self.afs.find(self._versions(file_id)).sort(LATEST_FIRST).limit(1)
+        async for grid_out in cursor:
+            return grid_out
+        return None
+
+    def get(self, file_id: ObjectId) -> tuple[str, str] | None:
+        """
+        Lê a versão mais recente do markdown de um documento.
+
+        Args:
+            file_id (ObjectId): ID do PDF no GridFS.
+
+        Returns:
+            tuple[str, str] | None: Nome do arquivo e markdown, ou None se não houver.
+        """
+        grid_out = self._latest(file_id)
+        if grid_out is None:
+            return None
+        content = decompress(grid_out.read(), grid_out.codec).decode("utf-8")
+        return grid_out.filename, content
+
+    async def aget(self, file_id: ObjectId) -> tuple[str, str] | None:
+        """Versão assíncrona de `get`."""
+        grid_out = await self._alatest(file_id)
+        if grid_out is None:
+            return None
+        content = decompress(await grid_out.read(), grid_out.codec).decode("utf-8")
+        return grid_out.filename, content
+
+    async def aversion(self, file_id: ObjectId) -> str | None:
+        """
+        Versão do markdown gravado (data de gravação e tamanho), lida só dos
+        metadados do GridFS, sem os blocos; muda a cada `put`.
+
+        Returns:
+            str | None: Versão, ou None se não houver markdown.
+        """
+        grid_out = await self._alatest(file_id)
+        if grid_out is None:
+            return None
+        return f"{grid_out.upload_date:%Y%m%d%H%M%S%f}-{grid_out.length}"
+
+    def delete(self, file_id: ObjectId) -> None:
+        """Remove todas as versões do markdown de um documento, se existirem."""
+        for version in self.fs.find(self._versions(file_id)):
+            self.fs.delete(version._id)
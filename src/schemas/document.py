@@ -0,0 +1,30 @@
+"""Módulo para definição dos Schemas de busca de documentos"""
+
+from typing import Literal, Optional
+
+from pydantic import BaseModel, Field
+
+
+class MultiSearchSchema(BaseModel):
+    """Classe para definição do Schema de busca com várias consultas"""
+
+    queries: list[str] = Field(
+        ...,
+        min_length=1,
+        max_length=10,
+        description="Consultas executadas juntas, com os mesmos filtros",
+        examples=[["higienização das mãos", "lavagem das mãos antes do procedimento"]],
+    )
+    category: Optional[str] = Field(
+        None, description="Categoria dos documentos", examples=["enfermagem"]
+    )
+    access_level: int = Field(
+        0, description="Nível de acesso do usuário", examples=[1, 2, 3, 4, 5, 6, 999]
+    )
+    size: int = Field(5, ge=1, le=50, description="Resultados por consulta")
+    target: Literal["passages", "documents"] = Field(
+        "passages", description="Buscar trechos ou documentos inteiros"
+    )
+    fuse: bool = Field(
+        True, description="Inclui o ranking combinado das consultas (reciprocal rank fusion)"
+    )
@@ -0,0 +1,233 @@
+"""Módulo da interface dos mecanismos de busca"""
+
+import os
+from abc import ABC, abstractmethod
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Iterable
+
+# `elasticsearch` (padrão) ou `embedded`, o índice invertido em processo.
+SEARCH_BACKEND = os.getenv("SEARCH_BACKEND", "elasticsearch")
+
+# Ordenações aceitas na listagem e campos dos documentos listados.
+LIST_SORTS = ("data_upload", "filename", "access_level", "page_count")
+LIST_FIELDS = (
+    "filename", "category", "access_level", "uploaded_by", "data_upload", "page_count",
+)
+# Campos agregados nas facetas e intervalos do histograma de datas de upload.
+FACET_TERMS = ("category", "uploaded_by")
+FACET_INTERVALS = ("day", "week", "month", "year")
+
+
+def merge_upload_source(source: dict, params: dict) -> None:
+    """
+    Acrescenta a categoria e o autor de um novo upload ao `_source` de um
+    documento ou trecho, mantendo o menor nível de acesso.
+    """
+    for field in ("category", "uploaded_by"):
+        current = source.get(field)
+        if not isinstance(current, list):
+            current = [] if current is None else [current]
+        if params[field] not in current:
+            current.append(params[field])
+        source[field] = current
+    if source.get("access_level") is None or params["access_level"] < source["access_level"]:
+        source["access_level"] = params["access_level"]
+
+
+class SearchError(Exception):
+    """Falha de uma busca dentro de um lote."""
+
+
+class InvalidCursor(ValueError):
+    """Cursor de listagem malformado."""
+
+
+class CursorExpired(Exception):
+    """Cursor de listagem que não pode mais ser continuado."""
+
+
+class SearchRequest:
+    """
+    Uma busca no índice de documentos ou no de trechos.
+
+    Os resultados seguem o formato dos hits do Elasticsearch (`_id`,
+    `_score`, `_source` e, no índice de documentos, `sort`), que é o que as
+    rotas formatam.
+
+    Atributos:
+        index: Índice (`DOC_INDEX` ou `CHUNK_INDEX`).
+        size: Número máximo de resultados.
+        category: Categoria exigida, se houver.
+        access_level: Nível de acesso máximo dos resultados.
+        text: Consulta textual (BM25) no conteúdo.
+        vector: Embedding da consulta para busca por similaridade (só trechos).
+        fields: Campos do `_source` retornados; por padrão, todos menos o
+            conteúdo dos documentos e os vetores.
+        search_after: Cursor `[score, file_id]` da página anterior (só documentos).
+    """
+
+    def __init__(
+        self,
+        index: str,
+        size: int,
+        category: str | None = None,
+        access_level: int = 0,
+        text: str | None = None,
+        vector: list[float] | None = None,
+        fields: list[str] | None = None,
+        search_after: list | None = None,
+    ):
+        self.index = index
+        self.size = size
+        self.category = category
+        self.access_level = access_level
+        self.text = text
+        self.vector = vector
+        self.fields = fields
+        self.search_after = search_after
+
+
+class SearchBackend(ABC):
+    """
+    Interface dos mecanismos de busca usados pela API e pela ingestão.
+
+    As escritas são síncronas (a ingestão as executa em threads) e as
+    leituras assíncronas, chamadas pelas rotas.
+    """
+
+    async def connect(self) -> None:
+        """Prepara os recursos usados pelas rotas, no lifespan da API."""
+
+    async def close(self) -> None:
+        """Libera os recursos abertos em `connect`."""
+
+    @abstractmethod
+    def bulk(self, actions: Iterable[dict], raise_on_error: bool = True) -> list[tuple[bool, dict]]:
+        """
+        Indexa ações no formato da bulk API (`_index`, `_id` e `_source`);
+        ações com `"_op_type": "delete"` removem o `_id` indicado.
+
+        Args:
+            actions (Iterable[dict]): Ações de indexação.
+            raise_on_error (bool): Lança exceção na primeira falha em vez de
+                devolvê-la no resultado.
+
+        Returns:
+            list[tuple[bool, dict]]: Sucesso e detalhes (`{"index": {"_index", "_id", "error"}}`)
+            de cada ação, como no `parallel_bulk`.
+        """
+
+    @abstractmethod
+    def merge_upload(self, file_id: str, params: dict) -> bool:
+        """
+        Acrescenta a categoria e o autor de um novo upload ao documento e aos
+        seus trechos, mantendo o menor nível de acesso.
+
+        Returns:
+            bool: False se o documento não estiver indexado.
+        """
+
+    @abstractmethod
+    def delete_document(self, file_id: str) -> None:
+        """Remove um documento e seus trechos."""
+
+    @asynccontextmanager
+    async def bulk_load(self) -> AsyncIterator[None]:
+        """Ajusta o índice para uma carga em massa durante o bloco (`async with`)."""
+        yield
+
+    @abstractmethod
+    async def search(self, requests: list[SearchRequest]) -> list[dict | SearchError]:
+        """
+        Executa um lote de buscas de uma vez.
+
+        Returns:
+            list[dict | SearchError]: Para cada busca, `{"hits": [...], "total": int}`
+            ou o erro daquela busca.
+        """
+
+    async def search_one(self, request: SearchRequest) -> dict:
+        """Executa uma busca, lançando o erro se ela falhar."""
+        result = (await self.search([request]))[0]
+        if isinstance(result, SearchError):
+            raise result
+        return result
+
+    @abstractmethod
+    async def snippets(self, text: str, doc_ids: list[str]) -> dict[str, list[str]]:
+        """Trechos destacados (`<em>`) do trecho mais relevante de cada documento."""
+
+    @abstractmethod
+    async def list_documents(
+        self,
+        category: str | None,
+        access_level: int,
+        sort: str,
+        order: str,
+        size: int,
+        cursor: str | None = None,
+    ) -> tuple[list[dict], int, str | None]:
+        """
+        Lista uma página dos metadados dos documentos.
+
+        Raises:
+            InvalidCursor: Se o cursor estiver malformado.
+            CursorExpired: Se o cursor não puder mais ser continuado.
+
+        Returns:
+            tuple[list[dict], int, str | None]: Hits da página, total de
+            documentos e cursor da próxima página (None na última).
+        """
+
+    @abstractmethod
+    async def facets(
+        self, category: str | None, access_level: int, interval: str, size: int
+    ) -> dict:
+        """
+        Conta os documentos acessíveis por categoria, autor e data de upload,
+        sem retornar os documentos.
+
+        Args:
+            category (str | None): Categoria exigida, se houver.
+            access_level (int): Nível de acesso máximo dos documentos.
+            interval (str): Intervalo do histograma (ver `FACET_INTERVALS`).
+            size (int): Número máximo de valores por campo de `FACET_TERMS`.
+
+        Returns:
+            dict: `total` de documentos e, para cada campo, a lista de
+            `{"value", "count"}`; os termos vêm dos mais frequentes para os
+            menos, e as datas (início de cada intervalo, `AAAA-MM-DD`) em
+            ordem crescente.
+        """
+
+    @abstractmethod
+    async def suggest(
+        self, prefix: str, category: str | None, access_level: int, size: int
+    ) -> list[dict]:
+        """
+        Sugestões de documentos enquanto o usuário digita: cada palavra do
+        prefixo precisa iniciar uma palavra do nome do arquivo ou dos
+        títulos principais (`headings`) do documento.
+
+        Returns:
+            list[dict]: `id` e `filename` de cada documento e o título que
+            casou com o prefixo (`heading`), ou None se foi o nome do arquivo.
+        """
+
+    async def close_cursor(self, cursor: str) -> None:
+        """Libera um cursor de listagem abandonado antes da última página."""
+
+    @abstractmethod
+    async def get_source(self, index: str, doc_id: str) -> dict | None:
+        """`_source` armazenado de um documento, ou None se não existir."""
+
+
+def get_search_backend() -> SearchBackend:
+    """Retorna o mecanismo de busca configurado em `SEARCH_BACKEND`."""
+    if SEARCH_BACKEND == "embedded":
+        from src.search.embedded import EmbeddedBackend
+
+        return EmbeddedBackend()
+    from src.search.es_backend import ElasticBackend
+
+    return ElasticBackend()
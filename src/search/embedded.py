@@ -0,0 +1,956 @@
+"""Módulo do mecanismo de busca embutido, um índice invertido em processo.
+
+Pensado para testes, desenvolvimento e instalações pequenas, sem
+Elasticsearch: cada coleção (documentos e trechos) é um conjunto de arrays
+NumPy gravados em disco e abertos com mmap, então a API sobe em
+milissegundos e as buscas em corpora pequenos levam frações de
+milissegundo.
+
+Cada coleção é uma lista de segmentos imutáveis. Em cada segmento as
+postings ficam em três arrays paralelos ordenados pelo hash de 64 bits do
+termo (`terms`, `docs`, `freqs`); um termo é localizado por busca binária,
+sem dicionário carregado em memória. Valores de campos keyword (categoria,
+documento pai) entram nos mesmos arrays com frequência 0 e servem só aos
+filtros. Cada escrita grava só um segmento com os registros novos e marca
+os removidos, e os segmentos pequenos são fundidos aos poucos, como no
+Lucene. A lista de segmentos vai para uma nova geração do diretório,
+trocada de forma atômica; as buscas em andamento continuam no estado
+anterior.
+
+Apenas um processo deve escrever no índice.
+"""
+
+import base64
+import functools
+import hashlib
+import json
+import mmap
+import os
+import re
+import shutil
+import threading
+import unicodedata
+from collections import Counter
+from datetime import date, timedelta
+from typing import Callable, Iterable
+
+import numpy as np
+
+from src.elastic.client import CHUNK_INDEX, DOC_INDEX
+from src.ingest.embedding import EMBEDDING_DIMS
+from src.search.backend import (
+    FACET_TERMS,
+    LIST_FIELDS,
+    InvalidCursor,
+    SearchBackend,
+    SearchError,
+    SearchRequest,
+    merge_upload_source,
+)
+
+EMBEDDED_INDEX_DIR = os.getenv("EMBEDDED_INDEX_DIR", os.path.join("data", "search"))
+
+# Parâmetros padrão do BM25 no Elasticsearch.
+BM25_K1 = 1.2
+BM25_B = 0.75
+# Os segmentos do fim são fundidos enquanto o anterior não tiver ao menos
+# esse múltiplo dos registros do seguinte.
+SEGMENT_MERGE_FACTOR = 2
+HIGHLIGHT_FRAGMENT_SIZE = 200
+HIGHLIGHT_FRAGMENTS = 3
+
+# Mesma lista do analisador `_portuguese_` do Elasticsearch.
+PORTUGUESE_STOPWORDS = frozenset("""
+a à ao aos aquela aquelas aquele aqueles aquilo as às até com como da das de dela
+delas dele deles depois do dos e é ela elas ele eles em entre era eram éramos essa
+essas esse esses esta está estamos estão estas estava estavam estávamos este esteja
+estejam estejamos estes esteve estive estivemos estiver estivera estiveram
+estivéramos estiverem estivermos estivesse estivessem estivéssemos estou eu foi
+fomos for fora foram fôramos forem formos fosse fossem fôssemos fui há haja hajam
+hajamos hão havemos hei houve houvemos houver houvera houverá houveram houvéramos
+houverão houverei houverem houveremos houveria houveriam houveríamos houvermos
+houvesse houvessem houvéssemos isso isto já lhe lhes mais mas me mesmo meu meus
+minha minhas muito na não nas nem no nos nós nossa nossas nosso nossos num numa o
+os ou para pela pelas pelo pelos por qual quando que quem são se seja sejam sejamos
+sem ser será serão serei seremos seria seriam seríamos seu seus só somos sou sua
+suas também te tem tém temos tenha tenham tenhamos tenho terá terão terei teremos
+teria teriam teríamos teu teus teve tinha tinham tínhamos tive tivemos tiver tivera
+tiveram tivéramos tiverem tivermos tivesse tivessem tivéssemos tu tua tuas um uma
+você vocês vos
+""".split())
+
+TOKEN_PATTERN = re.compile(r"\w+")
+
+
+def analyze(text: str) -> list[str]:
+    """Quebra o texto em termos minúsculos, sem as stopwords."""
+    return [
+        token for token in TOKEN_PATTERN.findall(text.lower())
+        if token not in PORTUGUESE_STOPWORDS
+    ]
+
+
+@functools.lru_cache(maxsize=1 << 18)
+def _term_hash(term: str) -> int:
+    return int.from_bytes(hashlib.blake2b(term.encode(), digest_size=8).digest(), "little")
+
+
+def _keyword_hash(field: str, value) -> int:
+    return _term_hash(f"\x1f{field}\x1f{value}")
+
+
+def _values(value) -> list:
+    if value is None:
+        return []
+    return value if isinstance(value, list) else [value]
+
+
+def _concatenate(arrays: list[np.ndarray], empty: np.ndarray) -> np.ndarray:
+    return np.concatenate(arrays) if arrays else empty
+
+
+class Segment:
+    """
+    Lote imutável de registros de uma coleção.
+
+    Atributos:
+        name: Diretório do segmento, ou None se ainda não foi gravado.
+        ids: ID de cada registro, na ordem dos ordinais do segmento.
+        lengths: Número de termos do texto de cada registro.
+        access: Nível de acesso de cada registro.
+        terms: Hash do termo de cada posting, em ordem crescente.
+        docs: Ordinal do registro de cada posting.
+        freqs: Frequência do termo no registro (0 nos campos keyword).
+        offsets: Limites do `_source` de cada registro em `blob`.
+        blob: `_source` dos registros em JSON, concatenados.
+        vectors: Embeddings dos registros, se a coleção tiver.
+    """
+
+    def __init__(self, name, ids, lengths, access, terms, docs, freqs, offsets, blob, vectors=None):
+        self.name = name
+        self.ids = ids
+        self.lengths = lengths
+        self.access = access
+        self.terms = terms
+        self.docs = docs
+        self.freqs = freqs
+        self.offsets = offsets
+        self.blob = blob
+        self.vectors = vectors
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @functools.cached_property
+    def positions(self) -> dict[str, int]:
+        return {doc_id: position for position, doc_id in enumerate(self.ids)}
+
+    @functools.cached_property
+    def id_array(self) -> np.ndarray:
+        return np.array(self.ids, dtype=str)
+
+    def source(self, position: int) -> dict:
+        return json.loads(bytes(self.blob[self.offsets[position]:self.offsets[position + 1]]))
+
+    def postings(self, term_hash: int) -> tuple[np.ndarray, np.ndarray]:
+        term_hash = np.uint64(term_hash)
+        start = np.searchsorted(self.terms, term_hash, "left")
+        stop = np.searchsorted(self.terms, term_hash, "right")
+        return self.docs[start:stop], self.freqs[start:stop]
+
+    @functools.cached_property
+    def _by_record(self) -> tuple[np.ndarray, np.ndarray]:
+        """Postings de texto agrupadas por registro e o início das de cada registro."""
+        selected = np.flatnonzero(self.freqs > 0)
+        selected = selected[np.argsort(self.docs[selected], kind="stable")]
+        starts = np.searchsorted(self.docs[selected], np.arange(len(self) + 1), "left")
+        return selected, starts
+
+    def text_postings(self, position: int) -> tuple[np.ndarray, np.ndarray]:
+        """Hashes e frequências dos termos do texto de um registro."""
+        selected, starts = self._by_record
+        own = selected[starts[position]:starts[position + 1]]
+        return self.terms[own], self.freqs[own]
+
+
+class Snapshot:
+    """
+    Estado imutável de uma coleção, formado por segmentos.
+
+    Os ordinais dos registros seguem a ordem dos segmentos. Um registro
+    removido ou substituído só é marcado em `deleted` e continua ocupando o
+    ordinal, fora das buscas, até o seu segmento ser fundido. Os arrays da
+    coleção inteira são montados na primeira busca de cada estado.
+
+    Atributos:
+        segments: Segmentos, do mais antigo ao mais novo.
+        deleted: Ordinais removidos de cada segmento.
+        vector_dims: Dimensões dos embeddings, ou None se a coleção não tiver.
+        bases: Primeiro ordinal de cada segmento na coleção.
+        live_count: Número de registros não removidos.
+    """
+
+    def __init__(
+        self,
+        segments: list[Segment],
+        deleted: list[frozenset[int]],
+        vector_dims: int | None = None,
+    ):
+        self.segments = segments
+        self.deleted = deleted
+        self.vector_dims = vector_dims
+        self.bases = np.cumsum([0] + [len(segment) for segment in segments])
+        self.live_count = len(self) - sum(len(removed) for removed in deleted)
+
+    def __len__(self) -> int:
+        return int(self.bases[-1])
+
+    def locate(self, position: int) -> tuple[int, int]:
+        """Segmento de um ordinal da coleção e o ordinal dentro dele."""
+        index = int(np.searchsorted(self.bases, position, "right")) - 1
+        return index, position - int(self.bases[index])
+
+    def find(self, doc_id: str) -> int | None:
+        """Ordinal do registro com o ID, ou None se ele não existir."""
+        for index in reversed(range(len(self.segments))):
+            position = self.segments[index].positions.get(doc_id)
+            if position is not None and position not in self.deleted[index]:
+                return int(self.bases[index]) + position
+        return None
+
+    @functools.cached_property
+    def _removed(self) -> list[np.ndarray]:
+        return [np.array(sorted(removed), dtype=np.int64) for removed in self.deleted]
+
+    @functools.cached_property
+    def live(self) -> np.ndarray:
+        live = np.ones(len(self), dtype=bool)
+        for base, removed in zip(self.bases, self._removed):
+            live[removed + base] = False
+        return live
+
+    @functools.cached_property
+    def ids(self) -> list[str]:
+        return [doc_id for segment in self.segments for doc_id in segment.ids]
+
+    @functools.cached_property
+    def id_array(self) -> np.ndarray:
+        return _concatenate([segment.id_array for segment in self.segments], np.array([], dtype=str))
+
+    @functools.cached_property
+    def lengths(self) -> np.ndarray:
+        return _concatenate([segment.lengths for segment in self.segments], np.zeros(0, dtype=np.int32))
+
+    @functools.cached_property
+    def access(self) -> np.ndarray:
+        return _concatenate([segment.access for segment in self.segments], np.zeros(0, dtype=np.int32))
+
+    @functools.cached_property
+    def vectors(self) -> np.ndarray | None:
+        if self.vector_dims is None:
+            return None
+        return _concatenate(
+            [segment.vectors for segment in self.segments],
+            np.zeros((0, self.vector_dims), dtype=np.float32),
+        )
+
+    @functools.cached_property
+    def avg_length(self) -> float:
+        return float(self.lengths[self.live].mean()) if self.live_count else 0.0
+
+    def source(self, position: int) -> dict:
+        index, position = self.locate(position)
+        return self.segments[index].source(position)
+
+    def postings(self, term_hash: int) -> tuple[np.ndarray, np.ndarray]:
+        """Postings do termo nos registros não removidos, com os ordinais da coleção."""
+        docs, freqs = [np.zeros(0, dtype=np.int64)], [np.zeros(0, dtype=np.int32)]
+        for segment, removed, base in zip(self.segments, self._removed, self.bases):
+            segment_docs, segment_freqs = segment.postings(term_hash)
+            if removed.size and segment_docs.size:
+                live = ~np.isin(segment_docs, removed)
+                segment_docs, segment_freqs = segment_docs[live], segment_freqs[live]
+            docs.append(segment_docs + base)
+            freqs.append(segment_freqs)
+        return np.concatenate(docs), np.concatenate(freqs)
+
+    def keyword_mask(self, field: str, values: Iterable) -> np.ndarray:
+        mask = np.zeros(len(self), dtype=bool)
+        for value in values:
+            mask[self.postings(_keyword_hash(field, value))[0]] = True
+        return mask
+
+    def filter_mask(self, category: str | None, access_level: int) -> np.ndarray:
+        mask = self.live & (self.access <= access_level)
+        if category:
+            mask &= self.keyword_mask("category", [category])
+        return mask
+
+    def bm25(self, text: str) -> tuple[np.ndarray, np.ndarray]:
+        """Scores BM25 de cada registro e se ele tem algum dos termos."""
+        scores = np.zeros(len(self), dtype=np.float64)
+        matched = np.zeros(len(self), dtype=bool)
+        avg_length = max(self.avg_length, 1.0)
+        for term in analyze(text):
+            docs, freqs = self.postings(_term_hash(term))
+            if not docs.size:
+                continue
+            idf = np.log(1 + (self.live_count - docs.size + 0.5) / (docs.size + 0.5))
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * self.lengths[docs] / avg_length)
+            scores[docs] += idf * freqs / (freqs + norm)
+            matched[docs] = True
+        return scores, matched
+
+
+class _Rows:
+    """Registros novos ou alterados, acumulados para entrar em um novo estado."""
+
+    def __init__(self):
+        self.ids: list[str] = []
+        self.sources: list[bytes] = []
+        self.lengths: list[int] = []
+        self.access: list[int] = []
+        self.vectors: list[np.ndarray] = []
+        self.terms: list[int] = []
+        self.docs: list[int] = []
+        self.freqs: list[int] = []
+
+    def add(self, doc_id, source, keywords, content_postings, length, vector) -> None:
+        row = len(self.ids)
+        self.ids.append(doc_id)
+        self.sources.append(json.dumps(source, ensure_ascii=False, default=str).encode("utf-8"))
+        self.lengths.append(length)
+        self.access.append(source.get("access_level") or 0)
+        self.vectors.append(vector)
+        for term_hash, freq in content_postings:
+            self.terms.append(term_hash)
+            self.docs.append(row)
+            self.freqs.append(freq)
+        for field in keywords:
+            for value in _values(source.get(field)):
+                self.terms.append(_keyword_hash(field, value))
+                self.docs.append(row)
+                self.freqs.append(0)
+
+
+class InvertedIndex:
+    """
+    Classe de uma coleção do mecanismo embutido.
+
+    Atributos:
+        directory: Diretório das gerações gravadas.
+        keywords: Campos keyword indexados para filtros.
+        store_text: Se o texto indexado fica também no `_source`.
+        vector_dims: Dimensões dos embeddings, ou None se a coleção não tiver.
+        snapshot: Estado atual.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        keywords: tuple[str, ...],
+        store_text: bool,
+        vector_dims: int | None = None,
+    ):
+        self.directory = directory
+        self.keywords = keywords
+        self.store_text = store_text
+        self.vector_dims = vector_dims
+        self._lock = threading.Lock()
+        self.snapshot = self._load()
+
+    def add(self, records: list[tuple[str, dict]]) -> None:
+        """Indexa registros `(id, _source)`, substituindo os que já existem."""
+        rows = _Rows()
+        # Como no bulk do Elasticsearch, vale o último registro de cada ID.
+        for doc_id, source in dict(records).items():
+            source = dict(source)
+            text = source.get("content") or ""
+            if not self.store_text:
+                source.pop("content", None)
+            vector = source.pop("embedding", None)
+            terms = analyze(text)
+            hashes, counts = np.unique(
+                np.array([_term_hash(term) for term in terms], dtype=np.uint64),
+                return_counts=True,
+            )
+            rows.add(
+                doc_id, source, self.keywords, zip(hashes.tolist(), counts.tolist()),
+                len(terms), self._vector(vector),
+            )
+        with self._lock:
+            snapshot = self.snapshot
+            replaced = [position for position in map(snapshot.find, rows.ids) if position is not None]
+            self._commit(snapshot, replaced, rows)
+
+    def update(self, doc_ids: list[str], change: Callable[[dict], None]) -> int:
+        """
+        Altera o `_source` dos registros pelos IDs, mantendo as postings do
+        texto, e retorna quantos foram alterados.
+        """
+        with self._lock:
+            snapshot = self.snapshot
+            positions = [position for position in map(snapshot.find, doc_ids) if position is not None]
+            return self._update(snapshot, positions, change)
+
+    def update_by_keyword(self, field: str, value, change: Callable[[dict], None]) -> int:
+        """Altera o `_source` dos registros com o valor no campo keyword."""
+        with self._lock:
+            snapshot = self.snapshot
+            positions = snapshot.postings(_keyword_hash(field, value))[0].tolist()
+            return self._update(snapshot, positions, change)
+
+    def delete(self, doc_ids: list[str]) -> None:
+        """Remove registros pelos IDs; os que não existem são ignorados."""
+        with self._lock:
+            snapshot = self.snapshot
+            positions = [position for position in map(snapshot.find, doc_ids) if position is not None]
+            if positions:
+                self._commit(snapshot, positions, _Rows())
+
+    def delete_by_keyword(self, field: str, value) -> None:
+        """Remove os registros com o valor no campo keyword."""
+        with self._lock:
+            snapshot = self.snapshot
+            positions = snapshot.postings(_keyword_hash(field, value))[0].tolist()
+            if positions:
+                self._commit(snapshot, positions, _Rows())
+
+    def _update(self, snapshot: Snapshot, positions: list[int], change: Callable[[dict], None]) -> int:
+        if not positions:
+            return 0
+        rows = _Rows()
+        for position in positions:
+            index, local = snapshot.locate(position)
+            segment = snapshot.segments[index]
+            source = segment.source(local)
+            change(source)
+            terms, freqs = segment.text_postings(local)
+            rows.add(
+                segment.ids[local], source, self.keywords,
+                zip(terms.tolist(), freqs.tolist()),
+                int(segment.lengths[local]),
+                segment.vectors[local] if segment.vectors is not None else None,
+            )
+        self._commit(snapshot, positions, rows)
+        return len(positions)
+
+    def _vector(self, vector) -> np.ndarray | None:
+        if self.vector_dims is None:
+            return None
+        if vector is None:
+            return np.zeros(self.vector_dims, dtype=np.float32)
+        return np.asarray(vector, dtype=np.float32)
+
+    def _commit(self, snapshot: Snapshot, removed: list[int], rows: _Rows) -> None:
+        """
+        Marca os registros removidos, põe os novos em um segmento e funde os
+        segmentos do fim enquanto o anterior não for `SEGMENT_MERGE_FACTOR`
+        vezes maior. Assim cada escrita custa o tamanho do lote, e cada
+        registro é reescrito um número logarítmico de vezes.
+        """
+        segments = list(snapshot.segments)
+        deleted = list(snapshot.deleted)
+        grouped: dict[int, set[int]] = {}
+        for position in removed:
+            index, position = snapshot.locate(position)
+            grouped.setdefault(index, set()).add(position)
+        for index, positions in grouped.items():
+            deleted[index] = deleted[index] | positions
+        if rows.ids:
+            segments.append(self._build([], rows))
+            deleted.append(frozenset())
+
+        def live(index: int) -> int:
+            return len(segments[index]) - len(deleted[index])
+
+        while len(segments) > 1 and live(-2) < SEGMENT_MERGE_FACTOR * live(-1):
+            segments[-2:] = [self._build(list(zip(segments[-2:], deleted[-2:])), _Rows())]
+            deleted[-2:] = [frozenset()]
+        # Segmentos com mais registros removidos que vivos são reescritos.
+        for index, segment in enumerate(segments):
+            if len(deleted[index]) * 2 > len(segment):
+                segments[index] = self._build([(segment, deleted[index])], _Rows())
+                deleted[index] = frozenset()
+
+        kept = [index for index, segment in enumerate(segments) if len(segment)]
+        self.snapshot = self._save([segments[index] for index in kept], [deleted[index] for index in kept])
+
+    def _build(self, parts: list[tuple[Segment, frozenset[int]]], rows: _Rows) -> Segment:
+        """Monta um segmento com os registros não removidos de `parts` e os novos."""
+        ids, sources = [], []
+        lengths, access, terms, docs, freqs, vectors = [], [], [], [], [], []
+        for segment, removed in parts:
+            keep = np.ones(len(segment), dtype=bool)
+            keep[list(removed)] = False
+            kept = np.flatnonzero(keep)
+            remap = np.cumsum(keep) - 1 + len(ids)
+            posting_keep = keep[segment.docs]
+            terms.append(segment.terms[posting_keep])
+            docs.append(remap[segment.docs[posting_keep]])
+            freqs.append(segment.freqs[posting_keep])
+            ids.extend(segment.ids[i] for i in kept)
+            sources.extend(
+                bytes(segment.blob[segment.offsets[i]:segment.offsets[i + 1]]) for i in kept
+            )
+            lengths.append(segment.lengths[kept])
+            access.append(segment.access[kept])
+            if self.vector_dims is not None:
+                vectors.append(segment.vectors[kept])
+
+        terms.append(np.array(rows.terms, dtype=np.uint64))
+        docs.append(np.array(rows.docs, dtype=np.int64) + len(ids))
+        freqs.append(np.array(rows.freqs, dtype=np.int32))
+        ids.extend(rows.ids)
+        sources.extend(rows.sources)
+        lengths.append(np.array(rows.lengths, dtype=np.int32))
+        access.append(np.array(rows.access, dtype=np.int32))
+        if self.vector_dims is not None:
+            vectors.append(np.array(rows.vectors, dtype=np.float32).reshape(-1, self.vector_dims))
+
+        terms = np.concatenate(terms)
+        order = np.argsort(terms, kind="stable")
+        offsets = np.zeros(len(sources) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(source) for source in sources])
+        return Segment(
+            None, ids, np.concatenate(lengths), np.concatenate(access), terms[order],
+            np.concatenate(docs).astype(np.int32)[order], np.concatenate(freqs)[order],
+            offsets, b"".join(sources), np.concatenate(vectors) if vectors else None,
+        )
+
+    def _save(self, segments: list[Segment], deleted: list[frozenset[int]]) -> Snapshot:
+        """
+        Grava os segmentos novos e a lista de segmentos em uma nova geração,
+        trocada de forma atômica, e apaga os que saíram.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        current = self._current()
+        number = int(current.split("-")[1]) + 1 if current else 1
+        generation = f"gen-{number}"
+        segments = [
+            self._write(segment, f"seg-{number}-{index}") if segment.name is None else segment
+            for index, segment in enumerate(segments)
+        ]
+        with open(os.path.join(self.directory, f"{generation}.json"), "w", encoding="utf-8") as file:
+            json.dump(
+                [
+                    {"name": segment.name, "deleted": sorted(removed)}
+                    for segment, removed in zip(segments, deleted)
+                ],
+                file,
+            )
+
+        tmp_path = os.path.join(self.directory, "CURRENT.tmp")
+        with open(tmp_path, "w") as file:
+            file.write(generation)
+        os.replace(tmp_path, os.path.join(self.directory, "CURRENT"))
+        live = {"CURRENT", f"{generation}.json", *(segment.name for segment in segments)}
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if name in live:
+                continue
+            if os.path.isdir(path):
+                shutil.rmtree(path, ignore_errors=True)
+            else:
+                os.remove(path)
+        return Snapshot(segments, deleted, self.vector_dims)
+
+    def _write(self, segment: Segment, name: str) -> Segment:
+        """Grava um segmento no seu diretório e o reabre com mmap."""
+        path = os.path.join(self.directory, name)
+        # Sobra de uma escrita interrompida com o mesmo nome.
+        shutil.rmtree(path, ignore_errors=True)
+        os.makedirs(path)
+        with open(os.path.join(path, "ids.json"), "w", encoding="utf-8") as file:
+            json.dump(segment.ids, file)
+        with open(os.path.join(path, "sources.bin"), "wb") as file:
+            file.write(segment.blob)
+        for field in ("lengths", "access", "terms", "docs", "freqs", "offsets", "vectors"):
+            array = getattr(segment, field)
+            if array is not None:
+                np.save(os.path.join(path, f"{field}.npy"), array)
+        return self._open(name)
+
+    def _current(self) -> str | None:
+        try:
+            with open(os.path.join(self.directory, "CURRENT")) as file:
+                return file.read().strip()
+        except FileNotFoundError:
+            return None
+
+    def _open(self, name: str) -> Segment:
+        path = os.path.join(self.directory, name)
+
+        def array(field: str) -> np.ndarray:
+            return np.load(os.path.join(path, f"{field}.npy"), mmap_mode="r")
+
+        with open(os.path.join(path, "ids.json"), encoding="utf-8") as file:
+            ids = json.load(file)
+        with open(os.path.join(path, "sources.bin"), "rb") as file:
+            size = os.fstat(file.fileno()).st_size
+            blob = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+        vectors = array("vectors") if self.vector_dims is not None else None
+        return Segment(
+            name, ids, array("lengths"), array("access"), array("terms"), array("docs"),
+            array("freqs"), array("offsets"), blob, vectors,
+        )
+
+    def _load(self) -> Snapshot:
+        generation = self._current()
+        if generation is None:
+            return Snapshot([], [], self.vector_dims)
+        with open(os.path.join(self.directory, f"{generation}.json"), encoding="utf-8") as file:
+            entries = json.load(file)
+        return Snapshot(
+            [self._open(entry["name"]) for entry in entries],
+            [frozenset(entry["deleted"]) for entry in entries],
+            self.vector_dims,
+        )
+
+
+def _select(source: dict, fields: list[str] | None) -> dict:
+    if fields is None:
+        return source
+    return {field: source[field] for field in fields if field in source}
+
+
+def _suggest_words(text: str) -> list[str]:
+    """Palavras sem caixa e sem acentos, como no analisador de sugestões do Elasticsearch."""
+    normalized = unicodedata.normalize("NFKD", text.casefold())
+    return TOKEN_PATTERN.findall("".join(c for c in normalized if not unicodedata.combining(c)))
+
+
+def _prefixes_match(tokens: list[str], words: list[str]) -> bool:
+    return all(any(word.startswith(token) for word in words) for token in tokens)
+
+
+def _interval_start(value: str, interval: str) -> str:
+    """Início do intervalo do histograma que contém a data ISO `value`."""
+    day = date.fromisoformat(value[:10])
+    if interval == "week":
+        day -= timedelta(days=day.weekday())
+    elif interval == "month":
+        day = day.replace(day=1)
+    elif interval == "year":
+        day = day.replace(month=1, day=1)
+    return day.isoformat()
+
+
+def _top(snapshot: Snapshot, scores: np.ndarray, candidates: np.ndarray, size: int) -> np.ndarray:
+    """Os `size` candidatos de maior score, com desempate pelo ID."""
+    if candidates.size > size:
+        kth = np.partition(scores[candidates], candidates.size - size)[candidates.size - size]
+        candidates = candidates[scores[candidates] >= kth]
+    order = np.lexsort((snapshot.id_array[candidates], -scores[candidates]))
+    return candidates[order][:size]
+
+
+def _highlight(content: str, terms: set[str]) -> list[str]:
+    """Fragmentos do conteúdo ao redor dos termos, com os termos entre `<em>`."""
+    spans = [
+        match.span() for match in TOKEN_PATTERN.finditer(content)
+        if match.group().lower() in terms
+    ]
+    fragments = []
+    fragment_end = -1
+    for start, end in spans:
+        if start < fragment_end:
+            continue
+        fragment_start = max(0, start - (HIGHLIGHT_FRAGMENT_SIZE - (end - start)) // 2)
+        fragment_end = min(len(content), fragment_start + HIGHLIGHT_FRAGMENT_SIZE)
+        fragment = []
+        cursor = fragment_start
+        for span_start, span_end in spans:
+            if span_start >= fragment_start and span_end <= fragment_end:
+                fragment.append(content[cursor:span_start])
+                fragment.append(f"<em>{content[span_start:span_end]}</em>")
+                cursor = span_end
+        fragment.append(content[cursor:fragment_end])
+        fragments.append("".join(fragment).strip())
+        if len(fragments) == HIGHLIGHT_FRAGMENTS:
+            break
+    return fragments
+
+
+class EmbeddedBackend(SearchBackend):
+    """
+    Classe do mecanismo de busca embutido.
+
+    Atributos:
+        documents: Coleção dos documentos (sem o conteúdo no `_source`).
+        chunks: Coleção dos trechos, com os embeddings.
+    """
+    _instance = None
+    _initialized = False
+
+    def __init__(self) -> None:
+        """
+        Abre as coleções gravadas em `EMBEDDED_INDEX_DIR`.
+        """
+        if self._initialized:
+            return
+        self.documents = InvertedIndex(
+            os.path.join(EMBEDDED_INDEX_DIR, "documents"), ("category",), store_text=False
+        )
+        self.chunks = InvertedIndex(
+            os.path.join(EMBEDDED_INDEX_DIR, "chunks"), ("category", "parent_id"),
+            store_text=True, vector_dims=EMBEDDING_DIMS,
+        )
+        # Palavras do nome e dos títulos de cada documento, por snapshot.
+        self._suggest_entries: tuple[Snapshot, list] | None = None
+        self._initialized = True
+
+    def __new__(cls) -> "EmbeddedBackend":
+        """
+        Garante que as coleções sejam abertas uma vez por processo.
+        """
+        if cls._instance is None:
+            cls._instance = super(EmbeddedBackend, cls).__new__(cls)
+        return cls._instance
+
+    def _collection(self, index: str) -> InvertedIndex:
+        if index == DOC_INDEX:
+            return self.documents
+        if index == CHUNK_INDEX:
+            return self.chunks
+        raise ValueError(f"Índice desconhecido: {index}")
+
+    def bulk(self, actions: Iterable[dict], raise_on_error: bool = True) -> list[tuple[bool, dict]]:
+        grouped: dict[str, list[tuple[str, dict]]] = {}
+        removed: dict[str, list[str]] = {}
+        results = []
+        for action in actions:
+            if action.get("_op_type") == "delete":
+                removed.setdefault(action["_index"], []).append(action["_id"])
+                continue
+            grouped.setdefault(action["_index"], []).append((action["_id"], action["_source"]))
+        for index, doc_ids in removed.items():
+            self._collection(index).delete(doc_ids)
+            results.extend(
+                (True, {"delete": {"_index": index, "_id": doc_id}}) for doc_id in doc_ids
+            )
+        for index, records in grouped.items():
+            try:
+                self._collection(index).add(records)
+                results.extend(
+                    (True, {"index": {"_index": index, "_id": doc_id}}) for doc_id, _ in records
+                )
+            except Exception as e:
+                if raise_on_error:
+                    raise
+                results.extend(
+                    (False, {"index": {"_id": doc_id, "error": str(e)}}) for doc_id, _ in records
+                )
+        return results
+
+    def merge_upload(self, file_id: str, params: dict) -> bool:
+        def change(source: dict) -> None:
+            merge_upload_source(source, params)
+
+        if not self.documents.update([file_id], change):
+            return False
+        self.chunks.update_by_keyword("parent_id", file_id, change)
+        return True
+
+    def delete_document(self, file_id: str) -> None:
+        self.documents.delete([file_id])
+        self.chunks.delete_by_keyword("parent_id", file_id)
+
+    async def search(self, requests: list[SearchRequest]) -> list[dict | SearchError]:
+        responses = []
+        for request in requests:
+            try:
+                responses.append(self._search(request))
+            except Exception as e:
+                responses.append(SearchError(str(e)))
+        return responses
+
+    def _search(self, request: SearchRequest) -> dict:
+        snapshot = self._collection(request.index).snapshot
+        mask = snapshot.filter_mask(request.category, request.access_level)
+        if request.vector is not None:
+            if snapshot.vectors is None:
+                raise ValueError(f"O índice {request.index} não tem embeddings")
+            vector = np.asarray(request.vector, dtype=np.float32)
+            candidates = np.flatnonzero(mask & snapshot.vectors.any(axis=1))
+            # Mesmo score do Elasticsearch para similaridade cosseno.
+            scores = np.zeros(len(snapshot), dtype=np.float64)
+            scores[candidates] = (1 + snapshot.vectors[candidates] @ vector) / 2
+        else:
+            scores, matched = snapshot.bm25(request.text or "")
+            candidates = np.flatnonzero(mask & matched)
+        total = int(candidates.size)
+
+        if request.search_after:
+            score, after_id = request.search_after
+            candidate_scores = scores[candidates]
+            candidates = candidates[
+                (candidate_scores < score)
+                | ((candidate_scores == score) & (snapshot.id_array[candidates] > after_id))
+            ]
+
+        hits = []
+        for position in _top(snapshot, scores, candidates, request.size):
+            score = float(scores[position])
+            hit = {
+                "_id": snapshot.ids[position],
+                "_score": score,
+                "_source": _select(snapshot.source(position), request.fields),
+            }
+            if request.index == DOC_INDEX:
+                hit["sort"] = [score, snapshot.ids[position]]
+            hits.append(hit)
+        return {"hits": hits, "total": total}
+
+    async def snippets(self, text: str, doc_ids: list[str]) -> dict[str, list[str]]:
+        snapshot = self.chunks.snapshot
+        scores, matched = snapshot.bm25(text)
+        terms = set(analyze(text))
+        snippets = {}
+        for doc_id in doc_ids:
+            positions = snapshot.postings(_keyword_hash("parent_id", doc_id))[0]
+            positions = positions[matched[positions]]
+            if positions.size:
+                best = positions[np.argmax(scores[positions])]
+                snippets[doc_id] = _highlight(snapshot.source(best)["content"], terms)
+        return snippets
+
+    async def list_documents(
+        self,
+        category: str | None,
+        access_level: int,
+        sort: str,
+        order: str,
+        size: int,
+        cursor: str | None = None,
+    ) -> tuple[list[dict], int, str | None]:
+        """
+        A listagem ordena os metadados em Python: a coleção de documentos é
+        pequena e os campos de ordenação não ficam em arrays. O cursor leva
+        o valor e o ID do último item, e itens sem o campo vêm por último.
+        """
+        if cursor:
+            try:
+                value, after_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+            except (ValueError, TypeError):
+                raise InvalidCursor("Cursor inválido")
+
+        snapshot = self.documents.snapshot
+        candidates = np.flatnonzero(snapshot.filter_mask(category, access_level))
+        items = [(snapshot.ids[i], snapshot.source(i)) for i in candidates]
+        present = sorted(
+            (item for item in items if item[1].get(sort) is not None),
+            key=lambda item: (item[1][sort], item[0]),
+            reverse=order == "desc",
+        )
+        missing = sorted((item for item in items if item[1].get(sort) is None), key=lambda item: item[0])
+        ordered = present + missing
+
+        start = 0
+        if cursor:
+            for start, (doc_id, source) in enumerate(ordered):
+                if value is None:
+                    if source.get(sort) is None and doc_id > after_id:
+                        break
+                elif source.get(sort) is None:
+                    break
+                elif order == "desc" and (source[sort], doc_id) < (value, after_id):
+                    break
+                elif order == "asc" and (source[sort], doc_id) > (value, after_id):
+                    break
+            else:
+                start = len(ordered)
+
+        page = ordered[start:start + size]
+        hits = [
+            {
+                "_id": doc_id,
+                "_source": _select(source, list(LIST_FIELDS)),
+                "sort": [source.get(sort), doc_id],
+            }
+            for doc_id, source in page
+        ]
+        next_cursor = None
+        if start + size < len(ordered):
+            next_cursor = base64.urlsafe_b64encode(
+                json.dumps(hits[-1]["sort"]).encode("utf-8")
+            ).decode("ascii")
+        return hits, len(ordered), next_cursor
+
+    async def facets(
+        self, category: str | None, access_level: int, interval: str, size: int
+    ) -> dict:
+        snapshot = self.documents.snapshot
+        candidates = np.flatnonzero(snapshot.filter_mask(category, access_level))
+        counters = {field: Counter() for field in (*FACET_TERMS, "data_upload")}
+        for position in candidates:
+            source = snapshot.source(position)
+            for field in FACET_TERMS:
+                counters[field].update(_values(source.get(field)))
+            if source.get("data_upload"):
+                counters["data_upload"][_interval_start(source["data_upload"], interval)] += 1
+        # Mesma ordem das agregações do Elasticsearch.
+        facets = {
+            field: [
+                {"value": value, "count": count}
+                for value, count in sorted(
+                    counters[field].items(), key=lambda item: (-item[1], item[0])
+                )[:size]
+            ]
+            for field in FACET_TERMS
+        }
+        facets["data_upload"] = [
+            {"value": value, "count": count}
+            for value, count in sorted(counters["data_upload"].items())
+        ]
+        return {"total": int(candidates.size), **facets}
+
+    def _suggest_index(self, snapshot: Snapshot) -> list:
+        if self._suggest_entries is None or self._suggest_entries[0] is not snapshot:
+            entries = []
+            for position in range(len(snapshot)):
+                source = snapshot.source(position)
+                headings = _values(source.get("headings"))
+                entries.append((
+                    source.get("filename", ""),
+                    _suggest_words(source.get("filename", "")),
+                    [(heading, _suggest_words(heading)) for heading in headings],
+                ))
+            self._suggest_entries = (snapshot, entries)
+        return self._suggest_entries[1]
+
+    async def suggest(
+        self, prefix: str, category: str | None, access_level: int, size: int
+    ) -> list[dict]:
+        """
+        As palavras do nome e dos títulos são preparadas uma vez por
+        snapshot. Como no Elasticsearch, todas as palavras do prefixo precisam
+        casar no mesmo campo, e o nome do arquivo pesa mais que os títulos.
+        """
+        tokens = _suggest_words(prefix)
+        if not tokens:
+            return []
+        snapshot = self.documents.snapshot
+        entries = self._suggest_index(snapshot)
+        by_filename, by_heading = [], []
+        for position in np.flatnonzero(snapshot.filter_mask(category, access_level)):
+            filename, words, headings = entries[position]
+            suggestion = {"id": snapshot.ids[position], "filename": filename, "heading": None}
+            if _prefixes_match(tokens, words):
+                by_filename.append(suggestion)
+                continue
+            heading_words = [word for _, words in headings for word in words]
+            if _prefixes_match(tokens, heading_words):
+                suggestion["heading"] = next(
+                    (heading for heading, words in headings if any(
+                        word.startswith(token) for word in words for token in tokens
+                    )),
+                    None,
+                )
+                by_heading.append(suggestion)
+        return (by_filename + by_heading)[:size]
+
+    async def get_source(self, index: str, doc_id: str) -> dict | None:
+        snapshot = self._collection(index).snapshot
+        position = snapshot.find(doc_id)
+        return snapshot.source(position) if position is not None else None
@@ -0,0 +1,521 @@
+"""Módulo do mecanismo de busca no Elasticsearch"""
+
+import asyncio
+import base64
+import json
+import logging
+import os
+import re
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Iterable
+
+from bson.objectid import ObjectId
+from elasticsearch import NotFoundError, helpers
+
+from src.elastic.client import (
+    CHUNK_INDEX,
+    DOC_INDEX,
+    ElasticsearchConnection,
+    category_routing,
+    search_routing,
+)
+from src.mongo.client import MongoDBClient
+from src.search.backend import (
+    FACET_TERMS,
+    LIST_FIELDS,
+    CursorExpired,
+    InvalidCursor,
+    SearchBackend,
+    SearchError,
+    SearchRequest,
+    merge_upload_source,
+)
+
+logger = logging.getLogger(__name__)
+
+BULK_THREADS = int(os.getenv("BULK_THREADS", "4"))
+HIGHLIGHT_FRAGMENT_SIZE = 200
+HIGHLIGHT_FRAGMENTS = 3
+# Candidatos avaliados por shard na busca por embeddings (kNN aproximado).
+KNN_NUM_CANDIDATES = int(os.getenv("KNN_NUM_CANDIDATES", "100"))
+LIST_KEEP_ALIVE = "2m"
+# Maior valor do desempate `_shard_doc`, usado ao trocar de point-in-time.
+SHARD_DOC_MAX = 2 ** 63 - 1
+HIGHLIGHT_TAGS = re.compile(r"</?em>")
+# Intervalo, em segundos, entre as verificações das condições de rollover.
+ROLLOVER_CHECK_INTERVAL = int(os.getenv("ROLLOVER_CHECK_INTERVAL", "3600"))
+
+# Campo de cada ordenação da listagem e tipo usado se o campo não existir.
+LIST_SORT_FIELDS = {
+    "data_upload": ("data_upload", "date"),
+    "filename": ("filename.keyword", "keyword"),
+    "access_level": ("access_level", "integer"),
+    "page_count": ("page_count", "integer"),
+}
+
+# Acrescenta os metadados de um novo upload aos trechos já indexados
+# (mesma regra de `merge_upload_source`).
+MERGE_UPLOAD_SCRIPT = """
+for (String field : ['category', 'uploaded_by']) {
+    def current = ctx._source[field];
+    if (!(current instanceof List)) {
+        current = current == null ? new ArrayList() : [current];
+    }
+    if (!current.contains(params[field])) {
+        current.add(params[field]);
+    }
+    ctx._source[field] = current;
+}
+if (ctx._source.access_level == null || params.access_level < ctx._source.access_level) {
+    ctx._source.access_level = params.access_level;
+}
+"""
+
+
+def _access_filters(category: str | None, access_level: int) -> list[dict]:
+    """Filtros de nível de acesso e categoria."""
+    filters = [{"range": {"access_level": {"lte": access_level}}}]
+    if category:
+        filters.append({"term": {"category": category}})
+    return filters
+
+
+def _request_body(request: SearchRequest) -> dict:
+    """Traduz uma busca para o corpo de uma consulta do Elasticsearch."""
+    filters = _access_filters(request.category, request.access_level)
+    body = {
+        "size": request.size,
+        "_source": request.fields if request.fields is not None else {"excludes": ["embedding"]},
+    }
+    if request.vector is not None:
+        body["knn"] = {
+            "field": "embedding",
+            "query_vector": request.vector,
+            "k": request.size,
+            "num_candidates": max(KNN_NUM_CANDIDATES, request.size),
+            "filter": filters,
+        }
+        return body
+    body["query"] = {
+        "bool": {"must": [{"match": {"content": request.text}}], "filter": filters}
+    }
+    if request.index == DOC_INDEX:
+        # Índices anteriores ao campo `file_id` não o têm mapeado.
+        body["sort"] = [
+            {"_score": "desc"},
+            {"file_id": {"order": "asc", "unmapped_type": "keyword"}},
+        ]
+        if request.search_after:
+            body["search_after"] = request.search_after
+    return body
+
+
+def _encode_cursor(pit_id: str, search_after: list, total: int) -> str:
+    payload = json.dumps({"pit": pit_id, "search_after": search_after, "total": total})
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii")
+
+
+def _decode_cursor(cursor: str) -> tuple[str, list, int | None]:
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return payload["pit"], payload["search_after"], payload.get("total")
+    except (ValueError, KeyError, TypeError):
+        raise InvalidCursor("Cursor inválido")
+
+
+class ElasticBackend(SearchBackend):
+    """
+    Classe do mecanismo de busca no Elasticsearch.
+
+    As escritas usam o cliente síncrono e as buscas o assíncrono, conectado
+    no lifespan da API. Lotes de buscas vão em um único `_msearch`.
+    """
+    _instance = None
+    _initialized = False
+
+    def __init__(self) -> None:
+        """
+        Inicializa a conexão com o Elasticsearch.
+        """
+        if self._initialized:
+            return
+        self.connection = ElasticsearchConnection()
+        self._rollover_task: asyncio.Task | None = None
+        self._initialized = True
+
+    def __new__(cls) -> "ElasticBackend":
+        """
+        Garante que apenas uma instância seja criada.
+        """
+        if cls._instance is None:
+            cls._instance = super(ElasticBackend, cls).__new__(cls)
+        return cls._instance
+
+    async def connect(self) -> None:
+        await self.connection.connect_async()
+        # Uma carga em massa interrompida pelo fim do processo deixa os
+        # índices sem refresh e sem réplicas.
+        await asyncio.to_thread(self.connection.restore_bulk_load_settings)
+        if self._rollover_task is None:
+            self._rollover_task = asyncio.create_task(self._rollover_loop())
+
+    async def close(self) -> None:
+        if self._rollover_task is not None:
+            self._rollover_task.cancel()
+            self._rollover_task = None
+        await self.connection.close_async()
+
+    async def _rollover_loop(self) -> None:
+        """Verifica periodicamente as condições de rollover dos índices."""
+        while True:
+            try:
+                await asyncio.to_thread(self.connection.rollover)
+            except Exception as e:
+                logger.warning("Falha no rollover dos índices: %s", e)
+            await asyncio.sleep(ROLLOVER_CHECK_INTERVAL)
+
+    def _routing(self, category: str | None) -> str | None:
+        """
+        Roteamento das buscas filtradas pela categoria, que assim só
+        consultam os shards da categoria e dos documentos com várias
+        categorias. Enquanto houver índices sem roteamento por categoria
+        (anteriores à reindexação), as buscas consultam todos os shards.
+        """
+        return search_routing(category) if self.connection.routed else None
+
+    def bulk(self, actions: Iterable[dict], raise_on_error: bool = True) -> list[tuple[bool, dict]]:
+        if raise_on_error:
+            helpers.bulk(self.connection.es, actions)
+            return []
+        return list(
+            helpers.parallel_bulk(
+                self.connection.es,
+                actions,
+                thread_count=BULK_THREADS,
+                raise_on_error=False,
+                raise_on_exception=False,
+            )
+        )
+
+    def merge_upload(self, file_id: str, params: dict) -> bool:
+        """
+        O documento é reindexado por inteiro, e não atualizado por script:
+        uma atualização reconstrói o documento a partir do _source, que não
+        guarda o conteúdo, e o documento sairia das buscas. O conteúdo vem
+        do MarkdownStore. Um documento que passa a ter mais de uma categoria
+        muda de roteamento (ver `category_routing`), então ele e seus
+        trechos vão para o novo shard.
+
+        Os índices são atualizados (refresh) antes da busca pelo documento e
+        seus trechos: o upload anterior do mesmo conteúdo pode ter acabado
+        de ser indexado, ou a carga em massa pode estar com o refresh
+        desabilitado, e sem isso o documento seria indexado de novo.
+        """
+        es = self.connection.es
+        es.indices.refresh(index=[DOC_INDEX, CHUNK_INDEX])
+        result = es.search(index=DOC_INDEX, query={"ids": {"values": [file_id]}}, size=1)
+        if not result["hits"]["hits"]:
+            return False
+        hit = result["hits"]["hits"][0]
+        source = hit["_source"]
+        # Índices anteriores ao MarkdownStore ainda guardam o conteúdo no _source.
+        if "content" not in source:
+            stored = MongoDBClient().markdown.get(ObjectId(file_id))
+            if stored is None:
+                logger.warning(
+                    "Markdown de %s não encontrado; metadados do upload não indexados", file_id
+                )
+                return True
+            source["content"] = stored[1]
+        merge_upload_source(source, params)
+
+        es.update_by_query(
+            index=CHUNK_INDEX,
+            query={"term": {"parent_id": file_id}},
+            script={"source": MERGE_UPLOAD_SCRIPT, "params": params},
+            conflicts="proceed",
+            refresh=True,
+        )
+        routing = category_routing(source["category"])
+        if hit.get("_routing") is not None and hit["_routing"] != routing:
+            self._reroute(file_id, hit, source, routing)
+        else:
+            # Na geração em que o documento está, não só na de escrita.
+            es.index(
+                index=hit["_index"], id=file_id, routing=hit.get("_routing"), document=source
+            )
+        return True
+
+    def _reroute(self, file_id: str, hit: dict, source: dict, routing: str) -> None:
+        """
+        Move o documento (com o `_source` já atualizado e o conteúdo) e seus
+        trechos para outro valor de roteamento.
+
+        As cópias antigas são removidas antes da escrita, já que os dois
+        roteamentos podem cair no mesmo shard.
+        """
+        es = self.connection.es
+        chunks = list(
+            helpers.scan(
+                es, index=CHUNK_INDEX, query={"query": {"term": {"parent_id": file_id}}}
+            )
+        )
+        actions = []
+        for old in [hit, *chunks]:
+            action = {"_op_type": "delete", "_index": old["_index"], "_id": old["_id"]}
+            if old.get("_routing") is not None:
+                action["_routing"] = old["_routing"]
+            actions.append(action)
+        actions.append(
+            {"_index": DOC_INDEX, "_id": file_id, "_routing": routing, "_source": source}
+        )
+        actions.extend(
+            {
+                "_index": CHUNK_INDEX,
+                "_id": chunk["_id"],
+                "_routing": routing,
+                "_source": chunk["_source"],
+            }
+            for chunk in chunks
+        )
+        helpers.bulk(es, actions)
+
+    def delete_document(self, file_id: str) -> None:
+        # Por consulta, já que o roteamento e a geração do documento não são
+        # conhecidos. O refresh antes da consulta alcança o que acabou de ser
+        # indexado; o da remoção tira o documento das buscas na hora.
+        es = self.connection.es
+        es.indices.refresh(index=[DOC_INDEX, CHUNK_INDEX])
+        es.delete_by_query(
+            index=DOC_INDEX,
+            query={"ids": {"values": [file_id]}},
+            conflicts="proceed",
+            refresh=True,
+        )
+        es.delete_by_query(
+            index=CHUNK_INDEX,
+            query={"term": {"parent_id": file_id}},
+            conflicts="proceed",
+            refresh=True,
+        )
+
+    @asynccontextmanager
+    async def bulk_load(self) -> AsyncIterator[None]:
+        # As configurações e o refresh final, que demora após uma carga
+        # grande, usam o cliente síncrono, então rodam em uma thread.
+        await asyncio.to_thread(self.connection.begin_bulk_load)
+        try:
+            yield
+        finally:
+            await asyncio.to_thread(self.connection.end_bulk_load)
+
+    async def search(self, requests: list[SearchRequest]) -> list[dict | SearchError]:
+        searches = []
+        for request in requests:
+            header = {"index": request.index}
+            routing = self._routing(request.category)
+            if routing:
+                header["routing"] = routing
+            searches.extend([header, _request_body(request)])
+        result = await self.connection.aes.msearch(searches=searches)
+        responses = []
+        for item in result["responses"]:
+            if "error" in item:
+                error = item["error"]
+                responses.append(SearchError(str(error.get("reason", error))))
+                continue
+            responses.append(
+                {"hits": item["hits"]["hits"], "total": item["hits"]["total"]["value"]}
+            )
+        return responses
+
+    async def snippets(self, text: str, doc_ids: list[str]) -> dict[str, list[str]]:
+        """
+        O índice de documentos não guarda o conteúdo no _source, então o
+        destaque vem do trecho mais relevante de cada documento (collapse por
+        `parent_id`).
+        """
+        result = await self.connection.aes.search(
+            index=CHUNK_INDEX,
+            body={
+                "size": len(doc_ids),
+                "_source": False,
+                "query": {
+                    "bool": {
+                        "must": [{"match": {"content": text}}],
+                        "filter": [{"terms": {"parent_id": doc_ids}}],
+                    }
+                },
+                "collapse": {"field": "parent_id"},
+                "highlight": {
+                    "fields": {
+                        "content": {
+                            "fragment_size": HIGHLIGHT_FRAGMENT_SIZE,
+                            "number_of_fragments": HIGHLIGHT_FRAGMENTS,
+                        }
+                    }
+                },
+            },
+        )
+        return {
+            hit["fields"]["parent_id"][0]: hit.get("highlight", {}).get("content", [])
+            for hit in result["hits"]["hits"]
+        }
+
+    async def list_documents(
+        self,
+        category: str | None,
+        access_level: int,
+        sort: str,
+        order: str,
+        size: int,
+        cursor: str | None = None,
+    ) -> tuple[list[dict], int, str | None]:
+        """
+        A primeira página abre um point-in-time, e o cursor leva o ID dele, o
+        `search_after` da página e o total; o point-in-time é fechado na
+        última página. O total só é contado na primeira página (o
+        point-in-time não muda), para que o custo das seguintes não cresça
+        com o número de documentos.
+
+        Se o point-in-time expirar entre duas páginas, um novo é aberto e a
+        listagem continua do mesmo `search_after`: o desempate por `file_id`
+        não depende do point-in-time, e o `_shard_doc` do antigo é trocado
+        pelo maior valor possível para não repetir o último documento.
+        """
+        es = self.connection.aes
+        pit_id, search_after, total = _decode_cursor(cursor) if cursor else (None, None, None)
+        if pit_id is None:
+            pit_id = await self._open_list_pit(category)
+        field, unmapped_type = LIST_SORT_FIELDS[sort]
+        body = {
+            "size": size,
+            "_source": list(LIST_FIELDS),
+            "track_total_hits": total is None,
+            "query": {"bool": {"filter": _access_filters(category, access_level)}},
+            # O `_shard_doc` é o desempate do point-in-time; fica explícito
+            # para que sua ordem seja conhecida ao trocar de point-in-time.
+            "sort": [
+                {field: {"order": order, "unmapped_type": unmapped_type}},
+                {"file_id": {"order": "asc", "unmapped_type": "keyword"}},
+                {"_shard_doc": "asc"},
+            ],
+            "pit": {"id": pit_id, "keep_alive": LIST_KEEP_ALIVE},
+        }
+        if search_after:
+            body["search_after"] = search_after
+        try:
+            result = await es.search(body=body)
+        except NotFoundError:
+            if not search_after:
+                raise CursorExpired("Cursor expirado, recomece a listagem")
+            body["pit"]["id"] = await self._open_list_pit(category)
+            body["search_after"] = [*search_after[:-1], SHARD_DOC_MAX]
+            try:
+                result = await es.search(body=body)
+            except NotFoundError:
+                raise CursorExpired("Cursor expirado, recomece a listagem")
+
+        hits = result["hits"]["hits"]
+        pit_id = result.get("pit_id", pit_id)
+        if total is None:
+            total = result["hits"]["total"]["value"]
+        next_cursor = None
+        if len(hits) == size:
+            next_cursor = _encode_cursor(pit_id, hits[-1]["sort"], total)
+        else:
+            await es.close_point_in_time(id=pit_id, ignore_status=404)
+        return hits, total, next_cursor
+
+    async def _open_list_pit(self, category: str | None) -> str:
+        result = await self.connection.aes.open_point_in_time(
+            index=DOC_INDEX, keep_alive=LIST_KEEP_ALIVE, routing=self._routing(category)
+        )
+        return result["id"]
+
+    async def facets(
+        self, category: str | None, access_level: int, interval: str, size: int
+    ) -> dict:
+        aggs = {field: {"terms": {"field": field, "size": size}} for field in FACET_TERMS}
+        aggs["data_upload"] = {
+            "date_histogram": {
+                "field": "data_upload",
+                "calendar_interval": interval,
+                "format": "yyyy-MM-dd",
+                "min_doc_count": 1,
+            }
+        }
+        result = await self.connection.aes.search(
+            index=DOC_INDEX,
+            size=0,
+            track_total_hits=True,
+            query={"bool": {"filter": _access_filters(category, access_level)}},
+            aggs=aggs,
+            routing=self._routing(category),
+        )
+        facets = {
+            field: [
+                {"value": bucket.get("key_as_string", bucket["key"]), "count": bucket["doc_count"]}
+                for bucket in result["aggregations"][field]["buckets"]
+            ]
+            for field in aggs
+        }
+        return {"total": result["hits"]["total"]["value"], **facets}
+
+    async def suggest(
+        self, prefix: str, category: str | None, access_level: int, size: int
+    ) -> list[dict]:
+        """
+        Consulta os subcampos com os prefixos das palavras (edge n-grams),
+        então não há busca por prefixo no momento da consulta; o destaque
+        com o valor inteiro indica o título que casou.
+        """
+        result = await self.connection.aes.search(
+            index=DOC_INDEX,
+            size=size,
+            track_total_hits=False,
+            _source=["filename"],
+            query={
+                "bool": {
+                    "must": [
+                        {
+                            "multi_match": {
+                                "query": prefix,
+                                "fields": ["filename.suggest^2", "headings.suggest"],
+                                "operator": "and",
+                            }
+                        }
+                    ],
+                    "filter": _access_filters(category, access_level),
+                }
+            },
+            highlight={
+                "fields": {
+                    "filename.suggest": {"number_of_fragments": 0},
+                    "headings.suggest": {"number_of_fragments": 0},
+                }
+            },
+            routing=self._routing(category),
+        )
+        suggestions = []
+        for hit in result["hits"]["hits"]:
+            highlight = hit.get("highlight", {})
+            heading = None
+            if "filename.suggest" not in highlight and highlight.get("headings.suggest"):
+                heading = HIGHLIGHT_TAGS.sub("", highlight["headings.suggest"][0])
+            suggestions.append(
+                {"id": hit["_id"], "filename": hit["_source"].get("filename", ""), "heading": heading}
+            )
+        return suggestions
+
+    async def close_cursor(self, cursor: str) -> None:
+        pit_id, _, _ = _decode_cursor(cursor)
+        await self.connection.aes.close_point_in_time(id=pit_id, ignore_status=404)
+
+    async def get_source(self, index: str, doc_id: str) -> dict | None:
+        # O GET por ID exigiria o roteamento e só consultaria a geração de escrita.
+        result = await self.connection.aes.search(
+            index=index, query={"ids": {"values": [doc_id]}}, size=1
+        )
+        hits = result["hits"]["hits"]
+        return hits[0]["_source"] if hits else None
@@ -3,7 +3,6 @@
 import logging
 import re
 import sys
-import requests
 import os
 
 import streamlit as st
@@ -134,37 +133,23 @@ def extract_and_display_documents(response_text, search_docs):
     
     st.subheader("Documentos Utilizados", divider="orange")
     
-    try:
-        # Buscar lista de todos os documentos
-        access_level = st.session_state.get("access_level", 0)
-        response = requests.get(
-            f"{BASE_API_URL}/api/v1/document/list",
-            params={"access_level": access_level},
-            timeout=10
-        )
-        
-        if response.status_code == 200:
-            todos_docs = response.json().get("documents", [])
-            
-            # Exibir documentos encontrados na busca
-            cols = st.columns(min(3, len(search_docs)))
-            
-            for idx, doc in enumerate(search_docs):
-                col = cols[idx % len(cols)]
-                doc_id = str(doc.get("id", ""))
-                
-                with col:
-                    with st.container(border=True):
-                        st.markdown(f"**{doc.get('filename', 'Sem nome')}**")
-                        st.caption(f"Categoria: {doc.get('category', 'N/A')}")
-                        st.caption(f"Enviado por: {doc.get('uploaded_by', 'N/A')}")
-                        
-                        if st.button("Ver", key=f"view_doc_{doc_id}"):
-                            st.session_state.selected_doc = doc_id
-                            st.session_state.view_mode = "markdown"
-                            st.rerun()
-    except requests.RequestException as e:
-        st.warning(f"Erro ao exibir documentos: {str(e)}")
+    # Os metadados exibidos já vêm da busca; não é preciso listar o acervo.
+    cols = st.columns(min(3, len(search_docs)))
+
+    for idx, doc in enumerate(search_docs):
+        col = cols[idx % len(cols)]
+        doc_id = str(doc.get("id", ""))
+
+        with col:
+            with st.container(border=True):
+                st.markdown(f"**{doc.get('filename', 'Sem nome')}**")
+                st.caption(f"Categoria: {doc.get('category', 'N/A')}")
+                st.caption(f"Enviado por: {doc.get('uploaded_by', 'N/A')}")
+
+                if st.button("Ver", key=f"view_doc_{doc_id}"):
+                    st.session_state.selected_doc = doc_id
+                    st.session_state.view_mode = "markdown"
+                    st.rerun()
 
 
 def agent_chat(access_level, category, query):
@@ -4,45 +4,276 @@ import os
 import requests
 import streamlit as st
 
+try:
+    from st_keyup import st_keyup
+except ImportError:
+    st_keyup = None
+
 BASE_API_URL = os.getenv("BASE_API_URL", "http://localhost:5000")
 
 
-def get_all_documents():
-    """Busca todos os documentos do Elasticsearch com acesso do usuário"""
+LIST_PAGE_SIZE = 100
+# Páginas do markdown buscadas por vez no visualizador.
+MARKDOWN_PAGE_SIZE = 5
+SUGGEST_DEBOUNCE_MS = int(os.getenv("SUGGEST_DEBOUNCE_MS", "300"))
+SUGGEST_MIN_CHARS = 2
+# Grade de miniaturas da lista: colunas e miniaturas por página da grade.
+THUMBNAIL_COLUMNS = 4
+THUMBNAILS_PER_PAGE = 12
+
+
+@st.cache_data(ttl=60, show_spinner=False)
+def get_suggestions(prefix: str, category: str | None, access_level: int):
+    """Busca as sugestões de documentos para o texto digitado"""
+    params = {"prefix": prefix, "access_level": access_level}
+    if category:
+        params["category"] = category
     try:
-        access_level = st.session_state.get("access_level", 0)
         response = requests.get(
-            f"{BASE_API_URL}/api/v1/document/list",
-            params={"access_level": access_level}
+            f"{BASE_API_URL}/api/v1/document/suggest", params=params, timeout=2
         )
         if response.status_code == 200:
-            return response.json().get("documents", [])
+            return response.json().get("suggestions", [])
         return []
+    except requests.RequestException:
+        return []
+
+
+def suggest_input(label: str, key: str, category: str | None = None):
+    """
+    Campo de texto com sugestões de documentos pelo nome e pelos títulos.
+
+    Com o pacote `streamlit-keyup` instalado, as sugestões acompanham a
+    digitação, com debounce de `SUGGEST_DEBOUNCE_MS`; sem ele, o campo comum
+    só atualiza ao pressionar Enter ou sair do campo. Prefixos repetidos
+    vêm do cache do Streamlit.
+    """
+    if st_keyup is not None:
+        text = st_keyup(label, key=key, debounce=SUGGEST_DEBOUNCE_MS) or ""
+    else:
+        text = st.text_input(label, key=key)
+    prefix = " ".join(text.casefold().split())
+    suggestions = []
+    if len(prefix) >= SUGGEST_MIN_CHARS:
+        suggestions = get_suggestions(prefix, category, st.session_state.get("access_level", 0))
+    return text, suggestions
+
+
+def get_facets():
+    """Busca as contagens por categoria dos documentos com acesso do usuário"""
+    try:
+        response = requests.get(
+            f"{BASE_API_URL}/api/v1/document/facets",
+            params={"access_level": st.session_state.get("access_level", 0)},
+        )
+        if response.status_code == 200:
+            return response.json()
+        return {}
+    except Exception as e:
+        st.error(f"Erro ao buscar filtros: {str(e)}")
+        return {}
+
+
+def get_documents_page(cursor: str | None = None, category: str | None = None):
+    """
+    Busca uma página dos metadados dos documentos com acesso do usuário.
+
+    Em caso de erro, exibe a mensagem e retorna None, para que quem chamou
+    mantenha o cursor atual em vez de encerrar a lista.
+    """
+    try:
+        access_level = st.session_state.get("access_level", 0)
+        params = {"access_level": access_level, "size": LIST_PAGE_SIZE}
+        if category:
+            params["category"] = category
+        if cursor:
+            params["cursor"] = cursor
+        response = requests.get(f"{BASE_API_URL}/api/v1/document/list", params=params)
+        if response.status_code == 200:
+            data = response.json()
+            return data.get("documents", []), data.get("next_cursor")
+        st.error(f"Erro ao buscar documentos: HTTP {response.status_code}")
+        return None
     except Exception as e:
         st.error(f"Erro ao buscar documentos: {str(e)}")
-        return []
+        return None
 
 
-def get_document_content(doc_id: str):
-    """Busca o conteúdo markdown de um documento específico"""
+def get_all_documents(category: str | None = None):
+    """
+    Retorna os documentos já carregados, buscando a primeira página se preciso.
+
+    As páginas seguintes só são buscadas pelo botão "Carregar mais", então
+    cada rerun da página não relista o acervo inteiro.
+    """
+    access_level = st.session_state.get("access_level", 0)
+    listing = st.session_state.get("documents_listing")
+    if (
+        listing is None
+        or listing["access_level"] != access_level
+        or listing.get("category") != category
+    ):
+        page = get_documents_page(category=category)
+        if page is None:
+            return []
+        documents, cursor = page
+        listing = {
+            "access_level": access_level,
+            "category": category,
+            "documents": documents,
+            "cursor": cursor,
+        }
+        st.session_state.documents_listing = listing
+    return listing["documents"]
+
+
+def load_more_documents() -> bool:
+    """
+    Acrescenta a próxima página à lista de documentos carregados.
+
+    Returns:
+        bool: False se a página não pôde ser buscada; o cursor é mantido
+            para uma nova tentativa.
+    """
+    listing = st.session_state.documents_listing
+    page = get_documents_page(listing["cursor"], listing.get("category"))
+    if page is None:
+        return False
+    listing["documents"].extend(page[0])
+    listing["cursor"] = page[1]
+    return True
+
+
+def get_markdown_pages(doc_id: str, page: int):
+    """Busca um bloco de páginas do markdown de um documento"""
     try:
         response = requests.get(
-            f"{BASE_API_URL}/api/v1/document/{doc_id}/markdown"
+            f"{BASE_API_URL}/api/v1/document/{doc_id}/markdown",
+            params={"page": page, "page_size": MARKDOWN_PAGE_SIZE},
         )
         if response.status_code == 200:
-            return response.json().get("content", "")
+            return response.json()
         return None
     except Exception as e:
         st.error(f"Erro ao buscar conteúdo: {str(e)}")
         return None
 
 
+def get_document_content(doc_id: str):
+    """
+    Retorna o markdown já carregado de um documento, buscando as primeiras
+    páginas se preciso.
+
+    As páginas seguintes só são buscadas pelo botão "Carregar mais páginas".
+    """
+    loaded = st.session_state.get("markdown_pages")
+    if loaded is None or loaded["doc_id"] != doc_id:
+        data = get_markdown_pages(doc_id, 1)
+        if data is None:
+            return None
+        loaded = {
+            "doc_id": doc_id,
+            "pages": [item["content"] for item in data["pages"]],
+            "next_page": data["next_page"],
+        }
+        st.session_state.markdown_pages = loaded
+    return "\n\n".join(loaded["pages"])
+
+
+def load_more_pages(key: str):
+    """Botão que acrescenta as próximas páginas ao markdown carregado"""
+    loaded = st.session_state.get("markdown_pages")
+    if not loaded or loaded["next_page"] is None:
+        return
+    if st.button("Carregar mais páginas", use_container_width=True, key=key):
+        data = get_markdown_pages(loaded["doc_id"], loaded["next_page"])
+        if data is not None:
+            loaded["pages"].extend(item["content"] for item in data["pages"])
+            loaded["next_page"] = data["next_page"]
+            st.rerun()
+
+
+@st.cache_data(ttl=3600, show_spinner=False)
+def get_page_preview(doc_id: str, page: int, access_level: int):
+    """Busca a prévia (JPEG) de uma página de um documento"""
+    try:
+        response = requests.get(
+            f"{BASE_API_URL}/api/v1/document/{doc_id}/preview/{page}",
+            params={"user_access_level": access_level},
+            timeout=30,
+        )
+        if response.status_code == 200:
+            return response.content
+        return None
+    except requests.RequestException:
+        return None
+
+
+def show_preview(doc: dict, key: str):
+    """Miniatura de uma página do documento, começando pela primeira"""
+    page_count = doc.get("page_count") or 1
+    page = 1
+    if page_count > 1:
+        page = st.number_input("Página da prévia:", 1, page_count, 1, key=key)
+    image = get_page_preview(doc["id"], int(page), st.session_state.get("access_level", 0))
+    if image:
+        st.image(image, caption=f"Página {page}")
+    else:
+        st.caption("Prévia indisponível.")
+
+
+def show_thumbnails(documents: list[dict]):
+    """Grade com a primeira página dos documentos carregados; o botão abre o documento"""
+    pages = (len(documents) - 1) // THUMBNAILS_PER_PAGE + 1
+    page = 1
+    if pages > 1:
+        page = st.number_input("Página da grade:", 1, pages, 1, key="thumbnail_page")
+    start = (int(page) - 1) * THUMBNAILS_PER_PAGE
+    shown = documents[start:start + THUMBNAILS_PER_PAGE]
+    access_level = st.session_state.get("access_level", 0)
+    for row in range(0, len(shown), THUMBNAIL_COLUMNS):
+        columns = st.columns(THUMBNAIL_COLUMNS)
+        for column, doc in zip(columns, shown[row:row + THUMBNAIL_COLUMNS]):
+            with column:
+                image = get_page_preview(doc["id"], 1, access_level)
+                if image:
+                    st.image(image, use_container_width=True)
+                else:
+                    st.caption("Prévia indisponível.")
+                if st.button(doc["filename"], key=f"thumb_{doc['id']}", use_container_width=True):
+                    st.session_state.selected_doc = doc["id"]
+                    st.session_state.view_mode = None
+                    st.rerun()
+
+
 def view_documents():
     """Página principal de visualização de documentos"""
     st.subheader("Documentos Extraídos")
+
+    # Filtro por categoria montado pelas facetas, sem baixar o acervo
+    categories = get_facets().get("category", [])
+    category_options = [None] + [bucket["value"] for bucket in categories]
+    category_counts = {bucket["value"]: bucket["count"] for bucket in categories}
+    category = st.selectbox(
+        "Categoria:",
+        category_options,
+        format_func=lambda value: "Todas" if value is None else f"{value} ({category_counts[value]})",
+        key="doc_category_filter"
+    )
+
+    # Atalho para abrir um documento pelo nome ou por um título
+    _, suggestions = suggest_input("Buscar documento:", key="doc_suggest", category=category)
+    for suggestion in suggestions:
+        label = f"📄 {suggestion['text']}"
+        if suggestion["heading"]:
+            label += f" — {suggestion['filename']}"
+        if st.button(label, key=f"suggest_{suggestion['id']}"):
+            st.session_state.selected_doc = suggestion["id"]
+            st.session_state.view_mode = None
+            st.rerun()
     
     # Buscar documentos
-    documents = get_all_documents()
+    documents = get_all_documents(category)
     
     if not documents:
         st.info("Nenhum documento disponível para visualização.")
@@ -65,12 +296,19 @@ def view_documents():
             if doc.get("id") == st.session_state.selected_doc:
                 selected_doc = doc
                 break
+        # Documentos vindos do chat podem estar em páginas ainda não carregadas.
+        if selected_doc is None:
+            selected_doc = {"id": st.session_state.selected_doc}
         
         if selected_doc:
-            st.write(f"**Documento:** {selected_doc.get('filename', 'N/A')}")
-            st.write(f"**Categoria:** {selected_doc.get('category', 'N/A')}")
-            st.write(f"**Enviado por:** {selected_doc.get('uploaded_by', 'N/A')}")
-            st.write(f"**Data:** {selected_doc.get('data_upload', 'N/A')}")
+            info_col, preview_col = st.columns([3, 1])
+            with info_col:
+                st.write(f"**Documento:** {selected_doc.get('filename', 'N/A')}")
+                st.write(f"**Categoria:** {selected_doc.get('category', 'N/A')}")
+                st.write(f"**Enviado por:** {selected_doc.get('uploaded_by', 'N/A')}")
+                st.write(f"**Data:** {selected_doc.get('data_upload', 'N/A')}")
+            with preview_col:
+                show_preview(selected_doc, f"preview_page_{st.session_state.selected_doc}")
             
             if st.button("← Voltar à lista", key="btn_back_list"):
                 st.session_state.selected_doc = None
@@ -97,6 +335,7 @@ def view_documents():
                 if content:
                     # Exibir markdown renderizado
                     st.markdown(content)
+                    load_more_pages(f"btn_more_{st.session_state.selected_doc}")
                     
                     # Botão de copiar
                     col1, col2 = st.columns([4, 1])
@@ -131,6 +370,9 @@ def view_documents():
                         st.error(f"Erro ao baixar PDF: {str(e)}")
             return
     
+    show_thumbnails(documents)
+    st.divider()
+
     # Exibir lista de documentos como selectbox
     doc_names = [f"{doc['filename']} ({doc['category']})" for doc in documents]
     doc_ids = [doc['id'] for doc in documents]
@@ -141,14 +383,23 @@ def view_documents():
         format_func=lambda i: doc_names[i],
         key="doc_selector"
     )
+
+    if st.session_state.documents_listing["cursor"]:
+        if st.button("Carregar mais documentos", key="btn_load_more"):
+            if load_more_documents():
+                st.rerun()
     
     if selected_idx is not None:
         selected_doc_id = doc_ids[selected_idx]
         selected_doc = documents[selected_idx]
         
-        st.write(f"**Categoria:** {selected_doc.get('category', 'N/A')}")
-        st.write(f"**Enviado por:** {selected_doc.get('uploaded_by', 'N/A')}")
-        st.write(f"**Data:** {selected_doc.get('data_upload', 'N/A')}")
+        info_col, preview_col = st.columns([3, 1])
+        with info_col:
+            st.write(f"**Categoria:** {selected_doc.get('category', 'N/A')}")
+            st.write(f"**Enviado por:** {selected_doc.get('uploaded_by', 'N/A')}")
+            st.write(f"**Data:** {selected_doc.get('data_upload', 'N/A')}")
+        with preview_col:
+            show_preview(selected_doc, f"list_preview_page_{selected_doc_id}")
         
         # Opções de visualização
         col1, col2 = st.columns(2)
@@ -168,6 +419,7 @@ def view_documents():
             if content:
                 # Exibir markdown renderizado
                 st.markdown(content)
+                load_more_pages(f"list_more_{selected_doc_id}")
                 
                 # Botão de copiar
                 col1, col2 = st.columns([4, 1])
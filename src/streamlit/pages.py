@@ -6,7 +6,7 @@ import streamlit as st
 
 from src.schemas.user import AcessLevel
 from src.streamlit.agent import agent_chat
-from src.streamlit.documents import view_documents
+from src.streamlit.documents import suggest_input, view_documents
 
 BASE_API_URL = os.getenv("BASE_API_URL", "http://localhost:5000")
 
@@ -195,11 +195,41 @@ def upload_files():
                     data={"access_level": level, "category": category, "user_id": user_id},
                     files={"file": (file.name, file.getvalue(), file.type)}
                 )
-                if resp.status_code == 200:
-                    st.success(f"{file.name} enviado com sucesso.")
+                if resp.status_code == 202:
+                    job_id = resp.json().get("job_id")
+                    st.session_state.setdefault("upload_jobs", {})[job_id] = file.name
+                    st.success(f"{file.name} enviado, processamento em andamento.")
                 else:
                     st.error(f"Falha ao enviar {file.name}, {resp.text}")
 
+    upload_jobs_status()
+
+
+def upload_jobs_status():
+    """Mostra o andamento dos jobs de ingestão enviados nesta sessão"""
+    jobs = st.session_state.get("upload_jobs", {})
+    if not jobs:
+        return
+
+    st.write("### Processamento")
+    if st.button("Atualizar status", key="refresh_jobs_btn"):
+        st.rerun()
+    for job_id, filename in jobs.items():
+        resp = requests.get(f"{BASE_API_URL}/api/v1/document/jobs/{job_id}")
+        if resp.status_code != 200:
+            st.write(f"{filename}: status indisponível")
+            continue
+        job = resp.json()
+        if job["status"] == "failed":
+            st.error(f"{filename}: falhou na etapa {job['stage']} ({job['error']})")
+        elif job["status"] == "done":
+            st.success(f"{filename}: indexado")
+        else:
+            pages = ""
+            if job.get("pages_total"):
+                pages = f" ({job['pages_done']}/{job['pages_total']} páginas)"
+            st.progress(job["progress"], text=f"{filename}: {job['stage']}{pages}")
+
 # ------- Página Principal com Navegação -------
 
 
@@ -230,7 +260,13 @@ def main_page():
         else:
             st.error("Acesso negado. Apenas administradores.")
     elif page == "Chat com Agentes":
-        query = st.text_input("Digite sua pergunta:")
+        query, suggestions = suggest_input("Digite sua pergunta:", key="chat_query")
+        if suggestions:
+            st.caption("Documentos relacionados: " + " · ".join(
+                f"{suggestion['text']} ({suggestion['filename']})" if suggestion["heading"]
+                else suggestion["filename"]
+                for suggestion in suggestions
+            ))
         if query:
             category = st.selectbox(
                 "Filtrar por categoria",
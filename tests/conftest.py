@@ -0,0 +1,19 @@
+"""Fixtures compartilhadas dos testes"""
+
+import pytest
+
+from src.search import embedded
+from src.search.embedded import EmbeddedBackend
+
+
+@pytest.fixture
+def index_dir(tmp_path, monkeypatch):
+    """Diretório vazio para o mecanismo embutido, com o singleton descartado."""
+    monkeypatch.setattr(embedded, "EMBEDDED_INDEX_DIR", str(tmp_path))
+    monkeypatch.setattr(EmbeddedBackend, "_instance", None)
+    return tmp_path
+
+
+@pytest.fixture
+def backend(index_dir):
+    return EmbeddedBackend()
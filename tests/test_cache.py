@@ -0,0 +1,36 @@
+"""Testes dos caches LRU em disco"""
+
+from src.ingest.cache import MarkdownCache
+from src.ingest.extraction import MARKDOWN_TIER, TEXT_TIER
+
+MARKDOWN = "# Título\r\n\r\nTexto\fsegunda página"
+
+
+def test_markdown_file_round_trip(tmp_path):
+    cache = MarkdownCache(str(tmp_path / "cache"), 1024)
+    source = tmp_path / "doc.md"
+    source.write_bytes(MARKDOWN.encode("utf-8"))
+
+    cache.put_file("abc", MARKDOWN_TIER, str(source))
+
+    assert cache.get("abc", MARKDOWN_TIER) == MARKDOWN
+    with cache.open("abc", MARKDOWN_TIER) as markdown:
+        # Sem tradução de quebras de linha, os offsets dos trechos se mantêm.
+        assert markdown.read() == MARKDOWN
+    assert cache.open("abc", TEXT_TIER) is None
+
+
+def test_put_file_evicts_least_recently_used(tmp_path):
+    cache = MarkdownCache(str(tmp_path / "cache"), 100)
+    for name, size in (("a", 40), ("b", 40), ("c", 40)):
+        source = tmp_path / f"{name}.md"
+        source.write_text(name * size)
+        cache.put_file(name, MARKDOWN_TIER, str(source))
+
+    assert cache.get("a", MARKDOWN_TIER) is None
+    assert cache.get("c", MARKDOWN_TIER) == "c" * 40
+    # Arquivos maiores que o limite não entram no cache.
+    large = tmp_path / "large.md"
+    large.write_text("x" * 101)
+    cache.put_file("large", MARKDOWN_TIER, str(large))
+    assert cache.get("large", MARKDOWN_TIER) is None
@@ -0,0 +1,86 @@
+"""Testes da divisão do markdown em trechos"""
+
+import io
+
+import pytest
+
+from src.ingest.chunking import (
+    CHUNK_MIN_CHARS,
+    PAGE_SEPARATOR,
+    key_headings,
+    read_pages,
+    split_markdown,
+    split_page,
+)
+
+
+def paragraph(word: str, words: int) -> str:
+    return " ".join([word] * words)
+
+
+PAGES = [
+    "# Introdução\n\n" + paragraph("contexto", 60) + "\n\n## Objetivo\n\n" + paragraph("meta", 60),
+    paragraph("continuação", 40) + "\n\n# Procedimento\n\n"
+    + "\n\n".join(paragraph(f"passo{n}", 30) for n in range(6)),
+    "",
+    "## Referências\n\n" + paragraph("fonte", 80),
+]
+MARKDOWN = PAGE_SEPARATOR.join(PAGES)
+
+
+def test_offsets_point_into_the_full_markdown():
+    chunks = split_markdown(MARKDOWN, max_chars=400)
+
+    assert len(chunks) > len(PAGES)
+    for chunk in chunks:
+        assert MARKDOWN[chunk.start:chunk.end] == chunk.text
+        assert PAGE_SEPARATOR not in chunk.text
+        assert len(chunk.text) <= 400
+    assert [chunk.start for chunk in chunks] == sorted(chunk.start for chunk in chunks)
+
+
+def test_chunks_keep_page_and_inherited_heading():
+    chunks = split_markdown(MARKDOWN, max_chars=400)
+
+    first_on_page = {}
+    for chunk in chunks:
+        first_on_page.setdefault(chunk.page, chunk)
+    assert sorted(first_on_page) == [0, 1, 3]
+    assert first_on_page[0].heading == "Introdução"
+    # O texto antes do primeiro título da página herda o último título da anterior.
+    assert first_on_page[1].heading == "Objetivo"
+    assert first_on_page[3].heading == "Referências"
+
+
+def test_split_page_matches_split_markdown():
+    offset = len(PAGES[0]) + len(PAGE_SEPARATOR)
+
+    chunks = split_page(PAGES[1], 1, offset, "Objetivo", max_chars=400)
+
+    expected = [chunk for chunk in split_markdown(MARKDOWN, max_chars=400) if chunk.page == 1]
+    assert [(c.start, c.end, c.heading) for c in chunks] == [
+        (c.start, c.end, c.heading) for c in expected
+    ]
+
+
+def test_short_sections_join_the_next_one():
+    text = "# A\n\ncurto\n\n# B\n\n" + paragraph("longo", CHUNK_MIN_CHARS // 5)
+
+    chunks = split_markdown(text)
+
+    assert len(chunks) == 1
+    assert chunks[0].heading == "A"
+    assert (chunks[0].start, chunks[0].end) == (0, len(text))
+
+
+def test_key_headings_strip_emphasis_and_repeats():
+    text = "# **Protocolo** de _isolamento_\n\n### Escopo ##\n\n#### Detalhe\n\n# Protocolo de isolamento"
+
+    assert key_headings(text) == ["Protocolo de isolamento", "Escopo"]
+
+
+@pytest.mark.parametrize("block_size", [1, 7, 64, 1 << 20])
+def test_read_pages_matches_split(block_size):
+    pages = list(read_pages(io.StringIO(MARKDOWN, newline=""), block_size))
+
+    assert pages == MARKDOWN.split(PAGE_SEPARATOR)
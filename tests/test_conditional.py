@@ -0,0 +1,114 @@
+"""Testes das requisições condicionais e por intervalo de bytes"""
+
+import gzip
+import json
+from datetime import datetime, timezone
+
+import pytest
+from fastapi import HTTPException
+
+from src.api.conditional import (
+    GZIP_MIN_SIZE,
+    byte_range,
+    http_date,
+    json_response,
+    not_modified,
+    strong_etag,
+)
+
+ETAG = strong_etag("abc123")
+MODIFIED = datetime(2024, 5, 10, 12, 30, 15, 123000)
+LENGTH = 1000
+
+
+def test_http_date_treats_naive_dates_as_utc():
+    assert http_date(MODIFIED) == "Fri, 10 May 2024 12:30:15 GMT"
+    assert http_date(MODIFIED.replace(tzinfo=timezone.utc)) == http_date(MODIFIED)
+
+
+@pytest.mark.parametrize("header, expected", [
+    ('"abc123"', True),
+    ('W/"abc123"', True),
+    ('"outro", "abc123"', True),
+    ("*", True),
+    ('"outro"', False),
+])
+def test_not_modified_if_none_match(header, expected):
+    assert not_modified({"if-none-match": header}, ETAG) is expected
+
+
+def test_not_modified_if_modified_since():
+    assert not_modified({"if-modified-since": http_date(MODIFIED)}, ETAG, MODIFIED)
+    assert not not_modified({"if-modified-since": "Thu, 09 May 2024 00:00:00 GMT"}, ETAG, MODIFIED)
+    assert not not_modified({"if-modified-since": "data inválida"}, ETAG, MODIFIED)
+    assert not not_modified({"if-modified-since": http_date(MODIFIED)}, ETAG)
+
+
+def test_if_none_match_takes_precedence():
+    headers = {"if-none-match": '"outro"', "if-modified-since": http_date(MODIFIED)}
+
+    assert not not_modified(headers, ETAG, MODIFIED)
+
+
+@pytest.mark.parametrize("header, expected", [
+    ("bytes=0-99", (0, 99)),
+    ("bytes=900-", (900, 999)),
+    ("bytes=-100", (900, 999)),
+    ("bytes=-5000", (0, 999)),
+    ("bytes=990-5000", (990, 999)),
+    ("bytes=10-5", None),
+    ("bytes=0-9,20-29", None),
+    ("bytes=-", None),
+    ("items=0-9", None),
+])
+def test_byte_range(header, expected):
+    assert byte_range({"range": header}, LENGTH, ETAG) == expected
+
+
+def test_byte_range_without_header():
+    assert byte_range({}, LENGTH, ETAG) is None
+
+
+@pytest.mark.parametrize("header", ["bytes=1000-", "bytes=2000-2999", "bytes=-0"])
+def test_byte_range_not_satisfiable(header):
+    with pytest.raises(HTTPException) as error:
+        byte_range({"range": header}, LENGTH, ETAG)
+
+    assert error.value.status_code == 416
+    assert error.value.headers["Content-Range"] == f"bytes */{LENGTH}"
+
+
+@pytest.mark.parametrize("if_range, expected", [
+    (ETAG, (0, 99)),
+    ('W/"abc123"', None),
+    ('"outro"', None),
+    (http_date(MODIFIED), (0, 99)),
+    ("Thu, 09 May 2024 00:00:00 GMT", None),
+])
+def test_byte_range_if_range(if_range, expected):
+    headers = {"range": "bytes=0-99", "if-range": if_range}
+
+    assert byte_range(headers, LENGTH, ETAG, MODIFIED) == expected
+
+
+def test_json_response_compresses_large_bodies():
+    payload = {"content": "x" * GZIP_MIN_SIZE}
+
+    response = json_response({"accept-encoding": "br, gzip;q=0.5"}, payload, {"ETag": ETAG})
+
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert response.headers["Vary"] == "Accept-Encoding"
+    assert response.headers["ETag"] == ETAG
+    assert json.loads(gzip.decompress(response.body)) == payload
+
+
+@pytest.mark.parametrize("headers, payload", [
+    ({"accept-encoding": "gzip"}, {"content": "curto"}),
+    ({"accept-encoding": "gzip;q=0"}, {"content": "x" * GZIP_MIN_SIZE}),
+    ({}, {"content": "x" * GZIP_MIN_SIZE}),
+])
+def test_json_response_without_compression(headers, payload):
+    response = json_response(headers, payload, {})
+
+    assert "Content-Encoding" not in response.headers
+    assert json.loads(response.body) == payload
@@ -0,0 +1,246 @@
+"""Testes do mecanismo de busca embutido"""
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from src.elastic.client import CHUNK_INDEX, DOC_INDEX
+from src.search.backend import InvalidCursor, SearchRequest
+from src.search.embedded import EmbeddedBackend
+
+
+def document(file_id: str, content: str, **fields) -> dict:
+    source = {
+        "file_id": file_id,
+        "filename": f"{file_id}.pdf",
+        "content": content,
+        "category": "geral",
+        "access_level": 0,
+        "uploaded_by": "ana",
+        "data_upload": "2024-01-01T00:00:00",
+        **fields,
+    }
+    return {"_index": DOC_INDEX, "_id": file_id, "_source": source}
+
+
+def chunk(file_id: str, chunk_no: int, content: str, **fields) -> dict:
+    source = {
+        "parent_id": file_id,
+        "chunk_no": chunk_no,
+        "content": content,
+        "category": "geral",
+        "access_level": 0,
+        "uploaded_by": "ana",
+        **fields,
+    }
+    return {"_index": CHUNK_INDEX, "_id": f"{file_id}_{chunk_no}", "_source": source}
+
+
+def search(backend: EmbeddedBackend, index: str = DOC_INDEX, **params) -> dict:
+    params.setdefault("size", 10)
+    return asyncio.run(backend.search_one(SearchRequest(index, **params)))
+
+
+def list_all(backend: EmbeddedBackend, sort: str, order: str, size: int) -> list[str]:
+    """Percorre a listagem inteira pelo cursor."""
+    ids, cursor = [], None
+    while True:
+        hits, total, cursor = asyncio.run(
+            backend.list_documents(None, 0, sort, order, size, cursor)
+        )
+        ids.extend(hit["_id"] for hit in hits)
+        if cursor is None:
+            assert len(ids) == total
+            return ids
+
+
+def reopen(monkeypatch) -> EmbeddedBackend:
+    """Descarta o singleton e abre o índice gravado em disco de novo."""
+    monkeypatch.setattr(EmbeddedBackend, "_instance", None)
+    return EmbeddedBackend()
+
+
+def test_search_ranks_by_term_frequency(backend):
+    backend.bulk([
+        document("a", "protocolo de higienização das mãos"),
+        document("b", "higienização higienização higienização das mãos e dos leitos"),
+        document("c", "escala de plantão da enfermagem"),
+    ])
+
+    result = search(backend, text="higienização")
+
+    assert [hit["_id"] for hit in result["hits"]] == ["b", "a"]
+    assert result["total"] == 2
+    assert "content" not in result["hits"][0]["_source"]
+
+
+def test_search_breaks_score_ties_by_id(backend):
+    backend.bulk([document(file_id, "protocolo de isolamento") for file_id in ("c", "a", "b")])
+
+    hits = search(backend, text="isolamento")["hits"]
+
+    assert [hit["_id"] for hit in hits] == ["a", "b", "c"]
+    assert hits[0]["sort"] == [hits[0]["_score"], "a"]
+
+
+def test_search_after_pages_through_ties_without_repeats(backend):
+    backend.bulk([document(f"doc{n}", "protocolo de isolamento") for n in range(5)])
+    backend.bulk([document("best", "isolamento isolamento isolamento")])
+
+    seen, search_after = [], None
+    while True:
+        hits = search(backend, text="isolamento", size=2, search_after=search_after)["hits"]
+        if not hits:
+            break
+        seen.extend(hit["_id"] for hit in hits)
+        search_after = hits[-1]["sort"]
+
+    assert seen == ["best", "doc0", "doc1", "doc2", "doc3", "doc4"]
+
+
+def test_search_filters_category_and_access_level(backend):
+    backend.bulk([
+        document("a", "protocolo", category="uti"),
+        document("b", "protocolo", category="pediatria"),
+        document("c", "protocolo", category="uti", access_level=3),
+    ])
+
+    assert [hit["_id"] for hit in search(backend, text="protocolo", category="uti")["hits"]] == ["a"]
+    assert search(backend, text="protocolo", access_level=3)["total"] == 3
+
+
+def test_list_cursor_visits_every_document_once(backend):
+    dates = ["2024-03-01", "2024-01-01", "2024-03-01", None, "2024-02-01", None]
+    backend.bulk([
+        document(f"d{n}", "texto", data_upload=value) for n, value in enumerate(dates)
+    ])
+
+    assert list_all(backend, "data_upload", "desc", 2) == ["d2", "d0", "d4", "d1", "d3", "d5"]
+    # Itens sem o campo vêm por último nas duas ordens.
+    assert list_all(backend, "data_upload", "asc", 4) == ["d1", "d4", "d0", "d2", "d3", "d5"]
+
+
+def test_list_rejects_malformed_cursor(backend):
+    with pytest.raises(InvalidCursor):
+        asyncio.run(backend.list_documents(None, 0, "data_upload", "desc", 2, "nao-e-cursor"))
+
+
+def test_delete_document_removes_document_and_chunks(backend):
+    backend.bulk([
+        document("a", "protocolo de isolamento"),
+        chunk("a", 0, "protocolo de isolamento"),
+        chunk("a", 1, "isolamento de contato"),
+        document("b", "isolamento respiratório"),
+        chunk("b", 0, "isolamento respiratório"),
+    ])
+
+    backend.delete_document("a")
+
+    assert [hit["_id"] for hit in search(backend, text="isolamento")["hits"]] == ["b"]
+    assert [hit["_id"] for hit in search(backend, CHUNK_INDEX, text="isolamento")["hits"]] == ["b_0"]
+    assert asyncio.run(backend.get_source(DOC_INDEX, "a")) is None
+
+
+def test_bulk_delete_actions_remove_by_id(backend):
+    backend.bulk([document("a", "protocolo"), chunk("a", 0, "protocolo"), chunk("a", 1, "protocolo")])
+
+    results = backend.bulk([
+        {"_op_type": "delete", "_index": CHUNK_INDEX, "_id": "a_1"},
+        {"_op_type": "delete", "_index": CHUNK_INDEX, "_id": "inexistente"},
+    ])
+
+    assert all(ok for ok, _ in results)
+    assert [hit["_id"] for hit in search(backend, CHUNK_INDEX, text="protocolo")["hits"]] == ["a_0"]
+
+
+def test_merge_upload_combines_metadata_and_keeps_postings(backend):
+    backend.bulk([
+        document("a", "protocolo de isolamento", category="uti", access_level=2),
+        chunk("a", 0, "protocolo de isolamento", category="uti", access_level=2),
+    ])
+
+    merged = backend.merge_upload(
+        "a", {"category": "pediatria", "uploaded_by": "bruno", "access_level": 1}
+    )
+
+    assert merged
+    source = asyncio.run(backend.get_source(DOC_INDEX, "a"))
+    assert source["category"] == ["uti", "pediatria"]
+    assert source["uploaded_by"] == ["ana", "bruno"]
+    assert source["access_level"] == 1
+    result = search(backend, text="isolamento", category="pediatria", access_level=1)
+    assert [hit["_id"] for hit in result["hits"]] == ["a"]
+    chunks = search(backend, CHUNK_INDEX, text="isolamento", category="pediatria", access_level=1)
+    assert [hit["_id"] for hit in chunks["hits"]] == ["a_0"]
+    assert not backend.merge_upload(
+        "b", {"category": "uti", "uploaded_by": "ana", "access_level": 0}
+    )
+
+
+def test_concurrent_deletes_and_merges_hit_the_right_records(backend):
+    file_ids = [f"d{n:02}" for n in range(40)]
+    backend.bulk([
+        action
+        for file_id in file_ids
+        for action in (document(file_id, "protocolo", category="uti"), chunk(file_id, 0, "protocolo"))
+    ])
+    params = {"category": "pediatria", "uploaded_by": "bruno", "access_level": 0}
+
+    # Cada escrita muda os ordinais dos registros seguintes.
+    with ThreadPoolExecutor(4) as pool:
+        list(pool.map(backend.delete_document, file_ids[::2]))
+        list(pool.map(lambda file_id: backend.merge_upload(file_id, params), file_ids[1::2]))
+        list(pool.map(backend.delete_document, file_ids[1::4]))
+
+    kept = file_ids[3::4]
+    assert sorted(hit["_id"] for hit in search(backend, text="protocolo", size=50)["hits"]) == kept
+    assert search(backend, CHUNK_INDEX, text="protocolo", size=50)["total"] == len(kept)
+    for file_id in kept:
+        assert asyncio.run(backend.get_source(DOC_INDEX, file_id))["category"] == ["uti", "pediatria"]
+        assert asyncio.run(backend.get_source(CHUNK_INDEX, f"{file_id}_0"))["uploaded_by"] == ["ana", "bruno"]
+
+
+def test_small_writes_do_not_rewrite_large_segments(backend):
+    backend.bulk([document(f"d{n:02}", "protocolo") for n in range(16)])
+    large = backend.documents.snapshot.segments[0]
+
+    for n in range(16, 24):
+        backend.bulk([document(f"d{n:02}", "protocolo")])
+
+    segments = backend.documents.snapshot.segments
+    assert segments[0] is large
+    # Os lotes pequenos foram fundidos entre si: 16, 8.
+    assert [len(segment) for segment in segments] == [16, 8]
+    assert search(backend, text="protocolo", size=30)["total"] == 24
+
+
+def test_segment_with_mostly_removed_records_is_rewritten(backend):
+    backend.bulk([document(file_id, "protocolo") for file_id in "abcd"])
+
+    backend.bulk([{"_op_type": "delete", "_index": DOC_INDEX, "_id": "a"}])
+    assert backend.documents.snapshot.deleted == [frozenset({0})]
+    backend.bulk([{"_op_type": "delete", "_index": DOC_INDEX, "_id": file_id} for file_id in "bc"])
+
+    snapshot = backend.documents.snapshot
+    assert [segment.ids for segment in snapshot.segments] == [["d"]]
+    assert snapshot.deleted == [frozenset()]
+
+
+def test_index_survives_reopen(backend, monkeypatch):
+    backend.bulk([
+        document("a", "protocolo de isolamento"),
+        document("b", "isolamento respiratório"),
+        chunk("a", 0, "protocolo de isolamento", embedding=[1.0] + [0.0] * 127),
+    ])
+    backend.delete_document("b")
+    before = search(backend, text="isolamento")
+
+    reopened = reopen(monkeypatch)
+
+    assert reopened is not backend
+    assert search(reopened, text="isolamento") == before
+    assert search(reopened, CHUNK_INDEX, vector=[1.0] + [0.0] * 127)["hits"][0]["_id"] == "a_0"
+    # O índice reaberto continua aceitando escritas.
+    reopened.bulk([document("c", "isolamento")])
+    assert search(reopen(monkeypatch), text="isolamento")["total"] == 2
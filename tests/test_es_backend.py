@@ -0,0 +1,171 @@
+"""Testes do mecanismo de busca no Elasticsearch, com um cliente em memória"""
+
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from src.elastic.client import CHUNK_INDEX, DOC_INDEX, category_routing
+from src.search import es_backend
+from src.search.es_backend import ElasticBackend
+
+DOC_GENERATION = f"{DOC_INDEX}-000001"
+FILE_ID = "665f1c2e9b1e8a3d4c5b6a79"
+CONTENT = "# Protocolo\n\nHigienização das mãos antes do contato com o paciente."
+
+
+class FakeElasticsearch:
+    """
+    Índice de documentos em memória com o mapeamento do índice real: o
+    conteúdo é indexado, mas fica fora do `_source`.
+    """
+
+    def __init__(self):
+        self.sources: dict[str, dict] = {}
+        self.routings: dict[str, str | None] = {}
+        self.indexed: dict[str, str] = {}
+        self.indices = SimpleNamespace(refresh=lambda index: None)
+
+    def index(self, index, id, document, routing=None):
+        assert index == DOC_GENERATION
+        self.indexed[id] = document.get("content", "")
+        self.sources[id] = {k: v for k, v in document.items() if k != "content"}
+        self.routings[id] = routing
+
+    def search(self, index, query, size):
+        ids = query["ids"]["values"]
+        hits = [
+            {
+                "_index": DOC_GENERATION,
+                "_id": doc_id,
+                "_routing": self.routings[doc_id],
+                "_source": dict(self.sources[doc_id]),
+            }
+            for doc_id in ids if doc_id in self.sources
+        ]
+        return {"hits": {"hits": hits[:size]}}
+
+    def update_by_query(self, **kwargs):
+        assert kwargs["index"] == CHUNK_INDEX
+
+    def match(self, term: str) -> list[str]:
+        """IDs dos documentos cujo conteúdo indexado contém o termo."""
+        return [doc_id for doc_id, content in self.indexed.items() if term in content.lower()]
+
+
+class FakeMarkdownStore:
+    def get(self, file_id):
+        return "protocolo.pdf", CONTENT
+
+
+@pytest.fixture
+def es(monkeypatch):
+    fake = FakeElasticsearch()
+    backend = object.__new__(ElasticBackend)
+    backend.connection = SimpleNamespace(es=fake, routed=True)
+    backend._initialized = True
+    monkeypatch.setattr(ElasticBackend, "_instance", backend)
+    monkeypatch.setattr(
+        es_backend, "MongoDBClient", lambda: SimpleNamespace(markdown=FakeMarkdownStore())
+    )
+    fake.index(
+        DOC_GENERATION,
+        FILE_ID,
+        {
+            "file_id": FILE_ID,
+            "filename": "protocolo.pdf",
+            "content": CONTENT,
+            "category": "uti",
+            "uploaded_by": "ana",
+            "access_level": 2,
+        },
+        routing=category_routing("uti"),
+    )
+    return fake
+
+
+def test_merge_with_same_category_keeps_document_searchable(es):
+    assert es.match("higienização") == [FILE_ID]
+
+    merged = ElasticBackend().merge_upload(
+        FILE_ID, {"category": "uti", "uploaded_by": "bruno", "access_level": 1}
+    )
+
+    assert merged
+    assert es.match("higienização") == [FILE_ID]
+    assert es.sources[FILE_ID]["uploaded_by"] == ["ana", "bruno"]
+    assert es.sources[FILE_ID]["category"] == ["uti"]
+    assert es.sources[FILE_ID]["access_level"] == 1
+    assert es.routings[FILE_ID] == category_routing("uti")
+
+
+def test_merge_with_new_category_reroutes_with_content(es, monkeypatch):
+    written = []
+    monkeypatch.setattr(
+        es_backend,
+        "helpers",
+        SimpleNamespace(
+            scan=lambda *args, **kwargs: [],
+            bulk=lambda es, actions: written.extend(actions),
+        ),
+    )
+
+    ElasticBackend().merge_upload(
+        FILE_ID, {"category": "pediatria", "uploaded_by": "bruno", "access_level": 2}
+    )
+
+    deleted, indexed = written
+    assert deleted["_op_type"] == "delete"
+    assert indexed["_routing"] == category_routing(["uti", "pediatria"])
+    assert indexed["_source"]["content"] == CONTENT
+    assert indexed["_source"]["category"] == ["uti", "pediatria"]
+
+
+def test_merge_of_unknown_document(es):
+    assert not ElasticBackend().merge_upload(
+        "665f1c2e9b1e8a3d4c5b6a7a", {"category": "uti", "uploaded_by": "ana", "access_level": 0}
+    )
+
+
+class FakeAsyncElasticsearch:
+    """Listagem por point-in-time sobre uma lista fixa de documentos."""
+
+    def __init__(self, count: int):
+        self.ids = [f"d{n:02}" for n in range(count)]
+        self.bodies: list[dict] = []
+
+    async def open_point_in_time(self, index, keep_alive, routing=None):
+        return {"id": "pit"}
+
+    async def close_point_in_time(self, id, ignore_status=None):
+        pass
+
+    async def search(self, body):
+        self.bodies.append(body)
+        after = body.get("search_after", [None, ""])[1]
+        page = [doc_id for doc_id in self.ids if doc_id > after][:body["size"]]
+        hits = [{"_id": doc_id, "_source": {}, "sort": [None, doc_id, 0]} for doc_id in page]
+        total = {"value": len(self.ids)} if body["track_total_hits"] else {"value": 10000}
+        return {"hits": {"hits": hits, "total": total}, "pit_id": "pit"}
+
+
+def test_list_counts_total_only_on_first_page(monkeypatch):
+    aes = FakeAsyncElasticsearch(5)
+    backend = object.__new__(ElasticBackend)
+    backend.connection = SimpleNamespace(aes=aes, routed=True)
+    backend._initialized = True
+    monkeypatch.setattr(ElasticBackend, "_instance", backend)
+
+    seen, totals, cursor = [], [], None
+    while True:
+        hits, total, cursor = asyncio.run(
+            backend.list_documents(None, 0, "data_upload", "desc", 2, cursor)
+        )
+        seen.extend(hit["_id"] for hit in hits)
+        totals.append(total)
+        if cursor is None:
+            break
+
+    assert seen == aes.ids
+    assert totals == [5, 5, 5]
+    assert [body["track_total_hits"] for body in aes.bodies] == [True, False, False]